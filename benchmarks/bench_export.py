@@ -0,0 +1,71 @@
+"""
+Compare exporting every ticket with fetching, converting and writing
+pipelined across threads (TicketExporter) against doing them one after
+another, for each export format
+
+Usage: python -m benchmarks.bench_export [tickets]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from benchmarks.stub_server import stub_process
+from ticket_viewer.export import EXPORT_FORMATS, WRITERS, export_tickets
+from ticket_viewer.ticket_viewer import MAX_PAGE_SIZE, TICKET_FIELDS, TicketViewer
+from ticket_viewer.util import SGT_FORMATTER
+
+def export_sequentially(ticket_viewer: TicketViewer, path: str, format: str) -> int:
+  """
+  The same steps as TicketExporter, on a single thread
+  """
+
+  link = ticket_viewer.tickets_link(MAX_PAGE_SIZE, sort="id")
+  column = TICKET_FIELDS.index("updated_at")
+  rows = 0
+
+  with open(path, "wb") as f:
+    writer = WRITERS[format](f, is_new=True)
+
+    while link is not None:
+      response = ticket_viewer.get_tickets(link, use_cache=False)
+      page = [tuple(ticket.values()) for ticket in response.tickets]
+      converted = SGT_FORMATTER.format_column([row[column] for row in page])
+      page = [row[:column] + (timestamp,) + row[column + 1:] for row, timestamp in zip(page, converted)]
+
+      writer.write(page)
+      f.flush()
+      os.fsync(f.fileno())
+      rows += len(page)
+      link = response.next_link if response.has_more else None
+
+  return rows
+
+def main(size: int = 100000) -> None:
+  print(f"{size} tickets")
+
+  with stub_process(ticket_count=size) as url, tempfile.TemporaryDirectory() as directory:
+    with TicketViewer(url, "email", "password") as ticket_viewer:
+      for format in EXPORT_FORMATS:
+        path = os.path.join(directory, f"tickets.{format}")
+
+        start = time.perf_counter()
+        rows = export_sequentially(ticket_viewer, path, format)
+        sequential = time.perf_counter() - start
+
+        result = export_tickets(
+          ticket_viewer,
+          path,
+          format=format,
+          convert_timestamps=SGT_FORMATTER.format_column
+        )
+
+        print(
+          f"  {format:<9} sequential {rows / sequential:8.0f} rows/s  "
+          f"pipelined {result.rows_per_second:8.0f} rows/s  "
+          f"file {os.path.getsize(path) / 2 ** 20:7.2f} MiB"
+        )
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
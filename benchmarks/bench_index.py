@@ -0,0 +1,81 @@
+"""
+Measure how long TicketIndex takes to index, write and open 1M tickets,
+and the latency of keyword, prefix and filter queries against the written index
+
+Usage: python -m benchmarks.bench_index [tickets]
+"""
+
+import os
+import sys
+import time
+import random
+import statistics
+import tempfile
+from itertools import accumulate
+from typing import List
+
+from benchmarks.stub_server import make_ticket
+from ticket_viewer.search import INDEX_FILE_NAME, MemorySegment, TicketIndex
+from ticket_viewer.ticket_viewer import Ticket, extract_ticket_fields
+
+# Subjects are made of words from a vocabulary where a few words are
+# very common and most are rare, like in real tickets
+VOCABULARY = [f"word{rank}" for rank in range(20000)]
+CUM_WEIGHTS = list(accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+QUERIES = [
+  "word3",                              # in most tickets
+  "word1500",                           # in a few thousand tickets
+  "word19999",                          # in a handful of tickets
+  "word1 word2",                        # two common words
+  "word123*",                           # prefix
+  "status:open priority:urgent",        # filters only
+  "word7 status:open updated_after:2021-12-20"
+]
+
+def make_tickets(size: int) -> List[Ticket]:
+  rng = random.Random(0)
+  tickets = []
+
+  for ticket_id in range(1, size + 1):
+    ticket = extract_ticket_fields(make_ticket(ticket_id))
+    words = rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=6)
+    ticket.subject = " ".join(words)
+    tickets.append(ticket)
+
+  return tickets
+
+def main(size: int = 1000000, repeat: int = 20) -> None:
+  tickets = make_tickets(size)
+
+  with tempfile.TemporaryDirectory() as directory:
+    start = time.perf_counter()
+    segment = MemorySegment.of(tickets)
+    indexed = time.perf_counter()
+    segment.write(os.path.join(directory, INDEX_FILE_NAME), cursor=None)
+    written = time.perf_counter()
+    del segment
+
+    start_open = time.perf_counter()
+    ticket_index = TicketIndex(directory)
+    opened = time.perf_counter()
+
+    size_on_disk = os.path.getsize(os.path.join(directory, INDEX_FILE_NAME))
+    print(f"{size} tickets")
+    print(f"  index {indexed - start:8.2f} s   write {written - indexed:8.2f} s   "
+          f"open {(opened - start_open) * 1000:8.3f} ms   file {size_on_disk / 2 ** 20:8.1f} MiB")
+
+    for query in QUERIES:
+      latencies = []
+
+      for _ in range(repeat):
+        query_start = time.perf_counter()
+        found = ticket_index.search(query, limit=25)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+
+      print(f"  {query:<45} {len(found):3} hits  median {statistics.median(latencies):8.3f} ms  "
+            f"max {max(latencies):8.3f} ms")
+
+    ticket_index.close()
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
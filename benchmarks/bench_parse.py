@@ -0,0 +1,92 @@
+"""
+Compare decoding a whole page of tickets with json.loads against
+decoding it incrementally with JSONArrayStream, keeping only the
+displayed properties of each ticket
+
+The pages are the one recorded in tests/resources/cassettes/test_get_tickets.yaml
+and a page of 100 of its tickets with bigger descriptions and custom fields
+
+Usage: python -m benchmarks.bench_parse [repeat]
+"""
+
+import gc
+import sys
+import copy
+import gzip
+import json
+import time
+import tracemalloc
+from typing import Callable, List
+
+import yaml
+
+from ticket_viewer.json_stream import JSONArrayStream
+from ticket_viewer.ticket_viewer import STREAM_CHUNK_SIZE, Ticket, extract_ticket_fields
+
+CASSETTE = "tests/resources/cassettes/test_get_tickets.yaml"
+
+def load_recorded_page() -> bytes:
+  with open(CASSETTE) as f:
+    response = yaml.safe_load(f)["interactions"][0]["response"]
+
+  return gzip.decompress(response["body"]["string"])
+
+def make_large_page(recorded_page: bytes, size: int = 100) -> bytes:
+  """
+  A full page of the recorded tickets with large payloads
+  """
+
+  data = json.loads(recorded_page)
+  tickets = []
+
+  for idx in range(size):
+    ticket = copy.deepcopy(data["tickets"][idx % len(data["tickets"])])
+    ticket["description"] = f"{ticket['description']} " * 200
+    ticket["custom_fields"] = [{"id": field, "value": "x" * 40} for field in range(100)]
+    tickets.append(ticket)
+
+  data["tickets"] = tickets
+  return json.dumps(data).encode()
+
+def parse_whole(body: bytes) -> List[Ticket]:
+  """
+  What get_tickets used to do: decode everything, then copy the displayed properties
+  """
+
+  data = json.loads(body)
+  return [extract_ticket_fields(ticket) for ticket in data["tickets"]]
+
+def parse_streamed(body: bytes) -> List[Ticket]:
+  view = memoryview(body)
+  chunks = (view[start:start + STREAM_CHUNK_SIZE] for start in range(0, len(body), STREAM_CHUNK_SIZE))
+
+  return [extract_ticket_fields(ticket) for ticket in JSONArrayStream(chunks, "tickets")]
+
+def measure(parse: Callable[[bytes], List[Ticket]], body: bytes, repeat: int) -> str:
+  gc.collect()
+  tracemalloc.start()
+  parse(body)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+
+  start = time.perf_counter()
+  for _ in range(repeat):
+    parse(body)
+  elapsed = (time.perf_counter() - start) / repeat
+
+  return f"peak {peak / 1024:9.1f} KiB  parse {elapsed * 1000:7.3f} ms"
+
+def main(repeat: int = 100) -> None:
+  recorded_page = load_recorded_page()
+  pages = {
+    "recorded page": recorded_page,
+    "large page": make_large_page(recorded_page)
+  }
+
+  for name, body in pages.items():
+    print(f"{name} ({len(body) / 1024:.1f} KiB)")
+    print(f"  json.loads        {measure(parse_whole, body, repeat)}")
+    print(f"  JSONArrayStream   {measure(parse_streamed, body, repeat)}")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
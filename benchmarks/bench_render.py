@@ -0,0 +1,56 @@
+"""
+Compare rendering a table cell by cell (find_column_width/generate_row)
+against rendering it column by column (render_table)
+
+Usage: python -m benchmarks.bench_render [rows ...]
+"""
+
+import io
+import sys
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.stub_server import make_ticket
+from ticket_viewer.util import find_column_width, generate_cell, generate_row, render_table
+
+HEADERS = ["ID", "Updated at (SGT)", "Type", "Priority", "Status", "Subject"]
+KEYS = ["id", "updated_at", "type", "priority", "status", "subject"]
+
+def render_per_cell(tickets: List[Dict], stream: io.StringIO) -> None:
+  """
+  What CLIApp.print_table used to do, with one print per row
+  """
+
+  col_width = find_column_width(tickets, KEYS, HEADERS)
+  headers = "".join(
+    generate_cell(col, col_width[idx], is_first_col=idx == 0)
+    for idx, col in enumerate(HEADERS)
+  )
+  print(f"\n{headers}", file=stream)
+  print("-" * len(headers), file=stream)
+
+  for ticket in tickets:
+    print(generate_row(ticket, KEYS, col_width), file=stream)
+
+def render_batched(tickets: List[Dict], stream: io.StringIO) -> None:
+  stream.write(render_table(tickets, KEYS, HEADERS))
+
+def measure(render: Callable[[List[Dict], io.StringIO], None], tickets: List[Dict]) -> float:
+  stream = io.StringIO()
+  start = time.perf_counter()
+  render(tickets, stream)
+  return time.perf_counter() - start
+
+def main(*sizes: int) -> None:
+  for size in sizes or (100, 10000, 1000000):
+    tickets = [make_ticket(ticket_id) for ticket_id in range(1, size + 1)]
+    per_cell = measure(render_per_cell, tickets)
+    batched = measure(render_batched, tickets)
+
+    print(
+      f"{size:>9} rows  per cell {per_cell * 1000:10.2f} ms  "
+      f"batched {batched * 1000:10.2f} ms  speed-up {per_cell / batched:5.1f}x"
+    )
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:]))
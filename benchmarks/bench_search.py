@@ -0,0 +1,60 @@
+"""
+Compare finding the open urgent tickets by paging through every ticket
+of the account against asking the search API for them
+
+Usage: python -m benchmarks.bench_search [tickets]
+"""
+
+import sys
+import time
+from typing import Callable, List
+
+from benchmarks.stub_server import StubServer
+from ticket_viewer.ticket_viewer import MAX_PAGE_SIZE, Ticket, TicketViewer
+
+FILTERS = {"status": "open", "priority": "urgent"}
+
+def scan_all(ticket_viewer: TicketViewer) -> List[Ticket]:
+  """
+  Download every ticket and keep the matching ones
+  """
+
+  return [
+    ticket for ticket in ticket_viewer.iter_tickets()
+    if ticket.status == FILTERS["status"] and ticket.priority == FILTERS["priority"]
+  ]
+
+def search(ticket_viewer: TicketViewer) -> List[Ticket]:
+  """
+  Follow the pages of search results, which only hold matching tickets
+  """
+
+  tickets = []
+  link = ticket_viewer.search_link(FILTERS, page_size=MAX_PAGE_SIZE)
+
+  while link is not None:
+    response = ticket_viewer.get_tickets(link, use_cache=False)
+    tickets.extend(response.tickets)
+    link = response.next_link
+
+  return tickets
+
+def measure(name: str, find: Callable[[TicketViewer], List[Ticket]], size: int) -> None:
+  with StubServer(ticket_count=size) as server:
+    with TicketViewer(server.url, "email", "password") as ticket_viewer:
+      start = time.perf_counter()
+      tickets = find(ticket_viewer)
+      elapsed = time.perf_counter() - start
+
+    print(
+      f"  {name:<9} {len(tickets):6} tickets  {server.requests_served:6} requests  "
+      f"{server.bytes_served / 1024:10.1f} KiB  {elapsed * 1000:9.1f} ms"
+    )
+
+def main(size: int = 20000) -> None:
+  print(f"open urgent tickets out of {size}")
+  measure("scan all", scan_all, size)
+  measure("search", search, size)
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
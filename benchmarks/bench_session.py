@@ -0,0 +1,57 @@
+"""
+Compare a new connection per request (module-level requests.get)
+against TicketViewer's pooled keep-alive session
+
+Usage: python -m benchmarks.bench_session [requests]
+"""
+
+import sys
+import time
+import statistics
+from typing import Callable, List
+
+import requests
+
+from benchmarks.stub_server import StubServer
+from ticket_viewer.ticket_viewer import TicketViewer
+
+def measure(call: Callable[[], object], repeat: int) -> List[float]:
+  """
+  Time each call in milliseconds
+  """
+
+  latencies = []
+
+  for _ in range(repeat):
+    start = time.perf_counter()
+    call()
+    latencies.append((time.perf_counter() - start) * 1000)
+
+  return latencies
+
+def report(name: str, latencies: List[float]) -> None:
+  latencies = sorted(latencies)
+  p95 = latencies[int(len(latencies) * 0.95) - 1]
+  print(
+    f"{name:<22} mean {statistics.mean(latencies):7.3f} ms  "
+    f"p50 {statistics.median(latencies):7.3f} ms  p95 {p95:7.3f} ms"
+  )
+
+def main(repeat: int = 500) -> None:
+  with StubServer(ticket_count=100) as server:
+    link = f"{server.url}/api/v2/tickets.json?page[size]=25&sort=-updated_at"
+
+    per_call = measure(
+      lambda: requests.get(link, auth=("email", "password"), timeout=(3.05, 30)),
+      repeat
+    )
+
+    with TicketViewer(server.url, "email", "password") as ticket_viewer:
+      pooled = measure(lambda: ticket_viewer.get_tickets(link), repeat)
+
+  print(f"{repeat} GET requests of 25 tickets against {server.url}")
+  report("connection per call", per_call)
+  report("pooled session", pooled)
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,108 @@
+"""
+Measure how long `python -m ticket_viewer` takes from a cold start
+to showing the first prompt of the menu, and list the modules
+that take the longest to import (from python -X importtime)
+
+Usage: python -m benchmarks.bench_startup [runs]
+"""
+
+import os
+import re
+import sys
+import time
+import compileall
+import statistics
+import tempfile
+import subprocess
+from typing import Dict, List, Tuple
+
+import ticket_viewer
+from benchmarks.stub_server import StubServer
+
+PROMPT = "Select view options:"
+# e.g. 'import time:       776 |      86920 |       requests'
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def time_to_prompt(env: Dict[str, str]) -> float:
+  """
+  Start the app and wait for its first prompt, then quit
+  """
+
+  start = time.perf_counter()
+  process = subprocess.Popen(
+    [sys.executable, "-m", "ticket_viewer"],
+    stdin=subprocess.PIPE,
+    stdout=subprocess.PIPE,
+    stderr=subprocess.DEVNULL,
+    env=env,
+    text=True
+  )
+
+  for line in process.stdout:
+    if PROMPT in line:
+      break
+
+  elapsed = time.perf_counter() - start
+  process.communicate("quit\n")
+
+  return elapsed
+
+def slowest_imports(env: Dict[str, str], count: int = 10) -> List[Tuple[int, str]]:
+  """
+  Cumulative import time in microseconds of the slowest
+  modules imported directly by the app's own modules
+  """
+
+  output = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", "import ticket_viewer.cli"],
+    env=env,
+    capture_output=True,
+    text=True
+  ).stderr
+
+  # Modules are listed after the ones they import, indented one level deeper
+  timings = []
+  parents: List[Tuple[int, str]] = []
+
+  for match in reversed(list(IMPORT_TIME.finditer(output))):
+    cumulative, depth, name = int(match[2]), len(match[3]), match[4]
+
+    while parents and parents[-1][0] >= depth:
+      parents.pop()
+
+    if parents and parents[-1][1].startswith("ticket_viewer") and not name.startswith("ticket_viewer"):
+      timings.append((cumulative, name))
+
+    parents.append((depth, name))
+
+  return sorted(timings, reverse=True)[:count]
+
+def main(runs: int = 10) -> None:
+  # Start from up to date bytecode like an installed app does,
+  # instead of measuring the compilation of the sources
+  compileall.compile_dir(os.path.dirname(sys.modules["ticket_viewer"].__file__), quiet=1)
+
+  with StubServer(ticket_count=60) as server, tempfile.TemporaryDirectory() as directory:
+    env = dict(os.environ, secretUrl=server.url, secretEmail="email", secretPassword="password")
+    env.pop("cacheDir", None)
+    env.pop("indexDir", None)
+    # The cache and the index are only opened once an option needs them
+    configurations = {
+      "": env,
+      " (cacheDir, indexDir)": dict(
+        env, cacheDir=os.path.join(directory, "cache"), indexDir=os.path.join(directory, "index")
+      )
+    }
+
+    for label, configuration in configurations.items():
+      timings = [time_to_prompt(configuration) for _ in range(runs)]
+
+      print(f"start to first prompt{label}  median {statistics.median(timings) * 1000:7.1f} ms  "
+            f"min {min(timings) * 1000:7.1f} ms  ({runs} runs)")
+    print("slowest imports of 'import ticket_viewer.cli'")
+
+    for cumulative, name in slowest_imports(env):
+      print(f"  {name:<40} {cumulative / 1000:7.1f} ms")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,42 @@
+"""
+Measure how long loading tickets into TicketStats takes, and the latency
+of counting them by one or two properties and by day or week
+
+Usage: python -m benchmarks.bench_stats [tickets]
+"""
+
+import sys
+import time
+from typing import Any, Callable
+
+from benchmarks.stub_server import make_ticket
+from ticket_viewer.stats import TicketStats
+from ticket_viewer.ticket_viewer import extract_ticket_fields
+from ticket_viewer.util import timezone
+
+def measure(name: str, aggregate: Callable[[], Any], runs: int = 5) -> None:
+  timings = []
+
+  for _ in range(runs):
+    start = time.perf_counter()
+    aggregate()
+    timings.append(time.perf_counter() - start)
+
+  print(f"  {name:<28} {min(timings) * 1000:8.1f} ms")
+
+def main(size: int = 1000000) -> None:
+  tickets = [extract_ticket_fields(make_ticket(ticket_id)) for ticket_id in range(1, size + 1)]
+
+  start = time.perf_counter()
+  stats = TicketStats.of(tickets)
+  print(f"{size} tickets loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+  sgt = timezone("Asia/Singapore")
+  measure("count by status", lambda: stats.count_by("status"))
+  measure("count by status, priority", lambda: stats.count_by("status", "priority"))
+  measure("count by day (UTC)", lambda: stats.histogram("day"))
+  measure("count by day (SGT)", lambda: stats.histogram("day", sgt))
+  measure("count by week (SGT)", lambda: stats.histogram("week", sgt))
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
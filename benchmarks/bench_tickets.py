@@ -0,0 +1,74 @@
+"""
+Compare the memory and speed of per-ticket dicts against Ticket records
+
+Usage: python -m benchmarks.bench_tickets [tickets]
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.stub_server import make_ticket
+from ticket_viewer.ticket_viewer import TICKET_FIELDS, Ticket, extract_ticket_fields
+
+def to_dict(ticket: Dict[str, Any]) -> Dict[str, Any]:
+  """
+  What get_tickets used to build for every ticket
+  """
+
+  return {key: ticket[key] for key in TICKET_FIELDS}
+
+def build(make: Callable[[Dict[str, Any]], Any], payload: List[Dict]) -> Tuple[List, float, int]:
+  """
+  Build one record per ticket, measuring the time taken and
+  the memory held by the records (not by the values they share with the payload)
+  """
+
+  gc.collect()
+  tracemalloc.start()
+  start = time.perf_counter()
+  records = list(map(make, payload))
+  elapsed = time.perf_counter() - start
+  size = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+
+  return records, elapsed, size
+
+def scan(records: List, getter: Callable) -> float:
+  """
+  Read every displayed property of every record, like the renderer does
+  """
+
+  start = time.perf_counter()
+  for key in TICKET_FIELDS:
+    list(map(getter(key), records))
+
+  return time.perf_counter() - start
+
+def main(size: int = 1000000) -> None:
+  payload = [make_ticket(ticket_id) for ticket_id in range(1, size + 1)]
+
+  dicts, dict_time, dict_size = build(to_dict, payload)
+  dict_scan = scan(dicts, itemgetter)
+  del dicts
+
+  tickets, ticket_time, ticket_size = build(extract_ticket_fields, payload)
+  ticket_scan = scan(tickets, attrgetter)
+  del tickets
+
+  print(f"{size} tickets")
+  print(
+    f"  dict    {dict_size / 2 ** 20:8.1f} MiB  build {dict_time * 1000:8.1f} ms"
+    f"  scan {dict_scan * 1000:8.1f} ms"
+  )
+  print(
+    f"  Ticket  {ticket_size / 2 ** 20:8.1f} MiB  build {ticket_time * 1000:8.1f} ms"
+    f"  scan {ticket_scan * 1000:8.1f} ms"
+  )
+  print(f"  memory saved {1 - ticket_size / dict_size:.0%}")
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
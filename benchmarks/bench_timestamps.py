@@ -0,0 +1,63 @@
+"""
+Compare convert_to_sgt against TimestampFormatter
+on a column of 'updated_at' values
+
+Usage: python -m benchmarks.bench_timestamps [rows]
+"""
+
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from ticket_viewer.util import TimestampFormatter, convert_to_sgt
+
+def make_column(size: int, span: timedelta) -> List[str]:
+  """
+  Random 'updated_at' values within a span of time
+  """
+
+  random.seed(size)
+  start = datetime(2021, 1, 1)
+  seconds = int(span.total_seconds())
+
+  return [
+    (start + timedelta(seconds=random.randrange(seconds))).strftime("%Y-%m-%dT%H:%M:%SZ")
+    for _ in range(size)
+  ]
+
+def measure(convert: Callable[[List[str]], List[str]], column: List[str]) -> float:
+  start = time.perf_counter()
+  convert(column)
+  return time.perf_counter() - start
+
+def main(size: int = 100000) -> None:
+  columns = {
+    "within a week": make_column(size, timedelta(days=7)),
+    "within ten years": make_column(size, timedelta(days=3650))
+  }
+
+  for name, column in columns.items():
+    baseline = measure(lambda column: [convert_to_sgt(value) for value in column], column)
+
+    # A new formatter each time, so its cache starts empty
+    per_value = measure(
+      lambda column: list(map(TimestampFormatter().format, column)),
+      column
+    )
+    batched = measure(lambda column: TimestampFormatter().format_column(column), column)
+
+    print(f"{size} timestamps {name}")
+    print(f"  convert_to_sgt                   {baseline * 1000:9.2f} ms")
+    print(
+      f"  TimestampFormatter.format        {per_value * 1000:9.2f} ms"
+      f"  speed-up {baseline / per_value:5.1f}x"
+    )
+    print(
+      f"  TimestampFormatter.format_column {batched * 1000:9.2f} ms"
+      f"  speed-up {baseline / batched:5.1f}x"
+    )
+
+if __name__ == "__main__":
+  main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,544 @@
+"""
+A local stub of the Zendesk tickets API used by the benchmarks
+so that they can run offline against synthetic tickets
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlencode, urlsplit, parse_qs
+
+BASE_TIME = datetime(2021, 12, 1)
+STATUSES = ("new", "open", "pending", "hold", "solved", "closed")
+PRIORITIES = (None, "low", "normal", "high", "urgent")
+TYPES = (None, "problem", "incident", "question", "task")
+# Search API terms such as 'status:open' or 'updated>2021-12-01'
+SEARCH_TERM = re.compile(r"(\w+)([:<>])(\S+)")
+# The search API does not return matches beyond the first 1000
+MAX_SEARCH_RESULTS = 1000
+FILLER = "The quick brown fox jumps over the lazy dog. "
+# Synthetic people tickets are shared between
+USER_COUNT = 50
+ORGANIZATION_COUNT = 10
+# Tickets have from 1 up to this many comments
+MAX_COMMENTS = 30
+
+@lru_cache(maxsize=8)
+def make_description(size: int) -> str:
+  return (FILLER * (size // len(FILLER) + 1))[:size]
+
+def make_ticket(ticket_id: int, payload_size: int = 0) -> Dict:
+  """
+  Build a synthetic ticket whose fields only depend on its ID
+  (higher IDs are more recently updated). With a payload_size,
+  the ticket also has a description of that many characters,
+  like the properties real tickets have but the viewer does not show
+  """
+
+  updated_at = BASE_TIME + timedelta(minutes=ticket_id)
+
+  ticket = {
+    "id": ticket_id,
+    "updated_at": updated_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    "type": TYPES[ticket_id % len(TYPES)],
+    "subject": f"synthetic ticket number {ticket_id}",
+    "priority": PRIORITIES[ticket_id % len(PRIORITIES)],
+    "status": STATUSES[ticket_id % len(STATUSES)]
+  }
+
+  if payload_size:
+    ticket["description"] = make_description(payload_size)
+
+  return ticket
+
+def make_user(user_id: int) -> Dict:
+  return {"id": user_id, "name": f"User {user_id}", "email": f"user{user_id}@example.com"}
+
+def make_organization(organization_id: int) -> Dict:
+  return {"id": organization_id, "name": f"Organization {organization_id}"}
+
+def make_ticket_detail(ticket_id: int, payload_size: int = 0) -> Dict:
+  """
+  Build a synthetic ticket with the people and organization it belongs to,
+  as the ticket endpoint returns it. New tickets are not assigned yet
+  """
+
+  ticket = make_ticket(ticket_id, payload_size)
+  requester_id = ticket_id % USER_COUNT + 1
+
+  ticket.setdefault("description", f"Description of ticket {ticket_id}")
+  ticket["requester_id"] = requester_id
+  ticket["assignee_id"] = None if ticket["status"] == "new" else (ticket_id * 7) % USER_COUNT + 1
+  ticket["organization_id"] = requester_id % ORGANIZATION_COUNT + 1
+
+  return ticket
+
+def make_comments(ticket_id: int) -> List[Dict]:
+  """
+  Build the comment thread of a synthetic ticket, the oldest first,
+  written alternately by its requester and by other people
+  """
+
+  ticket = make_ticket_detail(ticket_id)
+  count = ticket_id % MAX_COMMENTS + 1
+  comments = []
+
+  for idx in range(count):
+    author_id = ticket["requester_id"] if idx % 2 == 0 else (ticket_id + idx) % USER_COUNT + 1
+    created_at = BASE_TIME + timedelta(minutes=ticket_id - count + idx)
+    comments.append({
+      "id": ticket_id * 1000 + idx,
+      "author_id": author_id,
+      "body": ticket["description"] if idx == 0 else f"Comment {idx} on ticket {ticket_id}",
+      "public": idx % 4 != 3,
+      "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+    })
+
+  return comments
+
+class StubHandler(BaseHTTPRequestHandler):
+  """
+  Serve the subset of the Zendesk tickets API used by TicketViewer
+  """
+
+  protocol_version = "HTTP/1.1" # Keep connections alive between requests
+  disable_nagle_algorithm = True # Headers and body are written separately
+
+  def log_message(self, format: str, *args) -> None:
+    pass
+
+  def send_json(self, status_code: int, body: Dict) -> None:
+    payload = json.dumps(body).encode()
+    etag = f'W/"{hashlib.md5(payload).hexdigest()}"'
+
+    # The client already has this exact response
+    if status_code == 200 and self.headers.get("If-None-Match") == etag:
+      self.send_response(304)
+      self.send_header("ETag", etag)
+      self.send_rate_limit_headers(304)
+      self.send_header("Content-Length", "0")
+      self.end_headers()
+      return
+
+    self.send_response(status_code)
+    self.send_header("Content-Type", "application/json; charset=UTF-8")
+    self.send_header("Content-Length", str(len(payload)))
+    self.send_header("ETag", etag)
+    self.send_rate_limit_headers(status_code)
+    self.end_headers()
+    self.wfile.write(payload)
+
+    with self.server.lock:
+      self.server.bytes_served += len(payload)
+
+  def send_rate_limit_headers(self, status_code: int) -> None:
+    remaining = max(self.server.rate_limit - self.server.window_requests, 0)
+    self.send_header("X-Rate-Limit", str(self.server.rate_limit))
+    self.send_header("X-Rate-Limit-Remaining", str(remaining))
+
+    if status_code == 429:
+      self.send_header("Retry-After", str(self.server.retry_after))
+
+  def do_GET(self) -> None:
+    url = urlsplit(self.path)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    path = url.path
+    size = self.server.ticket_count
+    make_ticket = self.make_ticket
+
+    with self.server.lock:
+      self.server.requests_served += 1
+
+      # Count requests in fixed one-minute windows like the real API
+      window = int(time.monotonic() // 60)
+      if window != self.server.window:
+        self.server.window, self.server.window_requests = window, 0
+      self.server.window_requests += 1
+
+      is_throttled = self.server.window_requests > self.server.rate_limit
+      if self.server.throttle_next > 0:
+        self.server.throttle_next -= 1
+        is_throttled = True
+      elif self.server.throttle_rate and self.server.random.random() < self.server.throttle_rate:
+        is_throttled = True
+
+    # Every response takes at least as long as a round-trip to the real API
+    if self.server.latency:
+      time.sleep(self.server.latency)
+
+    if is_throttled:
+      self.send_json(429, {"error": "APIRateLimitExceeded"})
+      return
+
+    if path == "/api/v2/tickets/count.json":
+      self.send_json(200, {"count": {"value": size}})
+
+    elif path == "/api/v2/tickets/show_many.json":
+      ids = [int(ticket_id) for ticket_id in query.get("ids", "").split(",") if ticket_id]
+
+      if len(ids) > 100:
+        self.send_json(400, {"error": "TooManyIds"})
+      else:
+        self.send_json(
+          200,
+          {"tickets": [make_ticket(ticket_id) for ticket_id in ids if 1 <= ticket_id <= size]}
+        )
+
+    elif path == "/api/v2/tickets.json":
+      self.send_json(200, self.list_tickets(query))
+
+    elif path == "/api/v2/search.json":
+      results = self.search_tickets(query)
+
+      if results is None:
+        self.send_json(422, {"error": "InvalidPage"})
+      else:
+        self.send_json(200, results)
+
+    elif path == "/api/v2/incremental/tickets/cursor.json":
+      self.send_json(200, self.export_tickets(query))
+
+    elif path == "/api/v2/users/show_many.json":
+      ids = [int(user_id) for user_id in query.get("ids", "").split(",") if user_id]
+
+      if len(ids) > 100:
+        self.send_json(400, {"error": "TooManyIds"})
+      else:
+        self.send_json(200, {"users": [make_user(user_id) for user_id in ids if 1 <= user_id <= USER_COUNT]})
+
+    elif path.startswith("/api/v2/tickets/") and path.endswith("/comments.json"):
+      ticket_id = path[len("/api/v2/tickets/"):-len("/comments.json")]
+
+      if ticket_id.isdigit() and 1 <= int(ticket_id) <= size:
+        self.send_json(200, self.list_comments(int(ticket_id), query))
+      else:
+        self.send_json(404, {"error": "RecordNotFound"})
+
+    elif path.startswith("/api/v2/tickets/") and path.endswith(".json"):
+      ticket_id = path[len("/api/v2/tickets/"):-len(".json")]
+
+      if ticket_id.isdigit() and 1 <= int(ticket_id) <= size:
+        self.send_json(200, self.show_ticket(int(ticket_id), query))
+      else:
+        self.send_json(404, {"error": "RecordNotFound"})
+
+    else:
+      self.send_json(404, {"error": "InvalidEndpoint"})
+
+  def make_ticket(self, ticket_id: int) -> Dict:
+    return make_ticket(ticket_id, self.server.payload_size)
+
+  def show_ticket(self, ticket_id: int, query: Dict[str, str]) -> Dict:
+    """
+    A ticket, with its people and organization sideloaded when asked
+    for through include (e.g. 'users,organizations')
+    """
+
+    ticket = make_ticket_detail(ticket_id, self.server.payload_size)
+    include = query.get("include", "").split(",")
+    body: Dict[str, Any] = {"ticket": ticket}
+
+    if "users" in include:
+      user_ids = dict.fromkeys(ticket[key] for key in ("requester_id", "assignee_id") if ticket[key])
+      body["users"] = [make_user(user_id) for user_id in user_ids]
+
+    if "organizations" in include:
+      body["organizations"] = [make_organization(ticket["organization_id"])]
+
+    return body
+
+  def list_comments(self, ticket_id: int, query: Dict[str, str]) -> Dict:
+    """
+    Offset pagination over the comments of a ticket, the oldest first,
+    with their authors sideloaded when asked for through include
+    """
+
+    comments = make_comments(ticket_id)
+    per_page = min(int(query.get("per_page", 100)), 100)
+    page = int(query.get("page", 1))
+    start = (page - 1) * per_page
+    base = f"http://{self.headers['Host']}/api/v2/tickets/{ticket_id}/comments.json?per_page={per_page}"
+
+    body: Dict[str, Any] = {
+      "comments": comments[start:start + per_page],
+      "count": len(comments),
+      "next_page": f"{base}&page={page + 1}" if start + per_page < len(comments) else None,
+      "previous_page": f"{base}&page={page - 1}" if page > 1 else None
+    }
+
+    if "users" in query.get("include", "").split(","):
+      user_ids = dict.fromkeys(comment["author_id"] for comment in body["comments"])
+      body["users"] = [make_user(user_id) for user_id in user_ids]
+
+    return body
+
+  def list_tickets(self, query: Dict[str, str]) -> Dict:
+    """
+    Cursor pagination over tickets sorted by most recently updated first,
+    where a cursor is simply the ID of the ticket at the edge of a page
+    """
+
+    page_size = min(int(query.get("page[size]", 100)), 100)
+    after = query.get("page[after]")
+    before = query.get("page[before]")
+
+    count = self.server.ticket_count
+    sort = query.get("sort", "-updated_at")
+    is_ascending = sort in ("id", "updated_at")
+
+    # Ticket IDs are listed from 1 up to the highest (least recently updated first)
+    if is_ascending:
+      if before is not None:
+        start = int(before)
+        ids = list(range(max(start - page_size, 1), start))
+      else:
+        start = int(after) + 1 if after is not None else 1
+        ids = list(range(start, min(start + page_size, count + 1)))
+
+    # Ticket IDs are listed from the highest (most recently updated) down to 1
+    elif before is not None:
+      end = min(int(before) + page_size, count)
+      start = int(before)
+      ids = list(range(end, start, -1))
+    else:
+      start = int(after) - 1 if after is not None else count
+      ids = list(range(start, max(start - page_size, 0), -1))
+
+    base = f"http://{self.headers['Host']}/api/v2/tickets.json?page[size]={page_size}&sort={sort}"
+    first_id: Optional[int] = ids[0] if ids else None
+    last_id: Optional[int] = ids[-1] if ids else None
+
+    return {
+      "tickets": [self.make_ticket(ticket_id) for ticket_id in ids],
+      "meta": {
+        "has_more": bool(last_id and last_id != (count if is_ascending else 1)),
+        "after_cursor": str(last_id) if last_id else None,
+        "before_cursor": str(first_id) if first_id else None
+      },
+      "links": {
+        "prev": f"{base}&page[before]={first_id if first_id else start}",
+        "next": f"{base}&page[after]={last_id if last_id else 1}"
+      }
+    }
+
+  def search_tickets(self, query: Dict[str, str]) -> Optional[Dict]:
+    """
+    Search for tickets matching every term of the query (and any of
+    the values given for the same property), with offset pagination.
+    Returns None for pages beyond the first 1000 results
+    """
+
+    conditions: Dict[str, List[Callable[[Dict], bool]]] = {}
+
+    for keyword, operator, value in SEARCH_TERM.findall(query.get("query", "")):
+      if keyword == "type":
+        continue
+
+      if operator == ":":
+        key = "type" if keyword == "ticket_type" else keyword
+        condition = lambda ticket, key=key, value=value: ticket[key] == value
+      elif operator == ">":
+        condition = lambda ticket, value=value: ticket["updated_at"][:10] > value
+      else:
+        condition = lambda ticket, value=value: ticket["updated_at"][:10] < value
+
+      conditions.setdefault(keyword + operator, []).append(condition)
+
+    ids = range(self.server.ticket_count, 0, -1)
+    if query.get("sort_order") == "asc":
+      ids = range(1, self.server.ticket_count + 1)
+
+    # Keep the matches of the last search so that following its pages is cheap
+    key = (query.get("query"), ids)
+    matches = self.server.last_search.get(key)
+
+    if matches is None:
+      matches = [
+        ticket for ticket in map(self.make_ticket, ids)
+        if all(any(condition(ticket) for condition in group) for group in conditions.values())
+      ]
+      self.server.last_search = {key: matches}
+
+    per_page = min(int(query.get("per_page", 100)), 100)
+    page = int(query.get("page", 1))
+
+    if page < 1 or (page - 1) * per_page >= MAX_SEARCH_RESULTS:
+      return None
+
+    def page_link(number: int) -> Optional[str]:
+      if number < 1 or (number - 1) * per_page >= min(len(matches), MAX_SEARCH_RESULTS):
+        return None
+
+      params = {key: value for key, value in query.items() if key != "page"}
+      return f"http://{self.headers['Host']}/api/v2/search.json?{urlencode(params)}&page={number}"
+
+    return {
+      "results": matches[(page - 1) * per_page:page * per_page],
+      "count": len(matches),
+      "previous_page": page_link(page - 1),
+      "next_page": page_link(page + 1)
+    }
+
+  def export_tickets(self, query: Dict[str, str]) -> Dict:
+    """
+    Incremental export over tickets sorted by least recently updated first,
+    where a cursor is the ID of the last exported ticket
+    """
+
+    if "cursor" in query:
+      after = int(query["cursor"])
+    else:
+      # Ticket IDs are one minute apart, starting a minute after BASE_TIME
+      start_time = datetime.fromtimestamp(int(query.get("start_time", 0)), timezone.utc)
+      start_time = start_time.replace(tzinfo=None)
+      after = max(math.ceil((start_time - BASE_TIME) / timedelta(minutes=1)) - 1, 0)
+
+    page_size = min(int(query.get("per_page", 1000)), 1000)
+    ids = range(after + 1, min(after + page_size, self.server.ticket_count) + 1)
+
+    return {
+      "tickets": [self.make_ticket(ticket_id) for ticket_id in ids],
+      "after_cursor": str(ids[-1] if ids else after),
+      "end_of_stream": (ids[-1] if ids else after) >= self.server.ticket_count
+    }
+
+class StubServer:
+  """
+  Run the stub API on a background thread, e.g.
+
+    with StubServer(ticket_count=1000) as server:
+      TicketViewer(server.url, "email", "password")
+  """
+
+  def __init__(
+    self,
+    ticket_count: int = 100,
+    port: int = 0,
+    rate_limit: int = 100000,
+    retry_after: int = 0,
+    latency: float = 0,
+    payload_size: int = 0,
+    throttle_rate: float = 0
+  ) -> None:
+    self.httpd = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    self.httpd.daemon_threads = True
+    self.httpd.ticket_count = ticket_count
+    self.httpd.requests_served = 0
+    self.httpd.bytes_served = 0 # Bytes of response bodies sent
+    self.httpd.last_search = {}
+    self.httpd.lock = threading.Lock()
+    self.httpd.rate_limit = rate_limit # Requests allowed per minute
+    self.httpd.retry_after = retry_after # Seconds sent in Retry-After with a 429
+    self.httpd.throttle_next = 0 # Number of upcoming requests answered with a 429
+    self.httpd.throttle_rate = throttle_rate # Share of requests answered with a 429
+    self.httpd.random = random.Random(0) # Throttles the same requests on every run
+    self.httpd.latency = latency # Seconds added before every response
+    self.httpd.payload_size = payload_size # Characters of description per ticket
+    self.httpd.window = 0
+    self.httpd.window_requests = 0
+    self.thread = threading.Thread(
+      target=self.httpd.serve_forever,
+      kwargs={"poll_interval": 0.05},
+      daemon=True
+    )
+
+  @property
+  def url(self) -> str:
+    host, port = self.httpd.server_address[:2]
+    return f"http://{host}:{port}"
+
+  @property
+  def ticket_count(self) -> int:
+    return self.httpd.ticket_count
+
+  @ticket_count.setter
+  def ticket_count(self, ticket_count: int) -> None:
+    self.httpd.ticket_count = ticket_count
+
+  def throttle(self, requests: int) -> None:
+    """
+    Answer the next requests with 429 Too Many Requests
+    """
+
+    with self.httpd.lock:
+      self.httpd.throttle_next = requests
+
+  @property
+  def requests_served(self) -> int:
+    return self.httpd.requests_served
+
+  @property
+  def bytes_served(self) -> int:
+    return self.httpd.bytes_served
+
+  def __enter__(self) -> "StubServer":
+    self.thread.start()
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.httpd.shutdown()
+    self.httpd.server_close()
+
+def serve(options: Dict[str, Any], urls: multiprocessing.Queue, done: multiprocessing.Event) -> None:
+  with StubServer(**options) as server:
+    urls.put(server.url)
+    done.wait()
+
+@contextmanager
+def stub_process(**options: Any) -> Iterator[str]:
+  """
+  Run the stub API in another process and give its URL, so that
+  serving pages does not compete with the client for the interpreter lock
+  """
+
+  urls: multiprocessing.Queue = multiprocessing.Queue()
+  done = multiprocessing.Event()
+  process = multiprocessing.Process(target=serve, args=(options, urls, done))
+  process.start()
+
+  try:
+    yield urls.get()
+  finally:
+    done.set()
+    process.join()
+
+def main(argv: Optional[List[str]] = None) -> None:
+  parser = argparse.ArgumentParser(
+    prog="python -m benchmarks.stub_server",
+    description="Serve synthetic tickets until interrupted"
+  )
+  parser.add_argument("--tickets", type=int, default=100, help="number of tickets (default: 100)")
+  parser.add_argument("--port", type=int, default=0, help="port to listen on (default: any free port)")
+  parser.add_argument("--latency", type=float, default=0, help="seconds added before every response")
+  parser.add_argument("--payload-size", type=int, default=0, help="characters of description per ticket")
+  parser.add_argument("--throttle-rate", type=float, default=0, help="share of requests answered with a 429")
+  args = parser.parse_args(argv)
+
+  with StubServer(
+    ticket_count=args.tickets,
+    port=args.port,
+    latency=args.latency,
+    payload_size=args.payload_size,
+    throttle_rate=args.throttle_rate
+  ) as server:
+    print(f"Serving {args.tickets} tickets at {server.url}", file=sys.stderr)
+
+    try:
+      server.thread.join()
+    except KeyboardInterrupt:
+      pass
+
+if __name__ == "__main__":
+  main()
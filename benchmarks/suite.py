@@ -0,0 +1,320 @@
+"""
+Run every scenario of the offline benchmark suite against the stub API
+(running in its own process) and record throughput, latency and memory
+as JSON, optionally failing when they regress against a baseline:
+
+  page_through  TicketViewer.iter_tickets over every ticket
+  show_many     TicketViewer.get_tickets_by_ids over a sample of IDs
+  render_*      write_tickets as a table, a JSON array and NDJSON,
+                and how long the first row takes
+  cli_list      `python -m ticket_viewer list -f ndjson` end to end
+  crawl         crawl_tickets by ID range with CRAWL_PROCESSES processes
+
+Usage:
+  python -m benchmarks.suite --tickets 100000 --output results.json
+  python -m benchmarks.suite --output results.json --baseline baseline.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.stub_server import make_ticket, stub_process
+from ticket_viewer.crawl import crawl_tickets
+from ticket_viewer.instrumentation import Instrumentation, Profiler, RequestEvent, percentile
+from ticket_viewer.rate_limit import RateLimiter
+from ticket_viewer.ticket_viewer import TicketViewer, extract_ticket_fields
+from ticket_viewer.util import OUTPUT_FORMATS, write_tickets
+
+Metrics = Dict[str, float]
+
+# Tickets rendered by the render_* scenarios, however many the stub serves
+MAX_RENDER_ROWS = 100000
+# IDs looked up by the show_many scenario
+SHOW_MANY_IDS = 5000
+# Processes of the crawl scenario
+CRAWL_PROCESSES = 4
+DEFAULT_TOLERANCE = 0.25
+
+def get_ticket_viewer(url: str, instrumentation: Instrumentation) -> TicketViewer:
+  # Retry throttled requests as soon as the stub allows, so that
+  # the number of 429s does not make timings depend on random delays
+  return TicketViewer(
+    url,
+    "email",
+    "password",
+    rate_limiter=RateLimiter(jitter=0),
+    instrumentation=instrumentation
+  )
+
+def summarize_requests(profiler: Profiler) -> Metrics:
+  """
+  Number of requests and retries, and percentiles of their latency
+  """
+
+  requests = [event for event in profiler.events if isinstance(event, RequestEvent)]
+  seconds = sorted(event.seconds for event in requests) or [0.0]
+
+  return {
+    "requests": len(requests),
+    "retries": sum(event.retries for event in requests),
+    "p50_ms": percentile(seconds, 50) * 1000,
+    "p95_ms": percentile(seconds, 95) * 1000,
+    "p99_ms": percentile(seconds, 99) * 1000
+  }
+
+def page_through(url: str, options: argparse.Namespace) -> Metrics:
+  instrumentation = Instrumentation()
+  profiler = Profiler()
+  instrumentation.subscribe(profiler)
+
+  with get_ticket_viewer(url, instrumentation) as ticket_viewer:
+    start = time.perf_counter()
+    count = sum(1 for _ in ticket_viewer.iter_tickets())
+    elapsed = time.perf_counter() - start
+
+  return {"tickets_per_second": count / elapsed, **summarize_requests(profiler)}
+
+def show_many(url: str, options: argparse.Namespace) -> Metrics:
+  instrumentation = Instrumentation()
+  profiler = Profiler()
+  instrumentation.subscribe(profiler)
+  ids = random.Random(0).sample(range(1, options.tickets + 1), min(SHOW_MANY_IDS, options.tickets))
+
+  with get_ticket_viewer(url, instrumentation) as ticket_viewer:
+    start = time.perf_counter()
+    response = ticket_viewer.get_tickets_by_ids(ids, max_concurrency=4)
+    elapsed = time.perf_counter() - start
+
+  if response.status_code != 200:
+    raise RuntimeError(f"show_many failed with status {response.status_code}")
+
+  return {"tickets_per_second": len(response.tickets) / elapsed, **summarize_requests(profiler)}
+
+class TimedStream(io.StringIO):
+  """
+  A stream recording when it was first written to
+  """
+
+  first_write: Optional[float] = None
+
+  def write(self, text: str) -> int:
+    if self.first_write is None:
+      self.first_write = time.perf_counter()
+
+    return super().write(text)
+
+def render(format: str) -> Callable[[str, argparse.Namespace], Metrics]:
+  def render_format(url: str, options: argparse.Namespace) -> Metrics:
+    tickets = [
+      extract_ticket_fields(make_ticket(ticket_id))
+      for ticket_id in range(1, min(options.tickets, MAX_RENDER_ROWS) + 1)
+    ]
+    stream = TimedStream()
+
+    start = time.perf_counter()
+    count = write_tickets(iter(tickets), format, stream=stream)
+    elapsed = time.perf_counter() - start
+
+    return {"rows_per_second": count / elapsed, "first_row_ms": (stream.first_write - start) * 1000}
+
+  return render_format
+
+def cli_list(url: str, options: argparse.Namespace) -> Metrics:
+  """
+  List every ticket through the CLI in a child process,
+  measuring its wall time and peak resident memory
+  """
+
+  env = dict(
+    os.environ,
+    secretUrl=url,
+    secretEmail="email",
+    secretPassword="password",
+    cacheDir="",
+    indexDir=""
+  )
+
+  start = time.perf_counter()
+  process = subprocess.Popen(
+    [sys.executable, "-m", "ticket_viewer", "list", "-f", "ndjson"],
+    stdout=subprocess.PIPE,
+    stderr=subprocess.DEVNULL,
+    env=env
+  )
+  count = sum(1 for _ in process.stdout)
+  process.stdout.close()
+  # Wait for the process ourselves to get its resource usage
+  _, status, usage = os.wait4(process.pid, 0)
+  elapsed = time.perf_counter() - start
+  process.returncode = os.waitstatus_to_exitcode(status)
+
+  if process.returncode != 0:
+    raise RuntimeError(f"the CLI exited with {process.returncode}")
+
+  return {
+    "tickets_per_second": count / elapsed,
+    "seconds": elapsed,
+    # ru_maxrss is in KiB on Linux
+    "max_rss_mib": usage.ru_maxrss / 1024
+  }
+
+def crawl(url: str, options: argparse.Namespace) -> Metrics:
+  """
+  Crawl every ticket by ID range, so that every shard takes requests
+  of 100 tickets like paging through them does
+  """
+
+  with tempfile.TemporaryDirectory() as directory, get_ticket_viewer(url, Instrumentation()) as ticket_viewer:
+    result = crawl_tickets(
+      ticket_viewer,
+      os.path.join(directory, "tickets.jsonl"),
+      key="id",
+      processes=CRAWL_PROCESSES
+    )
+
+  if result.status_code != 200:
+    raise RuntimeError(f"crawl failed with status {result.status_code}")
+
+  return {"tickets_per_second": result.tickets_per_second, "seconds": result.seconds}
+
+SCENARIOS: Dict[str, Callable[[str, argparse.Namespace], Metrics]] = {
+  "page_through": page_through,
+  "show_many": show_many,
+  **{f"render_{format}": render(format) for format in OUTPUT_FORMATS},
+  "cli_list": cli_list,
+  "crawl": crawl
+}
+
+# Scenarios that run in this process, whose peak memory is traced
+IN_PROCESS_SCENARIOS = ("page_through", "show_many", *(f"render_{format}" for format in OUTPUT_FORMATS))
+
+def run_scenario(name: str, url: str, options: argparse.Namespace) -> Metrics:
+  """
+  Run a scenario for its timings, then once more while tracing
+  allocations (which slows it down) for its peak memory
+  """
+
+  metrics = SCENARIOS[name](url, options)
+
+  if name in IN_PROCESS_SCENARIOS:
+    tracemalloc.start()
+    SCENARIOS[name](url, options)
+    metrics["peak_memory_mib"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+
+  return metrics
+
+def is_higher_better(metric: str) -> bool:
+  return metric.endswith("_per_second")
+
+def find_regressions(
+  results: Dict[str, Metrics],
+  baseline: Dict[str, Metrics],
+  tolerance: float = DEFAULT_TOLERANCE
+) -> List[str]:
+  """
+  Describe every metric that is worse than in the baseline
+  by more than tolerance (a share of the baseline value)
+  """
+
+  regressions = []
+
+  for name, metrics in results.items():
+    for metric, value in metrics.items():
+      expected = baseline.get(name, {}).get(metric)
+
+      if not expected:
+        continue
+
+      if is_higher_better(metric):
+        is_regression = value < expected * (1 - tolerance)
+      else:
+        is_regression = value > expected * (1 + tolerance)
+
+      if is_regression:
+        regressions.append(
+          f"{name}.{metric}: {value:.2f} (baseline {expected:.2f}, {value / expected - 1:+.0%})"
+        )
+
+  return regressions
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+  parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__.split("\n\n")[0])
+  parser.add_argument("--tickets", type=int, default=100000, help="tickets served by the stub (default: 100000)")
+  parser.add_argument("--latency", type=float, default=0, help="seconds added before every response")
+  parser.add_argument("--payload-size", type=int, default=0, help="characters of description per ticket")
+  parser.add_argument("--throttle-rate", type=float, default=0, help="share of requests answered with a 429")
+  parser.add_argument(
+    "--scenario",
+    action="append",
+    choices=list(SCENARIOS),
+    help="scenario to run, can be repeated (default: all)"
+  )
+  parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+  parser.add_argument("--baseline", metavar="FILE", help="results to compare against, exits with 1 on a regression")
+  parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=DEFAULT_TOLERANCE,
+    help=f"share by which a metric may be worse than the baseline (default: {DEFAULT_TOLERANCE})"
+  )
+
+  return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+  options = parse_args(argv)
+  stub_options = {
+    "ticket_count": options.tickets,
+    "latency": options.latency,
+    "payload_size": options.payload_size,
+    "throttle_rate": options.throttle_rate
+  }
+  results: Dict[str, Metrics] = {}
+
+  with stub_process(**stub_options) as url:
+    for name in options.scenario or SCENARIOS:
+      results[name] = run_scenario(name, url, options)
+      print(f"{name:<14} " + "  ".join(f"{metric} {value:.2f}" for metric, value in results[name].items()))
+
+  report: Dict[str, Any] = {
+    "options": stub_options,
+    "environment": {
+      "python": platform.python_version(),
+      "platform": platform.platform(),
+      "cpus": os.cpu_count()
+    },
+    "results": results
+  }
+
+  if options.output:
+    with open(options.output, "w") as f:
+      json.dump(report, f, indent=2)
+
+  if options.baseline:
+    with open(options.baseline) as f:
+      baseline = json.load(f)
+
+    if baseline.get("options") != stub_options:
+      print("Warning: the baseline was recorded with other options", file=sys.stderr)
+
+    regressions = find_regressions(results, baseline["results"], options.tolerance)
+
+    for regression in regressions:
+      print(f"Regression: {regression}", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1,6 +1,29 @@
+import io
+import os
 import pytest
 import json
+import time
+import struct
+import asyncio
+from datetime import date
 
+from benchmarks import suite
+from benchmarks.stub_server import StubServer, make_ticket
+from ticket_viewer import detail
+from ticket_viewer.cache import TicketCache
+from ticket_viewer.cli import CLIApp, main
+from ticket_viewer.crawl import Shard, TicketCrawler, crawl_tickets, merge_shards, shard_path
+from ticket_viewer.detail import IdentityCache, TicketDetailViewer, User
+from ticket_viewer.export import DICT_COLUMN, EXPORT_FORMATS, STRING_COLUMN, decode_column, encode_column, export_tickets, read_columnar
+from ticket_viewer.instrumentation import ErrorEvent, Instrumentation, Profiler, RequestEvent, url_template
+from ticket_viewer.json_stream import JSONArrayStream
+from ticket_viewer.multi import Account, AccountError, MultiTicketViewer, read_accounts
+from ticket_viewer.pager import PagePrefetcher
+from ticket_viewer.rate_limit import RateLimiter
+from ticket_viewer.response_cache import ResponseCache
+from ticket_viewer.search import Segment, TicketIndex, bisect_key, parse_query
+from ticket_viewer.stats import TicketStats
+from ticket_viewer.watch import ScreenRegion, TicketWatcher
 from ticket_viewer.ticket_viewer import *
 from ticket_viewer.util import *
 
@@ -26,6 +49,13 @@ def vcr_config():
       "filter_headers": ["authorization"]
       }
 
+@pytest.fixture()
+def stub_server():
+  """Fixture that runs a local stub of the Zendesk API with 60 tickets."""
+
+  with StubServer(ticket_count=60) as server:
+    yield server
+
 @pytest.mark.vcr  
 def test_count_tickets():
   ticket_viewer = get_ticket_viewer()
@@ -46,6 +76,876 @@ def test_get_tickets(static_tickets_data):
   assert response.prev_link == static_tickets_data["links"]["prev"]
   assert response.next_link == static_tickets_data["links"]["next"]
 
+def test_pooled_session_reuses_connection(stub_server):
+  with TicketViewer(stub_server.url, "email", "password", read_timeout=5) as ticket_viewer:
+    assert ticket_viewer.timeout == (3.05, 5)
+    assert ticket_viewer.count_tickets().count == 60
+    assert len(ticket_viewer.get_tickets().tickets) == 25
+    assert ticket_viewer.get_individual_ticket("7").tickets[0]["id"] == 7
+
+    pool = ticket_viewer.session.get_adapter(stub_server.url) \
+      .poolmanager.connection_from_url(stub_server.url)
+    assert pool.num_connections == 1
+
+def test_async_get_many_tickets(stub_server):
+  async def fetch():
+    async with AsyncTicketViewer(
+      stub_server.url, "email", "password", max_concurrency=4
+    ) as ticket_viewer:
+      count = await ticket_viewer.count_tickets()
+      responses = await ticket_viewer.get_many_tickets(["3", "60", "61", "1"])
+      return count, responses
+
+  count, responses = asyncio.run(fetch())
+  assert count.count == 60
+  assert [response.status_code for response in responses] == [200, 200, 404, 200]
+  assert [responses[idx].tickets[0]["id"] for idx in (0, 1, 3)] == [3, 60, 1]
+
+  # Closing waits for the requests in flight without blocking the event loop
+  async def close_while_ticking():
+    ticks = []
+
+    async def tick():
+      while True:
+        ticks.append(time.monotonic())
+        await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+
+    async with AsyncTicketViewer(stub_server.url, "email", "password") as ticket_viewer:
+      ticket_viewer.executor.submit(time.sleep, 0.2)
+      await asyncio.sleep(0)
+
+    ticker.cancel()
+    return len(ticks)
+
+  assert asyncio.run(close_while_ticking()) > 5
+
+def test_get_tickets_by_ids(stub_server):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+  ids = [5, 70, *range(1, 61), 5, 99]
+  response = ticket_viewer.get_tickets_by_ids(ids)
+
+  assert response.status_code == 200
+  assert [ticket["id"] for ticket in response.tickets] == \
+    [5, *range(1, 5), *range(6, 61)]
+  assert response.missing_ids == [70, 99]
+  # 62 distinct IDs fit in a single show_many request
+  assert stub_server.requests_served == 1
+
+  # IDs that are not numbers are reported like other errors
+  assert ticket_viewer.get_tickets_by_ids(["5", "five"]).status_code == -1
+  assert stub_server.requests_served == 1
+
+@pytest.mark.parametrize("max_concurrency", [1, 3])
+def test_get_tickets_by_ids_batches(stub_server, max_concurrency):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+  response = ticket_viewer.get_tickets_by_ids(range(250, 0, -1), max_concurrency=max_concurrency)
+
+  assert [ticket.id for ticket in response.tickets] == list(range(60, 0, -1))
+  assert len(response.missing_ids) == 190
+  assert stub_server.requests_served == 3
+
+def test_get_tickets_filters(stub_server):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+  response = ticket_viewer.get_tickets(
+    filters={"status": ["open", "pending"], "priority": "urgent"},
+    fields=["status"]
+  )
+
+  assert response.status_code == 200
+  assert response.count == 4
+  assert [(ticket.id, ticket.status, ticket.subject) for ticket in response.tickets] == \
+    [(49, "open", None), (44, "pending", None), (19, "open", None), (14, "pending", None)]
+  assert response.next_link is None and response.has_more is False
+
+  # Search results are paged by page number
+  response = ticket_viewer.get_tickets(ticket_viewer.search_link({"status": "open"}, page_size=4))
+  next_page = ticket_viewer.get_tickets(response.next_link)
+  assert [ticket["id"] for ticket in next_page.tickets] == [31, 25, 19, 13]
+  assert next_page.prev_link == response.next_link.replace("page=2", "page=1")
+
+  with pytest.raises(ValueError):
+    ticket_viewer.get_tickets(filters={"status": "urgent"})
+
+  with pytest.raises(ValueError):
+    ticket_viewer.get_tickets(fields=["description"])
+
+def test_response_cache(stub_server):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password", cache_max_entries=3)
+  first_page = ticket_viewer.get_tickets()
+  second_page = ticket_viewer.get_tickets(first_page.next_link)
+
+  # Paging back or starting over needs no round-trip
+  assert ticket_viewer.get_tickets(second_page.prev_link) == first_page
+  assert ticket_viewer.get_tickets() == first_page
+  assert stub_server.requests_served == 2
+
+  # The least recently used page is evicted
+  ticket_viewer.get_individual_ticket("1")
+  assert ticket_viewer.response_cache.get(first_page.next_link) == (None, False)
+  assert ticket_viewer.response_cache.stats() == {
+    "hits": 2,
+    "revalidations": 0,
+    "misses": 3,
+    "evictions": 1,
+    "entries": 3,
+    "bytes": ticket_viewer.response_cache.size
+  }
+
+def test_response_cache_aliases():
+  response_cache = ResponseCache(max_bytes=10)
+  response_cache.put("page 1", "first", None, 6)
+  response_cache.alias("prev of page 2", "page 1")
+  response_cache.alias("first page", "prev of page 2")
+  assert response_cache.get("first page")[0].value == "first"
+
+  # Aliases are evicted with the entry they serve, whose size they do not count
+  response_cache.get("first page")
+  response_cache.put("page 2", "second", None, 6)
+  assert list(response_cache.entries) == ["page 2"] and response_cache.size == 6
+  assert response_cache.stats()["evictions"] == 3
+
+  # As are aliases of a value that is replaced
+  response_cache.alias("next of page 1", "page 2")
+  response_cache.put("page 2", "second again", None, 6)
+  assert response_cache.get("next of page 1") == (None, False) and not response_cache.aliases
+
+def test_response_cache_revalidation(stub_server):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password", cache_ttl=0)
+  response = ticket_viewer.get_individual_ticket("1")
+
+  # Expired entries are revalidated with their ETag
+  assert ticket_viewer.get_individual_ticket("1") == response
+  assert ticket_viewer.response_cache.revalidations == 1
+  assert stub_server.requests_served == 2
+
+  uncached_viewer = TicketViewer(stub_server.url, "email", "password", cache_max_bytes=0)
+  assert uncached_viewer.response_cache is None
+  assert uncached_viewer.get_individual_ticket("1") == response
+
+def test_instrumentation(stub_server, tmp_path):
+  instrumentation = Instrumentation()
+  profiler = Profiler()
+  instrumentation.subscribe(profiler)
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password", instrumentation=instrumentation)
+
+  link = ticket_viewer.tickets_link()
+  ticket_viewer.get_tickets(link)
+  ticket_viewer.get_tickets(link)
+  ticket_viewer.get_individual_ticket("7")
+
+  # Failed requests are reported instead of being silently turned into -1
+  unreachable = TicketViewer("http://127.0.0.1:1", "email", "password", instrumentation=instrumentation)
+  assert unreachable.count_tickets().status_code == -1
+
+  requests = [event for event in profiler.events if isinstance(event, RequestEvent)]
+  assert [(event.url, event.cache) for event in requests] == [
+    ("/api/v2/tickets.json?page[size]&sort", "miss"),
+    ("/api/v2/tickets.json?page[size]&sort", "hit"),
+    ("/api/v2/tickets/{id}.json", "miss")
+  ]
+  assert requests[0].status_code == 200 and requests[0].bytes > 0
+  assert [event.error for event in profiler.events if isinstance(event, ErrorEvent)] == ["ConnectionError"]
+
+  summary = profiler.summary()
+  assert summary["GET /api/v2/tickets.json?page[size]&sort"]["count"] == 2
+  assert summary["parse"]["count"] == 2
+  assert summary["parse"]["p50"] <= summary["parse"]["p99"] <= summary["parse"]["max"]
+
+  profiler.write_trace(str(tmp_path / "trace.json"))
+  with open(tmp_path / "trace.json") as f:
+    assert len(json.load(f)["traceEvents"]) == len(profiler.events)
+
+  assert url_template("https://x.zendesk.com/api/v2/tickets/42/comments.json?page=2") == \
+    "/api/v2/tickets/{id}/comments.json?page"
+
+def test_rate_limit_retries(stub_server):
+  rate_limiter = RateLimiter(jitter=0)
+  ticket_viewer = TicketViewer(
+    stub_server.url, "email", "password", rate_limiter=rate_limiter, max_retries=2
+  )
+
+  # Throttled requests are sent again
+  stub_server.throttle(2)
+  assert ticket_viewer.count_tickets().count == 60
+  assert rate_limiter.stats()["retries"] == 2
+  assert rate_limiter.limit == 100000
+
+  # Until we run out of retries
+  stub_server.throttle(3)
+  assert ticket_viewer.count_tickets().status_code == 429
+  assert rate_limiter.throttled == 4
+  assert stub_server.requests_served == 6
+
+  # 503s are retried too but are not counted as throttling
+  rate_limiter.back_off("0", 0, 503)
+  assert (rate_limiter.throttled, rate_limiter.unavailable, rate_limiter.retries) == (4, 1, 5)
+
+def test_rate_limiter_token_bucket():
+  rate_limiter = RateLimiter(jitter=0)
+  rate_limiter.acquire() # No limit is known yet
+
+  rate_limiter.update({"X-Rate-Limit": "600", "X-Rate-Limit-Remaining": "1"})
+  rate_limiter.acquire()
+
+  # The bucket is empty and refills at 10 requests per second
+  start = time.monotonic()
+  rate_limiter.acquire()
+  assert time.monotonic() - start >= 0.09
+  assert rate_limiter.throttled_seconds >= 0.09
+
+  # A given limit is kept
+  rate_limiter = RateLimiter(60)
+  rate_limiter.update({"X-Rate-Limit": "600", "X-Rate-Limit-Remaining": "500"})
+  assert (rate_limiter.limit, rate_limiter.tokens) == (60, 60)
+
+def test_iter_tickets(stub_server):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+  ticket_ids = [ticket["id"] for ticket in ticket_viewer.iter_tickets(page_size=25)]
+
+  assert ticket_ids == list(range(60, 0, -1))
+  assert stub_server.requests_served == 3
+
+def test_iter_tickets_error(stub_server):
+  ticket_viewer = TicketViewer(f"{stub_server.url}/missing", "email", "password")
+
+  with pytest.raises(TicketViewerError) as error:
+    next(ticket_viewer.iter_tickets())
+  assert error.value.status_code == 404
+
+  with pytest.raises(ValueError):
+    next(ticket_viewer.iter_tickets(page_size=101))
+
+def test_page_prefetcher(stub_server):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password", cache_max_bytes=0)
+  first_page = ticket_viewer.get_tickets(ticket_viewer.tickets_link(10))
+
+  def wait_for_prefetch(pager):
+    while not all(future.done() for future in list(pager.pages.values())):
+      time.sleep(0.01)
+
+  with PagePrefetcher(ticket_viewer, depth=2) as pager:
+    pager.start(first_page)
+    wait_for_prefetch(pager)
+    # Two pages ahead and the (empty) page before the first one
+    assert stub_server.requests_served == 4
+    assert first_page.next_link in pager.pages
+
+    page = pager.get(first_page.next_link, "next")
+    assert [ticket.id for ticket in page.tickets] == list(range(50, 40, -1))
+
+    # The page we came from is kept under the link leading back to it
+    assert pager.get(page.prev_link, "prev") == first_page
+    wait_for_prefetch(pager)
+
+    # Until has_more says there are no more tickets
+    page, ticket_ids = first_page, []
+    while True:
+      ticket_ids.extend(ticket.id for ticket in page.tickets)
+      if not page.has_more:
+        break
+      page = pager.get(page.next_link, "next")
+
+    assert ticket_ids == list(range(60, 0, -1))
+
+  # Pages beyond the budget are dropped
+  with PagePrefetcher(ticket_viewer, depth=5, max_tickets=20) as pager:
+    pager.start(first_page)
+    wait_for_prefetch(pager)
+    assert sum(len(future.result().tickets) for future in pager.pages.values()) <= 30
+
+def test_ticket_cache_incremental_sync(stub_server, tmp_path):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+
+  with TicketCache(str(tmp_path)) as ticket_cache:
+    assert ticket_cache.sync(ticket_viewer) == 200
+    assert ticket_cache.count_tickets().count == 60
+    assert ticket_cache.cursor == "60"
+
+    # Only tickets updated since the last sync are downloaded
+    stub_server.ticket_count = 65
+    requests_served = stub_server.requests_served
+    assert ticket_cache.sync(ticket_viewer) == 200
+    assert stub_server.requests_served == requests_served + 1
+    assert ticket_cache.count_tickets().count == 65
+
+    first_page = ticket_cache.get_tickets()
+    assert [ticket["id"] for ticket in first_page.tickets] == list(range(65, 40, -1))
+    assert first_page.tickets[0] == ticket_viewer.get_individual_ticket("65").tickets[0]
+
+    last_page = ticket_cache.get_tickets("50")
+    assert [ticket["id"] for ticket in last_page.tickets] == list(range(15, 0, -1))
+    assert not last_page.has_more
+    assert ticket_cache.get_tickets(first_page.prev_link).tickets == []
+
+    ticket_cache.invalidate()
+    assert ticket_cache.count_tickets().count == 0
+    assert ticket_cache.cursor is None
+
+def test_segment():
+  assert bisect_key([5, 3, 1], -3, key=lambda value: -value) == 1
+  assert bisect_key([], 1, key=abs) == 0
+
+  # Every method a segment needs has to be provided
+  class IncompleteSegment(Segment):
+    def __len__(self) -> int:
+      return 0
+
+  with pytest.raises(TypeError):
+    IncompleteSegment()
+
+def test_ticket_index(stub_server, tmp_path):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+
+  with TicketIndex(str(tmp_path)) as ticket_index:
+    assert ticket_index.sync(ticket_viewer) == 200
+    # The first sync writes the index file
+    assert ticket_index.base is not None and not len(ticket_index.pending)
+
+    assert [ticket.id for ticket in ticket_index.search("number 42")] == [42]
+    assert [ticket.id for ticket in ticket_index.search("4*")] == [*range(49, 39, -1), 4]
+    assert [ticket.id for ticket in ticket_index.search("status:open,pending priority:urgent")] == \
+      [49, 44, 19, 14]
+    assert [ticket.id for ticket in ticket_index.search("synthetic updated_before:2021-12-02", limit=2)] == [60, 59]
+    assert ticket_index.search("synthetic updated_after:2021-12-01") == []
+
+    page = ticket_index.get_tickets(query="synthetic")
+    assert [ticket.id for ticket in page.tickets] == list(range(60, 35, -1))
+    assert page.has_more
+    assert ticket_index.get_tickets(page.next_link).tickets[0].id == 35
+
+    # New, updated and deleted tickets are found before the file is written again
+    stub_server.ticket_count = 62
+    assert ticket_index.sync(ticket_viewer) == 200
+    ticket_index.add([
+      Ticket(5, "2021-12-02T00:00:00Z", "task", "Printer jam", "low", "open"),
+      Ticket(60, "2021-12-02T00:00:00Z", status="deleted")
+    ])
+    assert len(ticket_index.pending) == 3
+    assert [ticket.id for ticket in ticket_index.search("synthetic", limit=3)] == [62, 61, 59]
+    assert [ticket.id for ticket in ticket_index.search("printer status:open")] == [5]
+    assert ticket_index.search("number 5") == []
+
+  # Tickets that were not written are downloaded again
+  with TicketIndex(str(tmp_path)) as ticket_index:
+    assert ticket_index.count_tickets().count == 60
+    assert ticket_index.sync(ticket_viewer) == 200
+    assert ticket_index.count_tickets().count == 62
+
+    ticket_index.save()
+    assert [ticket.id for ticket in ticket_index.search("synthetic", limit=3)] == [62, 61, 60]
+
+@pytest.mark.parametrize(
+  "argv, expected_code, expected_output",
+  [
+    pytest.param(["count"], 0, "60\n"),
+    pytest.param(["count", "-f", "json", "--filter", "status:open,pending"], 0, '{"count": 20}\n'),
+    pytest.param(
+      ["list", "-f", "ndjson", "--limit", "2", "--fields", "status,subject"], 0,
+      '{"id": 60, "subject": "synthetic ticket number 60", "status": "new"}\n'
+      '{"id": 59, "subject": "synthetic ticket number 59", "status": "closed"}\n'
+    ),
+    pytest.param(
+      ["list", "-f", "ndjson", "--filter", "priority:urgent", "--sort", "updated_at",
+        "--page-size", "2", "--limit", "3", "--fields", "priority"], 0,
+      "".join(f'{{"id": {ticket_id}, "priority": "urgent"}}\n' for ticket_id in (4, 9, 14))
+    ),
+    pytest.param(["show", "3", "70", "-f", "ndjson"], 1, '{"id": 3'),
+    pytest.param(
+      ["show", "3", "--detail"], 0,
+      "\nTicket 3: synthetic ticket number 3\nStatus: hold | Priority: high | Type: question"
+    ),
+    pytest.param(["list", "--filter", "status:unknown"], 2, ""),
+    pytest.param(
+      ["stats", "-f", "ndjson", "--by", "status", "--period", "week"], 0,
+      '{"count": 60}\n{"by": "status", "status": "closed", "count": 10}\n'
+    ),
+    pytest.param(["stats", "--by", "subject"], 2, ""),
+    pytest.param(["watch", "-f", "ndjson", "--rows", "1", "--interval", "0", "--polls", "1"], 0, '{"id": 60'),
+    pytest.param(["search", "synthetic"], 2, ""),
+  ],
+)
+def test_cli_commands(stub_server, monkeypatch, capsys, argv, expected_code, expected_output):
+  monkeypatch.setenv("secretUrl", stub_server.url)
+  monkeypatch.setenv("secretEmail", "email")
+  monkeypatch.setenv("secretPassword", "password")
+  monkeypatch.delenv("indexDir", raising=False)
+  monkeypatch.delenv("cacheDir", raising=False)
+
+  with pytest.raises(SystemExit) as exit_info:
+    main(argv)
+
+  assert exit_info.value.code == expected_code
+  assert capsys.readouterr().out.startswith(expected_output)
+
+def test_get_prefetch_options(monkeypatch, capsys):
+  monkeypatch.setenv("prefetchDepth", "0")
+  monkeypatch.setenv("prefetchMaxTickets", "two")
+  assert get_prefetch_options() == {"depth": 0, "max_tickets": 1000}
+  assert "prefetchMaxTickets" in capsys.readouterr().out
+
+  monkeypatch.setenv("prefetchDepth", "-1")
+  monkeypatch.delenv("prefetchMaxTickets")
+  assert get_prefetch_options() == {"depth": 2, "max_tickets": 1000}
+
+def test_cli_app_startup(stub_server, monkeypatch, capsys, tmp_path):
+  monkeypatch.setenv("secretUrl", stub_server.url)
+  monkeypatch.setenv("secretEmail", "email")
+  monkeypatch.setenv("secretPassword", "password")
+  monkeypatch.setenv("cacheDir", str(tmp_path / "cache"))
+  monkeypatch.setenv("indexDir", str(tmp_path / "index"))
+
+  # The cache and the index are opened once an option needs them
+  app = CLIApp()
+  app.print_main_menu()
+  assert "'rebuild'" in capsys.readouterr().out
+  assert not os.path.exists(tmp_path / "cache") and not os.path.exists(tmp_path / "index")
+
+  app.process_cache_request("invalidate")
+  assert os.path.exists(tmp_path / "cache") and "ticket_index" not in app.__dict__
+  app.ticket_cache.close()
+
+@pytest.mark.parametrize("directory", ["indexDir", "cacheDir"])
+def test_cli_search(stub_server, monkeypatch, capsys, tmp_path, directory):
+  monkeypatch.setenv("secretUrl", stub_server.url)
+  monkeypatch.setenv("secretEmail", "email")
+  monkeypatch.setenv("secretPassword", "password")
+  monkeypatch.delenv("indexDir", raising=False)
+  monkeypatch.delenv("cacheDir", raising=False)
+  monkeypatch.setenv(directory, str(tmp_path))
+
+  def search() -> List[int]:
+    with pytest.raises(SystemExit) as exit_info:
+      main(["search", "synthetic", "-f", "ndjson", "--limit", "2"])
+
+    assert exit_info.value.code == 0
+    return [json.loads(line)["id"] for line in capsys.readouterr().out.splitlines()]
+
+  assert search() == [60, 59]
+
+  # Only the tickets that changed are downloaded by the next search
+  stub_server.ticket_count = 62
+  requests_served = stub_server.requests_served
+  assert search() == [62, 61]
+  assert stub_server.requests_served - requests_served == 1
+
+def test_ticket_detail_viewer(stub_server, monkeypatch):
+  monkeypatch.setattr(detail, "COMMENTS_PAGE_SIZE", 7)
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+
+  with TicketDetailViewer(ticket_viewer) as detail_viewer:
+    # The ticket and the 5 pages of its 30 comments
+    response = detail_viewer.get_ticket_detail(29)
+    assert stub_server.requests_served == 6
+
+    ticket_detail = response.detail
+    assert response.status_code == 200 and ticket_detail.ticket.id == 29
+    assert ticket_detail.requester == User(30, "User 30", "user30@example.com")
+    assert ticket_detail.assignee.id == 4 and ticket_detail.organization.name == "Organization 1"
+    assert [comment.id for comment in ticket_detail.comments] == list(range(29000, 29030))
+    assert ticket_detail.authors[30] is ticket_detail.requester
+    assert ticket_detail.to_dict()["comments"][1]["author"]["name"] == "User 31"
+
+    # People already seen are shared between tickets
+    other = detail_viewer.get_ticket_detail(1).detail
+    assert other.assignee.id == 8 and other.requester is detail_viewer.identities.user(2)
+    assert detail_viewer.get_ticket_detail(29).detail.requester is ticket_detail.requester
+    assert detail_viewer.get_ticket_detail(70).status_code == 404
+    # Let the comments request that was already sent finish before counting requests
+    detail_viewer.close()
+
+    # People who were not sideloaded are looked up at once
+    get_json = ticket_viewer.get_json
+
+    def get_json_without_users(path):
+      status_code, data = get_json(path)
+      if path.startswith("/api/v2/tickets/"):
+        data.pop("users", None)
+      return status_code, data
+
+    monkeypatch.setattr(ticket_viewer, "get_json", get_json_without_users)
+    detail_viewer.identities = IdentityCache()
+    served = stub_server.requests_served
+    assert detail_viewer.get_ticket_detail(3).detail.authors[7] == User(7, "User 7", "user7@example.com")
+    assert stub_server.requests_served == served + 3
+
+  identities = IdentityCache(max_entries=2)
+  identities.add_users([{"id": user_id, "name": f"User {user_id}"} for user_id in (1, 2, 3)])
+  assert identities.missing_users([3, None, 1, 2, 1]) == [1]
+
+@pytest.mark.parametrize("key", ["updated_at", "id"])
+def test_crawl_tickets(stub_server, tmp_path, key):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+  path = str(tmp_path / "tickets.jsonl")
+
+  result = crawl_tickets(ticket_viewer, path, key=key, processes=2, shards=5)
+  assert (result.status_code, result.tickets, result.duplicates, result.gaps) == (200, 60, 0, ())
+
+  with open(path) as f:
+    assert [json.loads(line) for line in f] == [
+      extract_ticket_fields(make_ticket(ticket_id)).to_dict() for ticket_id in range(1, 61)
+    ]
+  assert not os.path.exists(f"{path}.shards")
+
+  # Shards that were complete are not crawled again
+  crawler = TicketCrawler(ticket_viewer, path, key=key, processes=2, shards=5)
+  _, _, shards = crawler.load_plan()
+  with open(shard_path(crawler.directory, shards[0]), "w") as f:
+    f.write(json.dumps({**make_ticket(1), "subject": "crawled before"}) + "\n")
+
+  # The first shard held tickets 1 to 12
+  assert crawler.run().tickets == 49
+  with open(path) as f:
+    assert json.loads(f.readline())["subject"] == "crawled before"
+
+  # Each process gets its share of the rate limit, learned once from the API if not given
+  assert TicketCrawler(TicketViewer(stub_server.url, "email", "password"), path, processes=3).worker_requests_per_minute() == 33333
+  assert TicketCrawler(ticket_viewer, path, processes=2, requests_per_minute=90).worker_requests_per_minute() == 45
+
+def test_merge_shards(tmp_path):
+  shards = [Shard(0, 1, 10), Shard(1, 10)]
+
+  for shard, tickets in zip(shards, [[1, 2, 2], [3, 2]]):
+    with open(shard_path(str(tmp_path), shard), "w") as f:
+      f.writelines(json.dumps({**make_ticket(ticket_id), "subject": f"shard {shard.index}"}) + "\n" for ticket_id in tickets)
+
+  # Lines that do not start with the ID are decoded in full
+  with open(shard_path(str(tmp_path), shards[1]), "a") as f:
+    f.write(json.dumps({"subject": "shard 1", "id": 4}) + "\n")
+
+  path = str(tmp_path / "tickets.jsonl")
+  assert merge_shards(str(tmp_path), shards, path) == (4, 2)
+
+  with open(path) as f:
+    assert [(ticket["id"], ticket["subject"]) for ticket in map(json.loads, f)] == \
+      [(1, "shard 0"), (3, "shard 1"), (2, "shard 1"), (4, "shard 1")]
+
+def test_multi_ticket_viewer(stub_server, tmp_path, monkeypatch, capsys):
+  with StubServer(ticket_count=30) as other_server:
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps([
+      {"name": "a", "url": stub_server.url, "email": "email", "password": "password"},
+      {"name": "b", "url": other_server.url, "email": "email", "password": "password", "requests_per_minute": 600}
+    ]))
+    accounts = read_accounts(str(path))
+    assert accounts[1] == Account("b", other_server.url, "email", "password", 600)
+
+    with MultiTicketViewer(accounts, max_workers=2) as multi_ticket_viewer:
+      assert {name: response.count for name, response in multi_ticket_viewer.count_tickets().items()} == \
+        {"a": 60, "b": 30}
+
+      # Tickets of both accounts are merged by 'updated_at', the most recent first
+      tickets = list(multi_ticket_viewer.iter_tickets(page_size=7, fields=["status"]))
+      assert [(account, ticket.id) for account, ticket in tickets[28:34]] == \
+        [("a", 32), ("a", 31), ("a", 30), ("b", 30), ("a", 29), ("b", 29)]
+      assert len(tickets) == 90
+      assert tickets[0].ticket.updated_at is not None and tickets[0].ticket.subject is None
+
+      other_server.throttle(10)
+      multi_ticket_viewer.ticket_viewers["b"].max_retries = 0
+      with pytest.raises(AccountError) as error_info:
+        list(multi_ticket_viewer.iter_tickets())
+      assert error_info.value.account == "b" and error_info.value.status_code == 429
+
+    other_server.throttle(0)
+    monkeypatch.setenv("accountsFile", str(path))
+    with pytest.raises(SystemExit) as exit_info:
+      main(["list", "--all-accounts", "-f", "ndjson", "--sort", "id", "--limit", "3", "--fields", "id"])
+    assert exit_info.value.code == 0
+    assert capsys.readouterr().out == \
+      '{"account": "a", "id": 1}\n{"account": "b", "id": 1}\n{"account": "a", "id": 2}\n'
+
+  path.write_text(json.dumps([{"name": "a", "url": "x"}]))
+  with pytest.raises(ValueError):
+    read_accounts(str(path))
+
+def test_ticket_stats():
+  stats = TicketStats.of(extract_ticket_fields(make_ticket(ticket_id)) for ticket_id in range(1, 31))
+  stats.extend([("open", None, None, "2021-12-05T16:10:00Z"), ("open", "urgent", None, "2021-12-06T15:59:59Z")])
+  assert len(stats) == 32
+
+  assert stats.count_by("status") == {
+    ("open",): 7, ("closed",): 5, ("hold",): 5, ("new",): 5, ("pending",): 5, ("solved",): 5
+  }
+  assert list(stats.count_by("priority", "status").items())[:2] == [((None, "open"), 2), (("urgent", "open"), 2)]
+  assert sum(stats.count_by("type", "priority").values()) == 32
+
+  # Synthetic tickets are updated a minute apart from 2021-12-01 00:01 UTC
+  assert stats.histogram("day") == [(date(2021, 12, 1), 30)] + [(date(2021, 12, day), 0) for day in (2, 3, 4)] + \
+    [(date(2021, 12, 5), 1), (date(2021, 12, 6), 1)]
+  # Both of the last two are on 6 Dec in Singapore, and in the same week as the others in New York
+  assert stats.histogram("day", timezone("Asia/Singapore")) == [(date(2021, 12, 1), 30)] + \
+    [(date(2021, 12, day), 0) for day in (2, 3, 4, 5)] + [(date(2021, 12, 6), 2)]
+  assert stats.histogram("week", timezone("America/New_York")) == [(date(2021, 11, 29), 31), (date(2021, 12, 6), 1)]
+
+  with pytest.raises(ValueError):
+    stats.count_by("subject")
+
+def test_ticket_watcher(stub_server):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+  watcher = TicketWatcher(ticket_viewer, size=3, min_interval=0, max_interval=0)
+  assert watcher.start() == 200
+  assert [ticket.id for ticket in watcher.view.rows] == [60, 59, 58]
+  assert len(watcher.view.ordered) == 6
+
+  # The most recent ticket is listed again but did not change
+  assert watcher.poll() == (200, [])
+
+  stub_server.ticket_count = 62
+  requests_served = stub_server.requests_served
+  changes = []
+  assert watcher.run(changes.append, polls=2) == 200
+  assert [[ticket.id for ticket in changed] for changed in changes] == [[61, 62], []]
+  assert stub_server.requests_served == requests_served + 2
+  assert [ticket.id for ticket in watcher.view.rows] == [62, 61, 60]
+
+  # Deleted tickets are replaced by the ones kept below the view
+  deleted = Ticket(61, "2021-12-01T01:01:00Z", status="deleted")
+  assert watcher.view.merge([deleted, extract_ticket_fields(make_ticket(10))]) == [deleted]
+  assert [ticket.id for ticket in watcher.view.rows] == [62, 60, 59]
+
+def test_screen_region():
+  stream = io.StringIO()
+  region = ScreenRegion(stream, width=6)
+  assert region.draw(["a", "b", "c"]) == 3
+  assert region.draw(["a", "B", "c", "d"]) == 2
+  assert region.draw(["a", "B"]) == 0
+  assert region.draw(["a", "B" * 10]) == 1
+  assert stream.getvalue() == "a\nb\nc\n" "\x1b[2A\rB\x1b[K\x1b[2B\rd\n" "\x1b[2A\r\x1b[J" \
+    "\x1b[1A\rBBBBBB\x1b[K\x1b[1B\r"
+
+def test_write_tickets():
+  records = [Ticket(**ticket) for ticket in tickets]
+
+  for format in OUTPUT_FORMATS:
+    stream = io.StringIO()
+    assert write_tickets(iter(records), format, stream=stream, chunk_size=1) == len(records)
+    output = stream.getvalue()
+
+    if format == "table":
+      # A single table, with columns sized from the first chunk
+      lines = output.splitlines()
+      assert lines[:3] == [
+        "",
+        "   ID  |   Updated at (SGT)  |   Type   | Priority |  Status |                Subject                ",
+        "-" * 101
+      ]
+      assert lines[3:] == [
+        " 23971 | 01 Dec 2021 10:35AM |  problem |  urgent  |   new   | Unable to access toilet in the office ",
+        "   24  | 30 Nov 2021 09:15AM | question |    low   |   open  | Is Santa going to give me a Christmas gift?",
+        "  9561 | 26 Nov 2021 05:35AM |   task   |   high   |  solved |" \
+          " Book a dinner reservation for parents' 25th wedding anniv...",
+        " 7662451| 28 Nov 2021 02:02AM | question |    low   | pending | Can shark eat chocolate?              ",
+        "  199  | 22 Nov 2021 03:30PM | incident |  normal  |  solved | I accidently dropped my Mom's  flower vase"
+      ]
+    elif format == "json":
+      assert json.loads(output) == tickets
+    else:
+      assert [json.loads(line) for line in output.splitlines()] == tickets
+
+  stream = io.StringIO()
+  write_tickets([], "json", stream=stream)
+  assert stream.getvalue() == "[]\n"
+
+class TerminalStream(io.StringIO):
+  def isatty(self) -> bool:
+    return True
+
+def test_table_writer():
+  records = [Ticket(**ticket) for ticket in tickets]
+  stream = io.StringIO()
+  table_writer = TableWriter(keys, headers, stream, max_col_width={"subject": 30})
+  table_writer.write(records[:2])
+  table_writer.write(records[2:])
+
+  lines = stream.getvalue().splitlines()
+  assert table_writer.count == len(records)
+  assert len(lines) == 3 + len(records)
+  assert all(line.endswith(" ") for line in lines[3:])
+  assert lines[5].endswith("| Book a dinner reservation f... ")
+
+  # The first rows are written before the tickets run out
+  def tickets_then_fail():
+    yield from records
+    raise TicketViewerError(500)
+
+  stream = io.StringIO()
+  with pytest.raises(TicketViewerError):
+    write_tickets(tickets_then_fail(), stream=stream, chunk_size=2)
+  assert len(stream.getvalue().splitlines()) == 3 + 4
+
+  # Only the last rows are kept on a terminal
+  stream = TerminalStream()
+  assert write_tickets(records, stream=stream, chunk_size=2, window=2) == len(records)
+  assert stream.getvalue().endswith("\x1b[1A\rRows 4-5 of 5 so far.\x1b[K\x1b[1B\r")
+
+@pytest.mark.parametrize("format", EXPORT_FORMATS)
+def test_export_tickets(stub_server, tmp_path, format):
+  ticket_viewer = TicketViewer(stub_server.url, "email", "password")
+  path = str(tmp_path / f"tickets.{format}")
+
+  result = export_tickets(ticket_viewer, path, format=format, page_size=25)
+  assert result.status_code == 200 and result.rows == 60
+
+  if format == "jsonl":
+    with open(path) as f:
+      rows = [json.loads(line) for line in f]
+    assert rows[0] == dict(zip(TICKET_FIELDS, extract_ticket_fields(make_ticket(1)).values()))
+  elif format == "csv":
+    with open(path) as f:
+      rows = f.read().splitlines()
+    assert rows[0] == ",".join(TICKET_FIELDS)
+    rows = rows[1:]
+  else:
+    rows = list(read_columnar(path))
+    assert rows[0] == tuple(extract_ticket_fields(make_ticket(1)).values())
+
+  assert len(rows) == 60
+  assert not os.path.exists(f"{path}.checkpoint")
+
+def test_export_tickets_resume(stub_server, tmp_path):
+  path = str(tmp_path / "tickets.jsonl")
+
+  class FailingTicketViewer(TicketViewer):
+    calls = 0
+
+    def get_tickets(self, *args, **kwargs):
+      self.calls += 1
+      if self.calls == 2:
+        return GetTicketsResponse(503)
+      return super().get_tickets(*args, **kwargs)
+
+  ticket_viewer = FailingTicketViewer(stub_server.url, "email", "password")
+  result = export_tickets(ticket_viewer, path, page_size=25)
+  assert result.status_code == 503 and result.rows == 25
+  assert os.path.exists(f"{path}.checkpoint")
+
+  # Whatever was written after the checkpoint is dropped
+  with open(path, "a") as f:
+    f.write('{"id": 0')
+
+  result = export_tickets(ticket_viewer, path, page_size=25)
+  assert result.status_code == 200 and result.rows == 60
+
+  with open(path) as f:
+    assert [json.loads(line)["id"] for line in f] == list(range(1, 61))
+  assert not os.path.exists(f"{path}.checkpoint")
+
+  # Timestamps converted another way than the checkpointed rows start the export over
+  ticket_viewer.calls = 0
+  assert export_tickets(ticket_viewer, path, page_size=25).status_code == 503
+  result = export_tickets(ticket_viewer, path, page_size=25, convert_timestamps=lambda values: [value.lower() for value in values])
+  assert result.status_code == 200 and result.rows == 60
+
+  with open(path) as f:
+    assert all(json.loads(line)["updated_at"].endswith("z") for line in f)
+
+  # Errors of a stage are raised instead of ending the export with -1
+  class BrokenTicketViewer(TicketViewer):
+    def get_tickets(self, *args, **kwargs):
+      raise RuntimeError("broken")
+
+  with pytest.raises(RuntimeError, match="broken"):
+    export_tickets(BrokenTicketViewer(stub_server.url, "email", "password"), str(tmp_path / "broken.jsonl"))
+
+def test_encode_column():
+  # Values that repeat are dictionary encoded
+  statuses = ["open", "pending", None] * 30
+  kind, payload = encode_column(statuses)
+  assert kind == DICT_COLUMN and decode_column(kind, payload, len(statuses)) == statuses
+
+  # Distinct values are stored as offsets into their text
+  subjects = [f"synthetic ticket number {ticket_id}" for ticket_id in range(99)] + [None]
+  kind, payload = encode_column(subjects)
+  assert kind == STRING_COLUMN and decode_column(kind, payload, len(subjects)) == subjects
+
+def test_export_empty_account(tmp_path):
+  path = str(tmp_path / "tickets.columnar")
+
+  with StubServer(ticket_count=0) as server:
+    result = export_tickets(TicketViewer(server.url, "email", "password"), path, format="columnar")
+  assert result.status_code == 200 and result.rows == 0
+  assert list(read_columnar(path)) == []
+
+  # Empty row groups of earlier exports are skipped
+  with open(path, "ab") as f:
+    f.write(struct.pack("<I", 0))
+  assert list(read_columnar(path)) == []
+
+def test_stub_server_options():
+  with StubServer(ticket_count=60, latency=0.05, payload_size=500, throttle_rate=0.5) as server:
+    ticket_viewer = TicketViewer(server.url, "email", "password", rate_limiter=RateLimiter(jitter=0))
+    start = time.perf_counter()
+    assert len(list(ticket_viewer.iter_tickets(page_size=20))) == 60
+    assert time.perf_counter() - start >= 0.15
+
+    # Retried 429s are served too, and the descriptions are dropped while parsing
+    assert server.requests_served > 3
+    assert server.bytes_served > 60 * 500
+    assert len(make_ticket(1, payload_size=500)["description"]) == 500
+
+def test_benchmark_suite(tmp_path):
+  output = str(tmp_path / "results.json")
+  assert suite.main(["--tickets", "300", "--scenario", "page_through", "--scenario", "cli_list", "--output", output]) == 0
+
+  with open(output) as f:
+    results = json.load(f)["results"]
+  assert results["page_through"]["requests"] == 3
+  assert results["page_through"]["tickets_per_second"] > 0
+  assert results["cli_list"]["max_rss_mib"] > 0
+
+  baseline = {"page_through": {"tickets_per_second": 100.0, "peak_memory_mib": 1.0, "requests": 0}}
+  assert suite.find_regressions({"page_through": {"tickets_per_second": 80.0, "peak_memory_mib": 1.2}}, baseline) == []
+  assert suite.find_regressions({"page_through": {"tickets_per_second": 70.0, "peak_memory_mib": 2.0}}, baseline) == [
+    "page_through.tickets_per_second: 70.00 (baseline 100.00, -30%)",
+    "page_through.peak_memory_mib: 2.00 (baseline 1.00, +100%)"
+  ]
+
+@pytest.mark.parametrize(
+  "string",
+  ["", "status:", "assignee:me", "updated_after:01-12-2021", "* ,"],
+)
+def test_parse_query_invalid(string):
+  with pytest.raises(ValueError):
+    parse_query(string)
+
+@pytest.mark.parametrize(
+  "string, expected_ids",
+  [
+    pytest.param("7", [7]),
+    pytest.param("1,5,10-13", [1, 5, 10, 11, 12, 13]),
+    pytest.param(" 3 - 4 , 9", [3, 4, 9]),
+    pytest.param("5-3", None),
+    pytest.param("1,,2", None),
+    pytest.param("abc", None),
+    pytest.param("1-10000", list(range(1, 10001))),
+    pytest.param("1-999999999", None),
+    pytest.param("5,1-10000", None),
+    pytest.param(",".join(["1"] * 10001), None),
+  ],
+)
+def test_parse_ticket_ids(string, expected_ids):
+  assert parse_ticket_ids(string) == expected_ids
+
+@pytest.mark.parametrize(
+  "string, expected_filters",
+  [
+    pytest.param("status:open", {"status": ["open"]}),
+    pytest.param(
+      "status:open,pending priority:urgent updated_after:2021-12-01",
+      {"status": ["open", "pending"], "priority": ["urgent"], "updated_after": ["2021-12-01"]}
+    ),
+    pytest.param("status:urgent", None),
+    pytest.param("updated_before:01-12-2021", None),
+    pytest.param("assignee:me", None),
+    pytest.param("open", None),
+    pytest.param("", None),
+  ],
+)
+def test_parse_ticket_filters(string, expected_filters):
+  assert parse_ticket_filters(string) == expected_filters
+
 tickets = [
   {
     "id": 23971,
@@ -91,6 +991,46 @@ tickets = [
 headers = ["ID", "Updated at (SGT)", "Type", "Priority", "Status", "Subject"]
 keys = ["id", "updated_at", "type", "priority", "status", "subject"]
 
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_json_array_stream(static_tickets_data, chunk_size):
+  body = json.dumps({"count": 1, **static_tickets_data, "meta": {"has_more": True}}).encode()
+  chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+  stream = JSONArrayStream(chunks, "tickets")
+
+  assert list(stream) == static_tickets_data["tickets"]
+  assert stream.document == {
+    "count": 1,
+    "tickets": [],
+    "links": static_tickets_data["links"],
+    "meta": {"has_more": True}
+  }
+  assert stream.bytes_read == len(body)
+
+  with pytest.raises(ValueError):
+    list(JSONArrayStream([body[:len(body) // 2]], "tickets"))
+
+  # Numbers cut off between chunks are decoded whole
+  assert list(JSONArrayStream([b'{"ids": [12', b"34, 5", b"6]}"], "ids")) == [1234, 56]
+
+  # Only a member of the top-level object is taken for the array
+  stream = JSONArrayStream([b'{"meta": {"ids": [1]}, "ids": [2, 3]}'], "ids")
+  assert list(stream) == [2, 3] and stream.document == {"meta": {"ids": [1]}, "ids": []}
+
+def test_ticket_record(static_indiv_ticket_data):
+  ticket = extract_ticket_fields(static_indiv_ticket_data)
+
+  assert not hasattr(ticket, "__dict__")
+  assert ticket == static_indiv_ticket_data
+  assert ticket.to_dict() == static_indiv_ticket_data
+  assert ticket["subject"] == ticket.subject == static_indiv_ticket_data["subject"]
+  assert ticket.get("description", "none") == "none"
+  assert list(ticket) == list(ticket.keys()) == list(TICKET_FIELDS)
+
+  ticket["status"] = "solved"
+  assert ticket.status == "solved"
+  with pytest.raises(KeyError):
+    ticket["description"]
+
 def test_find_column_width():
   col_width = find_column_width(tickets, keys, headers)
   assert col_width == [9, 21, 10, 10, 9, 65]
@@ -167,7 +1107,35 @@ def test_generate_col(
 def test_convert_to_sgt():
   assert convert_to_sgt("2021-11-25T21:35:43Z") == "26 Nov 2021 05:35AM"
 
+@pytest.mark.parametrize(
+  "tz_name, string, expected",
+  [
+    pytest.param("Asia/Singapore", "2021-11-25T21:35:43Z", "26 Nov 2021 05:35AM"),
+    pytest.param("Asia/Singapore", "1981-12-31T16:29:00Z", "31 Dec 1981 11:59PM"),
+    pytest.param("Asia/Singapore", "1981-12-31T16:30:00Z", "01 Jan 1982 12:30AM"),
+    pytest.param("Asia/Kolkata", "2021-11-25T18:45:00Z", "26 Nov 2021 12:15AM"),
+    pytest.param("Europe/London", "2021-07-01T12:00:00Z", "01 Jul 2021 01:00PM"),
+    pytest.param("Europe/London", "2021-12-01T12:00:00Z", "01 Dec 2021 12:00PM"),
+  ],
+)
+def test_timestamp_formatter(tz_name, string, expected):
+  timestamp_formatter = TimestampFormatter(tz_name)
+  assert timestamp_formatter.format(string) == expected
+  assert timestamp_formatter.format_column([string, None, string]) == [expected, "", expected]
+
 def test_generate_row():
   assert generate_row(tickets[0], keys, [9, 21, 10, 10, 9, 65]) == \
     "  23971  | 01 Dec 2021 10:35AM |  problem |  urgent  |   new   " \
     "| Unable to access toilet in the office                           "
+
+def test_render_table(static_tickets_data):
+  for table in (tickets, static_tickets_data["tickets"], []):
+    col_width = find_column_width(table, keys, headers)
+    header_row = "".join(
+      generate_cell(col, col_width[idx], is_first_col=idx == 0)
+      for idx, col in enumerate(headers)
+    )
+    expected_rows = [generate_row(ticket, keys, col_width) for ticket in table]
+
+    assert render_table(table, keys, headers) == \
+      "\n".join(["", header_row, "-" * len(header_row), *expected_rows]) + "\n"
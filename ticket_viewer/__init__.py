@@ -3,7 +3,7 @@
 from collections import defaultdict
 
 # Preparing messages to be displayed for different HTTP status codes
-STATUS_CODE = (401, 403, 404, 429)
+STATUS_CODE = (401, 403, 404, 422, 429)
 MESSAGE = (
 	"\nOops it seems that something is wrong." \
 	"\nWe could not authenticate you." \
@@ -15,6 +15,9 @@ MESSAGE = (
 
 	"\nOops the ticket number you provided does not exist.",
 
+	"\nOnly the first 1000 matching tickets can be viewed." \
+	"\nPlease narrow down the filters and try again.",
+
 	"\nYou hit the rate limit. Please get a coffee and retry after some time."
 )
 STATUS_CODE_MESSAGE = defaultdict(
@@ -1,9 +1,6 @@
 """Ticket Viewer entry point script"""
 
-from ticket_viewer.cli import CLIApp
-
-def main():
-    CLIApp().run()
+from ticket_viewer.cli import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,188 @@
+"""
+This module provides a local SQLite cache of the account's tickets
+that is kept up to date through the incremental export API
+"""
+
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Iterator, List, Optional
+
+from ticket_viewer.ticket_viewer import (
+  TICKET_FIELDS,
+  Ticket,
+  TicketViewer,
+  CountTicketsResponse,
+  GetTicketsResponse
+)
+
+if TYPE_CHECKING:
+  import sqlite3
+
+CACHE_FILE_NAME = "tickets.sqlite3"
+
+class TicketCache:
+  """
+  A class for storing tickets on disk and serving them
+  with the same interface as TicketViewer's count_tickets and get_tickets
+  """
+
+  def __init__(self, directory: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    self.path: str = os.path.join(directory, CACHE_FILE_NAME)
+    # Only imported when the cache is enabled
+    import sqlite3
+
+    self.connection: sqlite3.Connection = sqlite3.connect(
+      self.path,
+      check_same_thread=False
+    )
+
+    with self.connection:
+      self.connection.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS tickets (
+          id INTEGER PRIMARY KEY,
+          updated_at TEXT NOT NULL,
+          type TEXT,
+          subject TEXT,
+          priority TEXT,
+          status TEXT
+        );
+        CREATE INDEX IF NOT EXISTS tickets_by_updated_at
+          ON tickets (updated_at DESC, id DESC);
+        CREATE TABLE IF NOT EXISTS sync_state (
+          key TEXT PRIMARY KEY,
+          value TEXT
+        );
+        """
+      )
+
+  def __enter__(self) -> "TicketCache":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def close(self) -> None:
+    self.connection.close()
+
+  @property
+  def cursor(self) -> Optional[str]:
+    """
+    Incremental export cursor of the last successful sync
+    """
+
+    row = self.connection.execute(
+      "SELECT value FROM sync_state WHERE key = 'cursor'"
+    ).fetchone()
+
+    return row[0] if row else None
+
+  def sync(self, ticket_viewer: TicketViewer) -> int:
+    """
+    Download the tickets that changed since the last sync
+    (or every ticket if the cache is empty) and return the status code
+    """
+
+    cursor = self.cursor
+
+    while True:
+      response = ticket_viewer.get_incremental_tickets(cursor=cursor)
+
+      if response.status_code != 200 or response.tickets is None:
+        return response.status_code
+
+      # Store the tickets and the cursor that comes after them together,
+      # so an interrupted sync resumes from the last stored page
+      with self.connection:
+        self.store(response.tickets)
+        self.connection.execute(
+          "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('cursor', ?)",
+          (response.after_cursor,)
+        )
+
+      cursor = response.after_cursor
+
+      if response.end_of_stream:
+        return response.status_code
+
+  def store(self, tickets: List[Ticket]) -> None:
+    """
+    Insert or update tickets, removing the ones that were deleted
+    """
+
+    self.connection.executemany(
+      "INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?, ?, ?)",
+      [
+        tuple(ticket[key] for key in TICKET_FIELDS)
+        for ticket in tickets if ticket["status"] != "deleted"
+      ]
+    )
+    self.connection.executemany(
+      "DELETE FROM tickets WHERE id = ?",
+      [(ticket["id"],) for ticket in tickets if ticket["status"] == "deleted"]
+    )
+
+  def invalidate(self) -> None:
+    """
+    Remove every cached ticket so that the next sync downloads all of them
+    """
+
+    with self.connection:
+      self.connection.execute("DELETE FROM tickets")
+      self.connection.execute("DELETE FROM sync_state")
+
+  def rebuild(self, ticket_viewer: TicketViewer) -> int:
+    """
+    Download every ticket again and return the status code
+    """
+
+    self.invalidate()
+    return self.sync(ticket_viewer)
+
+  def count_tickets(self) -> CountTicketsResponse:
+    """
+    Count the number of cached tickets
+    """
+
+    count = self.connection.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+    return CountTicketsResponse(200, count=count)
+
+  def iter_tickets(self) -> Iterator[Ticket]:
+    """
+    Iterate over every cached ticket, in no particular order
+    """
+
+    for row in self.connection.execute("SELECT id, updated_at, type, subject, priority, status FROM tickets"):
+      yield Ticket(*row)
+
+  def get_tickets(
+    self,
+    link: Optional[str] = None,
+    page_size: int = 25
+  ) -> GetTicketsResponse:
+    """
+    List cached tickets with the most recently updated one first,
+    where links are the offsets of the previous/next pages
+    """
+
+    offset = int(link) if link is not None else 0
+
+    # Like the API, going past either end of the table returns no tickets
+    if offset < 0:
+      return GetTicketsResponse(200, [], next_link="0", has_more=False)
+
+    rows = self.connection.execute(
+      "SELECT id, updated_at, type, subject, priority, status FROM tickets "
+      "ORDER BY updated_at DESC, id DESC LIMIT ? OFFSET ?",
+      (page_size + 1, offset)
+    ).fetchall()
+
+    return GetTicketsResponse(
+      200,
+      [Ticket(*row) for row in rows[:page_size]],
+      prev_link=str(offset - page_size),
+      next_link=str(offset + page_size),
+      has_more=len(rows) > page_size
+    )
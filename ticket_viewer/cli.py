@@ -1,12 +1,92 @@
 """This module provides Ticket Viewer CLI"""
 
+import os
 import sys
 import re
-from typing import List, Dict, Optional
+import json
+import shutil
+import argparse
+from datetime import datetime
+from functools import cached_property
+from itertools import islice
+from typing import TYPE_CHECKING, Any, List, Dict, Optional, Sequence, TextIO, Union
 
 from ticket_viewer import STATUS_CODE_MESSAGE
-from ticket_viewer.ticket_viewer import TicketViewer
+from ticket_viewer.cache import TicketCache
+from ticket_viewer.crawl import SHARD_KEYS, crawl_tickets
+from ticket_viewer.detail import TicketDetailViewer
+from ticket_viewer.export import EXPORT_FORMATS, export_tickets
+from ticket_viewer.instrumentation import INSTRUMENTATION, Profiler
+from ticket_viewer.multi import AccountError
+from ticket_viewer.search import TicketIndex, parse_query
+from ticket_viewer.stats import CATEGORIES, PERIODS, STATS_FIELDS, TicketStats
+from ticket_viewer.ticket_viewer import MAX_PAGE_SIZE, SHOW_MANY_MAX_IDS, TICKET_FIELDS, GetTicketsResponse, Ticket, \
+  TicketViewer, TicketViewerError, select_ticket_fields
 from ticket_viewer.util import *
+from ticket_viewer.watch import MAX_INTERVAL, MIN_INTERVAL, ScreenRegion, TicketWatcher
+
+if TYPE_CHECKING:
+  from ticket_viewer.pager import PagePrefetcher
+
+class WatchDisplay:
+  """
+  A class for showing the tickets of a TicketWatcher. On a terminal,
+  the table is redrawn in place, rewriting only the rows that changed.
+  Otherwise the tickets are written as they change
+  """
+
+  def __init__(
+    self,
+    watcher: TicketWatcher,
+    format: str = "table",
+    stream: Optional[TextIO] = None,
+    timestamp_formatter: Optional[TimestampFormatter] = None
+  ) -> None:
+    self.watcher: TicketWatcher = watcher
+    self.format: str = format
+    self.stream: TextIO = stream or sys.stdout
+    self.timestamp_formatter: TimestampFormatter = timestamp_formatter or get_timestamp_formatter()
+    self.keys: List[str] = list(TABLE_KEYS)
+    self.headers: List[str] = get_table_headers(self.keys, self.timestamp_formatter)
+    # Columns only grow, so that a changed row does not move the others
+    self.col_width: Optional[List[int]] = None
+    self.region: Optional[ScreenRegion] = None
+
+    if format == "table" and self.stream.isatty():
+      self.region = ScreenRegion(self.stream, shutil.get_terminal_size().columns)
+
+  def start(self) -> None:
+    """
+    Show the tickets the view starts with
+    """
+
+    if self.region is not None:
+      self([])
+    else:
+      write_tickets(self.watcher.view.rows, self.format, stream=self.stream, timestamp_formatter=self.timestamp_formatter)
+
+  def __call__(self, changed: List[Ticket]) -> None:
+    if self.region is None:
+      if changed:
+        write_tickets(changed, self.format, stream=self.stream, timestamp_formatter=self.timestamp_formatter)
+      return
+
+    lines, self.col_width = layout_table(
+      self.watcher.view.rows,
+      self.keys,
+      self.headers,
+      self.timestamp_formatter,
+      self.col_width
+    )
+    checked_at = datetime.fromtimestamp(self.watcher.checked_at, self.timestamp_formatter.tz)
+
+    self.region.draw([
+      "",
+      *lines,
+      "",
+      f"Checked at {checked_at:%I:%M:%S%p}, {len(changed)} changed." \
+        f" Next check in {self.watcher.interval:.3g} s. Press Ctrl-C to stop."
+    ])
 
 class CLIApp():
   """
@@ -16,22 +96,67 @@ class CLIApp():
   
   def __init__(self) -> None:
     self.ticket_viewer: TicketViewer = get_ticket_viewer() # To connect to Zendesk API
+    # Where pages of tickets are read from (the cache if it is enabled)
+    self.ticket_source: Union[TicketViewer, TicketCache, TicketIndex] = self.ticket_viewer
+    # Fetches the pages around the one being shown while the user is paging through tickets
+    self.pager: Optional["PagePrefetcher"] = None
     self.prev_link: Optional[str] = None # To access prev page of tickets if >25 tickets are returned
     self.next_link: Optional[str] = None # To access next page of tickets if >25 tickets are returned
     self.is_page_through: bool = False # If the user is paging through tickets
     self.page_through_options: List[str] = ["", ""] # Where there might be more tickets to see
 
+  @cached_property
+  def timestamp_formatter(self) -> TimestampFormatter:
+    """
+    Timezone tickets' 'updated_at' is displayed in, loaded with the first table
+    """
+
+    return get_timestamp_formatter()
+
+  @cached_property
+  def ticket_cache(self) -> Optional[TicketCache]:
+    """
+    Local copy of tickets if it is enabled, opened when an option first needs it
+    """
+
+    return get_ticket_cache()
+
+  @cached_property
+  def ticket_index(self) -> TicketIndex:
+    """
+    Index to search tickets without the API, opened with the first search
+    """
+
+    return get_ticket_index()
+
+  @cached_property
+  def prefetch_options(self) -> Dict[str, int]:
+    """
+    How many pages are fetched ahead, loaded when the user first pages through tickets
+    """
+
+    return get_prefetch_options()
+
   def print_main_menu(self) -> None:
     """
     Show the main menu containing main functionalities of the app
     """
 
+    cache_options = ""
+
+    if get_cache_directory() is not None:
+      cache_options = "\n* Type 'rebuild' to download all tickets into the local cache again" \
+        "\n* Type 'invalidate' to empty the local cache"
+
     print(
         re.sub(" {2}", "",
-        """
+        f"""
         Select view options:
         * Type '1' to view all tickets
-        * Type '2' to view a specific ticket
+        * Type '2' to view specific tickets
+        * Type '3' to filter tickets by status, priority, type or date
+        * Type '4' to search tickets by keywords
+        * Type '5' to watch the most recently updated tickets change{cache_options}
         * Type 'quit' to exit
         """)
     )
@@ -41,32 +166,12 @@ class CLIApp():
     Print a table containing tickets the account has
     """
 
-    column_names = ["ID", "Updated at (SGT)", "Type", \
-      "Priority", "Status", "Subject"] # Table headers
-    keys = ["id", "updated_at", "type", "priority", "status", "subject"]
+    keys = list(TABLE_KEYS)
+    column_names = get_table_headers(keys, self.timestamp_formatter) # Table headers
     
-    # Find the width of each column in the table
-    col_width = find_column_width(tickets, keys, column_names)
-
-    # Print table headers
-    headers_list = [""] * len(column_names)
-
-    for idx, col in enumerate(column_names):
-      header_value = generate_cell(
-        col,
-        col_width[idx],
-        is_first_col=idx == 0
-      )
-      headers_list[idx] = header_value
-
-    headers = "".join(headers_list)
-    print(f"\n{headers}")
-    print("-" * len(headers))
-
-    # Print table content (tickets) row by row
-    for ticket in tickets:
-      row = generate_row(ticket, keys, col_width)
-      print(row)
+    # Render the whole table at once and print it with a single write
+    with self.ticket_viewer.instrumentation.timer("render", rows=len(tickets), format="table"):
+      write_table(tickets, keys, column_names, timestamp_formatter=self.timestamp_formatter)
 
   def print_page_through_results(
     self, 
@@ -123,6 +228,37 @@ class CLIApp():
       """)
     )
 
+  def start_page_through(
+    self,
+    source: Union[TicketViewer, TicketCache, TicketIndex],
+    response: GetTicketsResponse,
+    options: List[str]
+  ) -> None:
+    """
+    Show the first page of tickets and let the user page through the rest
+    """
+
+    # Imported with the first page to keep threads out of the startup
+    from ticket_viewer.pager import PagePrefetcher
+
+    # Only pages from the API are worth fetching ahead of time
+    if self.pager is not None:
+      self.pager.close()
+
+    self.pager = PagePrefetcher(
+      source,
+      **{**self.prefetch_options, **({} if source is self.ticket_viewer else {"depth": 0})}
+    )
+    self.pager.start(response)
+
+    self.ticket_source = source
+    self.is_page_through = True
+    self.prev_link = response.prev_link
+    self.next_link = response.next_link
+    self.page_through_options = options
+
+    self.print_page_through_results(response.tickets)
+
   def page_through(self, input: str) -> None:
     """
     Logic for when user is paging through tickets
@@ -148,8 +284,9 @@ class CLIApp():
       )
 
     if is_valid_input:
-      get_tickets_response = self.ticket_viewer.get_tickets(
-        link=self.next_link if input == "next" else self.prev_link
+      get_tickets_response = self.pager.get(
+        self.next_link if input == "next" else self.prev_link,
+        input
       )
       tickets = get_tickets_response.tickets
 
@@ -166,10 +303,15 @@ class CLIApp():
 
         all_options = ["next", "prev"]
 
-        # Should not keep going in the same direction
-        # since there are no more tickets to see
-        if len(tickets) < 25:
+        # Should not keep going forward since there are no more tickets to see
+        if input == "next" and not get_tickets_response.has_more:
           all_options.remove(input)
+
+        # Pages of search results have no link before the first page or after the last one
+        all_options = [
+          option for option in all_options
+          if (self.next_link if option == "next" else self.prev_link) is not None
+        ]
         
         self.page_through_options = all_options 
         
@@ -196,7 +338,18 @@ class CLIApp():
     Logic for when user requests to see all tickets
     """
 
-    status_code, count = self.ticket_viewer.count_tickets()
+    # Bring the local cache up to date before reading tickets from it
+    if self.ticket_cache is not None:
+      status_code = self.ticket_cache.sync(self.ticket_viewer)
+
+      if status_code != 200:
+        print(STATUS_CODE_MESSAGE[status_code])
+        self.print_main_menu()
+        return
+
+      self.ticket_source = self.ticket_cache
+
+    status_code, count = self.ticket_source.count_tickets()
 
     # Inform user if API is unavailable
     if status_code != 200:
@@ -211,7 +364,7 @@ class CLIApp():
     else:
       # Since count is bigger than 0, try to get user's tickets
       # sorted by their 'updated_at' with the most recently updated one first
-      get_tickets_response = self.ticket_viewer.get_tickets()
+      get_tickets_response = self.ticket_source.get_tickets()
 
       # If we fail to connect to API, remain at main menu
       if get_tickets_response.status_code != 200 or \
@@ -224,19 +377,67 @@ class CLIApp():
         print("\nThere are no tickets to see.")
         self.print_main_menu()
 
-      # If there are <=25 tickets, print table and remain at main menu
-      elif count <= 25 or len(get_tickets_response.tickets) < 25:
+      # If every ticket fits in one page, print table and remain at main menu
+      elif count <= 25 or not get_tickets_response.has_more:
         self.print_table(get_tickets_response.tickets)
         self.print_main_menu()
 
       # If there are > 25 tickets, enter page_through mode
       else:
-        self.is_page_through = True
-        self.prev_link = get_tickets_response.prev_link
-        self.next_link = get_tickets_response.next_link
-        self.page_through_options = ["next", "prev"]
+        self.start_page_through(self.ticket_source, get_tickets_response, ["next", "prev"])
+
+  def process_get_filtered_tickets_request(self, filters: Dict[str, List[str]]) -> None:
+    """
+    Logic for when user requests to see tickets matching some filters
+    """
+
+    # Only the matching tickets are sent by the search API
+    response = self.ticket_viewer.get_tickets(filters=filters)
+
+    if response.status_code != 200 or response.tickets is None:
+      print(STATUS_CODE_MESSAGE[response.status_code])
+      self.print_main_menu()
+
+    elif not len(response.tickets):
+      print("\nThere are no tickets matching these filters.")
+      self.print_main_menu()
+
+    # All the matching tickets fit in one page
+    elif response.next_link is None:
+      self.print_table(response.tickets)
+      self.print_main_menu()
+
+    # Otherwise page through the search results, which come from the API
+    # even when the local cache is enabled
+    else:
+      self.start_page_through(self.ticket_viewer, response, ["next"])
+
+  def process_search_request(self, query: str) -> None:
+    """
+    Logic for when user searches tickets by keywords
+    """
+
+    # Bring the index up to date before searching it
+    status_code = self.ticket_index.sync(self.ticket_viewer)
+
+    if status_code != 200:
+      print(STATUS_CODE_MESSAGE[status_code])
+      self.print_main_menu()
+      return
 
-        self.print_page_through_results(get_tickets_response.tickets)
+    response = self.ticket_index.get_tickets(query=query)
+
+    if not len(response.tickets):
+      print("\nThere are no tickets matching this search.")
+      self.print_main_menu()
+
+    # All the matching tickets fit in one page
+    elif not response.has_more:
+      self.print_table(response.tickets)
+      self.print_main_menu()
+
+    else:
+      self.start_page_through(self.ticket_index, response, ["next"])
 
   def process_get_indiv_ticket_request(self, ticket_number: str) -> None:
     """
@@ -253,6 +454,71 @@ class CLIApp():
       print(STATUS_CODE_MESSAGE[response.status_code])
       self.print_main_menu()
 
+  def process_get_tickets_by_ids_request(self, ticket_numbers: List[int]) -> None:
+    """
+    Logic for when user requests for several specific tickets
+    """
+
+    response = self.ticket_viewer.get_tickets_by_ids(ticket_numbers)
+
+    if response.status_code != 200 or response.tickets is None:
+      print(STATUS_CODE_MESSAGE[response.status_code])
+
+    else:
+      if len(response.tickets):
+        self.print_table(response.tickets)
+
+      # Let the user know which of the tickets could not be found
+      if response.missing_ids:
+        print(
+          "\nOops these ticket numbers do not exist: " \
+          f"{', '.join(map(str, response.missing_ids))}"
+        )
+
+    self.print_main_menu()
+
+  def process_watch_request(self) -> None:
+    """
+    Logic for when user wants to watch tickets change
+    """
+
+    watcher = TicketWatcher(self.ticket_viewer)
+    status_code = watcher.start()
+
+    if status_code == 200:
+      display = WatchDisplay(watcher, timestamp_formatter=self.timestamp_formatter)
+      display.start()
+
+      # Ctrl-C goes back to the main menu
+      try:
+        status_code = watcher.run(display)
+      except KeyboardInterrupt:
+        pass
+
+    if status_code != 200:
+      print(STATUS_CODE_MESSAGE[status_code])
+
+    self.print_main_menu()
+
+  def process_cache_request(self, command: str) -> None:
+    """
+    Logic for when user requests to rebuild or invalidate the local cache
+    """
+
+    if command == "invalidate":
+      self.ticket_cache.invalidate()
+      print("\nThe local cache is now empty.")
+
+    else:
+      status_code = self.ticket_cache.rebuild(self.ticket_viewer)
+
+      if status_code != 200:
+        print(STATUS_CODE_MESSAGE[status_code])
+      else:
+        print(f"\nThe local cache now has {self.ticket_cache.count_tickets().count} tickets.")
+
+    self.print_main_menu()
+
   def run(self) -> None:
     """
     Start the CLI app
@@ -264,6 +530,14 @@ class CLIApp():
     for line in sys.stdin:
       if "quit" == line.strip():
           print("\nThank you for using Ticket Viewer. Bye. :D\n")
+          if self.pager is not None:
+            self.pager.close()
+          self.ticket_viewer.close()
+          # Only the ones that were opened
+          if "ticket_index" in self.__dict__:
+            self.ticket_index.close()
+          if self.__dict__.get("ticket_cache") is not None:
+            self.ticket_cache.close()
           sys.exit()
       
       # Check if user is in page through mode
@@ -275,20 +549,762 @@ class CLIApp():
         if "1" == line.strip():
           self.process_get_all_tickets_request()
 
-        # Get a specific ticket
+        # Get specific tickets
         elif "2" == line.strip():
-          ticket_number = input("\nEnter ticket ID:\n").strip()
+          ticket_numbers = parse_ticket_ids(
+            input("\nEnter ticket ID(s), e.g. 1 or 1,5,10-40:\n").strip()
+          )
+
+          # Input has to be integers or ranges of integers
+          if not ticket_numbers:
+            print("\nTicket number has to be an integer or a list/range of integers" \
+              f" of at most {MAX_TICKET_IDS} tickets. Please try again.")
+            self.print_main_menu()
+
+          elif len(ticket_numbers) == 1:
+            self.process_get_indiv_ticket_request(str(ticket_numbers[0]))
 
-          # Input has to be integer
-          if not ticket_number.isdigit():
-            print("\nTicket number has to be an integer. Please try again.")
+          else:
+            self.process_get_tickets_by_ids_request(ticket_numbers)
+
+        # Get tickets matching some filters
+        elif "3" == line.strip():
+          filters = parse_ticket_filters(
+            input(
+              "\nEnter filters, e.g. status:open,pending priority:urgent type:incident" \
+              " updated_after:2021-12-01 updated_before:2022-01-01:\n"
+            ).strip()
+          )
+
+          # Input has to be known filters with valid values
+          if not filters:
+            print("\nFilters have to be status, priority, type, updated_after or" \
+              " updated_before followed by ':' and valid values. Please try again.")
             self.print_main_menu()
 
           else:
-            self.process_get_indiv_ticket_request(ticket_number)
+            self.process_get_filtered_tickets_request(filters)
+
+        # Search tickets by keywords
+        elif "4" == line.strip():
+          query = input(
+            "\nEnter keywords, e.g. printer jam* status:open,pending updated_after:2021-12-01:\n"
+          ).strip()
+
+          # Query has to be words, prefixes ending with '*' or valid filters
+          try:
+            parse_query(query)
+          except ValueError:
+            print("\nKeywords have to be words, prefixes ending with '*' or filters on status," \
+              " priority, type, updated_after or updated_before. Please try again.")
+            self.print_main_menu()
+          else:
+            self.process_search_request(query)
+
+        # Watch the most recently updated tickets
+        elif "5" == line.strip():
+          self.process_watch_request()
+
+        # Manage the local cache
+        elif line.strip() in ("rebuild", "invalidate") and self.ticket_cache is not None:
+          self.process_cache_request(line.strip())
 
         else:
             print("\nInvalid input. Please try again.")
             self.print_main_menu()
     
-    return
\ No newline at end of file
+    return
+
+SORT_ORDERS = ("-updated_at", "updated_at", "-id", "id")
+FILTERS_HELP = "e.g. status:open,pending priority:urgent type:incident " \
+  "updated_after:2021-12-01 updated_before:2022-01-01"
+
+def print_error(message: str) -> None:
+  """
+  Messages go to stderr so that they do not mix with the tickets written to stdout
+  """
+
+  print(message, file=sys.stderr)
+
+def parse_filters_argument(filters: List[str]) -> Optional[Dict[str, List[str]]]:
+  """
+  Parse the --filter arguments of a command, printing a message if they are not valid
+  """
+
+  parsed = parse_ticket_filters(" ".join(filters))
+
+  if not parsed:
+    print_error("\nFilters have to be status, priority, type, updated_after or" \
+      " updated_before followed by ':' and valid values.")
+
+  return parsed
+
+def run_list(args: argparse.Namespace) -> int:
+  """
+  Write every ticket (or the ones matching the filters), page by page as they arrive
+  """
+
+  filters = None
+
+  if args.filter:
+    filters = parse_filters_argument(args.filter)
+    if not filters:
+      return 2
+
+    # The search API cannot sort by ID
+    if args.sort.lstrip("-") == "id":
+      print_error("\nFiltered tickets can only be sorted by updated_at.")
+      return 2
+
+  try:
+    fields = select_ticket_fields(args.fields.split(",")) if args.fields else TICKET_FIELDS
+  except ValueError:
+    print_error(f"\nFields have to be some of {', '.join(TICKET_FIELDS)}.")
+    return 2
+
+  # No need to download more than the tickets that will be written
+  page_size = min(args.page_size, args.limit) if args.limit else args.page_size
+
+  if args.all_accounts:
+    return list_all_accounts(args, page_size, fields, filters)
+
+  with get_ticket_viewer() as ticket_viewer:
+    tickets = ticket_viewer.iter_tickets(
+      page_size,
+      args.sort,
+      fields=None if fields == TICKET_FIELDS else fields,
+      filters=filters
+    )
+
+    try:
+      write_tickets(
+        islice(tickets, args.limit) if args.limit else tickets,
+        args.format,
+        fields,
+        timestamp_formatter=get_timestamp_formatter(),
+        chunk_size=page_size,
+        window=args.window
+      )
+    except TicketViewerError as error:
+      print_error(STATUS_CODE_MESSAGE[error.status_code])
+      return 1
+
+  return 0
+
+def list_all_accounts(
+  args: argparse.Namespace,
+  page_size: int,
+  fields: Sequence[str],
+  filters: Optional[Dict[str, List[str]]]
+) -> int:
+  """
+  Write the tickets of every account merged into one list,
+  each with the name of its account
+  """
+
+  with get_multi_ticket_viewer() as multi_ticket_viewer:
+    tickets = (
+      {ACCOUNT_KEY: account, **ticket.to_dict()}
+      for account, ticket in multi_ticket_viewer.iter_tickets(
+        page_size,
+        args.sort,
+        fields=None if fields == TICKET_FIELDS else fields,
+        filters=filters
+      )
+    )
+
+    try:
+      write_tickets(
+        islice(tickets, args.limit) if args.limit else tickets,
+        args.format,
+        (ACCOUNT_KEY, *fields),
+        timestamp_formatter=get_timestamp_formatter(),
+        chunk_size=page_size,
+        window=args.window
+      )
+    except AccountError as error:
+      print_error(f"\nAccount {error.account}:{STATUS_CODE_MESSAGE[error.status_code]}")
+      return 1
+
+  return 0
+
+def run_show(args: argparse.Namespace) -> int:
+  """
+  Write specific tickets, in the order their IDs were given in
+  """
+
+  ticket_numbers = parse_ticket_ids(",".join(args.ids))
+
+  if not ticket_numbers:
+    print_error(f"\nTicket number has to be an integer or a list/range of integers of at most {MAX_TICKET_IDS} tickets.")
+    return 2
+
+  if args.detail:
+    return show_details(args, ticket_numbers)
+
+  # Keep a pooled connection for each request in flight
+  with get_ticket_viewer(pool_maxsize=max(args.concurrency, 10)) as ticket_viewer:
+    response = ticket_viewer.get_tickets_by_ids(ticket_numbers, max_concurrency=args.concurrency)
+
+  if response.status_code != 200 or response.tickets is None:
+    print_error(STATUS_CODE_MESSAGE[response.status_code])
+    return 1
+
+  write_tickets(response.tickets, args.format, timestamp_formatter=get_timestamp_formatter())
+
+  # Let the user know which of the tickets could not be found
+  if response.missing_ids:
+    print_error(
+      "\nOops these ticket numbers do not exist: " \
+      f"{', '.join(map(str, response.missing_ids))}"
+    )
+    return 1
+
+  return 0
+
+def show_details(args: argparse.Namespace, ticket_numbers: List[int]) -> int:
+  """
+  Write specific tickets with their people, organization and comments,
+  one ticket after the other. People are looked up once for every ticket
+  """
+
+  timestamp_formatter = get_timestamp_formatter()
+  details = []
+  missing_ids = []
+
+  with get_ticket_viewer(pool_maxsize=max(args.concurrency, 10)) as ticket_viewer, \
+    TicketDetailViewer(ticket_viewer, max_workers=args.concurrency) as detail_viewer:
+    for ticket_number in ticket_numbers:
+      response = detail_viewer.get_ticket_detail(ticket_number)
+
+      if response.status_code == 404:
+        missing_ids.append(ticket_number)
+        continue
+
+      if response.status_code != 200 or response.detail is None:
+        print_error(STATUS_CODE_MESSAGE[response.status_code])
+        return 1
+
+      if args.format == "table":
+        sys.stdout.write(render_ticket_detail(response.detail, timestamp_formatter))
+      elif args.format == "ndjson":
+        sys.stdout.write(json.dumps(response.detail.to_dict()) + "\n")
+      else:
+        details.append(response.detail.to_dict())
+
+      sys.stdout.flush()
+
+  if args.format == "json":
+    print(json.dumps(details, indent=2))
+
+  # Let the user know which of the tickets could not be found
+  if missing_ids:
+    print_error(f"\nOops these ticket numbers do not exist: {', '.join(map(str, missing_ids))}")
+    return 1
+
+  return 0
+
+def run_count(args: argparse.Namespace) -> int:
+  """
+  Write the number of tickets (or of the ones matching the filters)
+  """
+
+  filters = None
+
+  if args.filter:
+    filters = parse_filters_argument(args.filter)
+    if not filters:
+      return 2
+
+  if args.all_accounts:
+    if filters:
+      print_error("\nFiltered tickets can only be counted for a single account.")
+      return 2
+
+    return count_all_accounts(args)
+
+  with get_ticket_viewer() as ticket_viewer:
+    # A page of a single search result also holds the number of matching tickets
+    if filters:
+      response = ticket_viewer.get_tickets(
+        ticket_viewer.search_link(filters, page_size=1),
+        use_cache=False,
+        fields=["id"]
+      )
+    else:
+      response = ticket_viewer.count_tickets()
+
+  if response.status_code != 200 or response.count is None:
+    print_error(STATUS_CODE_MESSAGE[response.status_code])
+    return 1
+
+  print(response.count if args.format == "table" else json.dumps({"count": response.count}))
+  return 0
+
+def count_all_accounts(args: argparse.Namespace) -> int:
+  """
+  Write the number of tickets of every account and their total
+  """
+
+  with get_multi_ticket_viewer() as multi_ticket_viewer:
+    responses = multi_ticket_viewer.count_tickets()
+
+  for account, response in responses.items():
+    if response.status_code != 200 or response.count is None:
+      print_error(f"\nAccount {account}:{STATUS_CODE_MESSAGE[response.status_code]}")
+      return 1
+
+  counts = {account: response.count for account, response in responses.items()}
+  total = sum(counts.values())
+
+  if args.format == "table":
+    width = max(map(len, counts))
+    print("\n".join(f"{account:<{width}}  {count}" for account, count in counts.items()))
+    print(f"{'total':<{width}}  {total}")
+  else:
+    print(json.dumps({"count": total, "accounts": counts}))
+
+  return 0
+
+def load_search_index(ticket_viewer: TicketViewer) -> Optional[TicketIndex]:
+  """
+  Open the search index of the index directory, or index the tickets of
+  the local cache in memory, brought up to date first. None if neither
+  directory is set, as an index only in memory would start from every ticket.
+  Raises TicketViewerError if tickets cannot be fetched
+  """
+
+  ticket_index = get_ticket_index()
+
+  if ticket_index.path is not None:
+    status_code = ticket_index.sync(ticket_viewer)
+
+    if status_code != 200:
+      ticket_index.close()
+      raise TicketViewerError(status_code)
+
+    return ticket_index
+
+  ticket_cache = get_ticket_cache()
+
+  if ticket_cache is None:
+    return None
+
+  with ticket_cache:
+    status_code = ticket_cache.sync(ticket_viewer)
+
+    if status_code != 200:
+      raise TicketViewerError(status_code)
+
+    ticket_index.add(list(ticket_cache.iter_tickets()))
+
+  return ticket_index
+
+def run_search(args: argparse.Namespace) -> int:
+  """
+  Write the tickets matching keywords from the local search index,
+  the most recently updated first
+  """
+
+  query = " ".join(args.query)
+
+  try:
+    parse_query(query)
+  except ValueError:
+    print_error("\nKeywords have to be words, prefixes ending with '*' or filters on status," \
+      " priority, type, updated_after or updated_before.")
+    return 2
+
+  with get_ticket_viewer() as ticket_viewer:
+    try:
+      ticket_index = load_search_index(ticket_viewer)
+    except TicketViewerError as error:
+      print_error(STATUS_CODE_MESSAGE[error.status_code])
+      return 1
+
+  if ticket_index is None:
+    print_error("\nSearching needs an index directory (indexDir) or a cache directory (cacheDir)" \
+      " in the .env file, so that each search does not download every ticket again.")
+    return 2
+
+  with ticket_index:
+    tickets = ticket_index.search(query, limit=args.limit or ticket_index.count_tickets().count)
+    write_tickets(tickets, args.format, timestamp_formatter=get_timestamp_formatter())
+
+  return 0
+
+def load_stats(ticket_viewer: TicketViewer) -> TicketStats:
+  """
+  Load every ticket from the local cache (brought up to date first)
+  if it is enabled, and from the API otherwise.
+  Raises TicketViewerError if tickets cannot be fetched
+  """
+
+  ticket_cache = get_ticket_cache()
+
+  if ticket_cache is None:
+    return TicketStats.of(ticket_viewer.iter_tickets(fields=STATS_FIELDS))
+
+  with ticket_cache:
+    status_code = ticket_cache.sync(ticket_viewer)
+
+    if status_code != 200:
+      raise TicketViewerError(status_code)
+
+    return TicketStats.of_cache(ticket_cache)
+
+def run_stats(args: argparse.Namespace) -> int:
+  """
+  Write the number of tickets by status, priority and type (or the groups
+  given with --by), and how many were last updated each day or week
+  """
+
+  groups = [tuple(fields.split(",")) for fields in args.by] if args.by \
+    else [(field,) for field in CATEGORIES]
+
+  if any(field not in CATEGORIES for fields in groups for field in fields):
+    print_error(f"\nTickets can only be grouped by {', '.join(CATEGORIES)}.")
+    return 2
+
+  with get_ticket_viewer() as ticket_viewer:
+    try:
+      stats = load_stats(ticket_viewer)
+    except TicketViewerError as error:
+      print_error(STATUS_CODE_MESSAGE[error.status_code])
+      return 1
+
+  total = len(stats)
+  timestamp_formatter = get_timestamp_formatter() if args.period else None
+
+  with ticket_viewer.instrumentation.timer("aggregate", tickets=total):
+    breakdowns = {fields: stats.count_by(*fields) for fields in groups}
+    histogram = stats.histogram(args.period, timestamp_formatter.tz) if args.period else []
+
+  if args.format == "table":
+    tables = [f"\n{total} tickets\n"]
+
+    for fields, counts in breakdowns.items():
+      tables.append(render_counts(
+        [*(field.capitalize() for field in fields), "Count", "Share"],
+        [(*group, count, f"{count / total:.1%}") for group, count in counts.items()]
+      ))
+
+    if args.period:
+      tables.append(render_counts(
+        [f"{'Day' if args.period == 'day' else 'Week of'} ({timestamp_formatter.label})", "Count"],
+        [(start.isoformat(), count) for start, count in histogram]
+      ))
+
+    sys.stdout.write("".join(tables))
+    return 0
+
+  rows = [{"count": total}]
+
+  for fields, counts in breakdowns.items():
+    rows.extend({"by": ",".join(fields), **dict(zip(fields, group)), "count": count} for group, count in counts.items())
+
+  rows.extend({args.period: start.isoformat(), "count": count} for start, count in histogram)
+
+  if args.format == "json":
+    print(json.dumps(rows, indent=2))
+  else:
+    print("\n".join(map(json.dumps, rows)))
+
+  return 0
+
+def run_watch(args: argparse.Namespace) -> int:
+  """
+  Show the most recently updated tickets and keep them up to date
+  until interrupted, or write the tickets as they change
+  """
+
+  with get_ticket_viewer() as ticket_viewer:
+    watcher = TicketWatcher(ticket_viewer, args.rows, args.interval, args.max_interval)
+    status_code = watcher.start()
+
+    if status_code == 200:
+      display = WatchDisplay(watcher, args.format)
+      display.start()
+
+      try:
+        status_code = watcher.run(display, polls=args.polls)
+      except KeyboardInterrupt:
+        pass
+
+  if status_code != 200:
+    print_error(STATUS_CODE_MESSAGE[status_code])
+    return 1
+
+  return 0
+
+def run_export(args: argparse.Namespace) -> int:
+  """
+  Export every ticket to a file, resuming the last export if it was interrupted
+  """
+
+  ticket_viewer = get_ticket_viewer()
+
+  def report_progress(rows: int, seconds: float) -> None:
+    print(f"\rExported {rows} tickets ({rows / seconds:.0f} rows/s)", end="", file=sys.stderr)
+
+  with ticket_viewer:
+    result = export_tickets(
+      ticket_viewer,
+      args.output,
+      format=args.format,
+      page_size=args.page_size,
+      convert_timestamps=get_timestamp_formatter().format_column if args.display_time else None,
+      progress=report_progress
+    )
+
+  print(file=sys.stderr)
+
+  if result.status_code != 200:
+    print_error(STATUS_CODE_MESSAGE[result.status_code])
+    print_error(f"\nRun the same command again to resume the export from ticket {result.rows + 1}.")
+    return 1
+
+  print(
+    f"\nExported {result.rows} tickets to {args.output} in {result.seconds:.1f} s" \
+    f" ({result.rows_per_second:.0f} rows/s)."
+  )
+  return 0
+
+def run_crawl(args: argparse.Namespace) -> int:
+  """
+  Crawl every ticket into a file with several processes, each crawling
+  shards of the account, crawling again only the shards that failed last time
+  """
+
+  ticket_viewer = get_ticket_viewer()
+
+  def report_progress(crawled: int, shards: int, tickets: int) -> None:
+    print(f"\rCrawled {crawled}/{shards} shards ({tickets} tickets)", end="", file=sys.stderr)
+
+  with ticket_viewer:
+    result = crawl_tickets(
+      ticket_viewer,
+      args.output,
+      key=args.by,
+      processes=args.processes,
+      shards=args.shards,
+      requests_per_minute=args.requests_per_minute,
+      progress=report_progress
+    )
+
+  print(file=sys.stderr)
+
+  if result.status_code != 200:
+    print_error(STATUS_CODE_MESSAGE[result.status_code])
+
+    if result.gaps:
+      print_error(f"\n{len(result.gaps)} shards could not be crawled. Run the same command again to crawl them.")
+    return 1
+
+  print(
+    f"\nCrawled {result.tickets} tickets to {args.output} in {result.seconds:.1f} s" \
+    f" ({result.tickets_per_second:.0f} tickets/s, {result.duplicates} older copies left out)."
+  )
+  return 0
+
+def page_size_argument(string: str) -> int:
+  page_size = int(string)
+
+  if not 1 <= page_size <= MAX_PAGE_SIZE:
+    raise argparse.ArgumentTypeError(f"has to be between 1 and {MAX_PAGE_SIZE}")
+
+  return page_size
+
+def positive_argument(string: str) -> int:
+  number = int(string)
+
+  if number < 1:
+    raise argparse.ArgumentTypeError("has to be at least 1")
+
+  return number
+
+def interval_argument(string: str) -> float:
+  interval = float(string)
+
+  if interval < 0:
+    raise argparse.ArgumentTypeError("has to be at least 0")
+
+  return interval
+
+def add_profiling_arguments(parser: argparse.ArgumentParser, default: Any = None) -> None:
+  parser.add_argument(
+    "--profile", action="store_true", default=default or False,
+    help="print the p50/p95/p99 latency of requests, parsing and rendering at exit"
+  )
+  parser.add_argument(
+    "--trace", metavar="FILE", default=default,
+    help="write every request and timing to FILE in the Chrome trace format"
+  )
+
+def build_parser() -> argparse.ArgumentParser:
+  parser = argparse.ArgumentParser(
+    prog="python -m ticket_viewer",
+    description="View your Zendesk tickets. Without a command, the interactive menu is shown."
+  )
+  add_profiling_arguments(parser)
+  commands = parser.add_subparsers(dest="command")
+
+  # Profiling options can also be given after the command, where they
+  # must not override the ones given before it
+  profiling = argparse.ArgumentParser(add_help=False)
+  add_profiling_arguments(profiling, default=argparse.SUPPRESS)
+
+  # Options shared by the commands writing tickets to stdout
+  output = argparse.ArgumentParser(add_help=False)
+  output.add_argument(
+    "-f", "--format", choices=OUTPUT_FORMATS, default="table",
+    help="a table, a JSON array or one JSON object per line (default: table)"
+  )
+  page_size = argparse.ArgumentParser(add_help=False)
+  page_size.add_argument(
+    "--page-size", type=page_size_argument, default=MAX_PAGE_SIZE,
+    help=f"tickets fetched per request (at most {MAX_PAGE_SIZE})"
+  )
+  filters = argparse.ArgumentParser(add_help=False)
+  filters.add_argument(
+    "--filter", action="append", metavar="FILTERS",
+    help=f"only the tickets matching the filters, {FILTERS_HELP}"
+  )
+  accounts = argparse.ArgumentParser(add_help=False)
+  accounts.add_argument(
+    "--all-accounts", action="store_true",
+    help="cover every account listed in the file set as accountsFile in the .env file"
+  )
+
+  list_ = commands.add_parser(
+    "list", parents=[output, page_size, filters, accounts, profiling], help="list every ticket"
+  )
+  list_.add_argument("--sort", choices=SORT_ORDERS, default="-updated_at")
+  list_.add_argument("--limit", type=positive_argument, help="list at most this many tickets")
+  list_.add_argument("--fields", help=f"comma-separated properties to keep, from {','.join(TICKET_FIELDS)}")
+  list_.add_argument(
+    "--window", type=positive_argument, metavar="ROWS",
+    help="on a terminal, only show the last ROWS rows of the table, scrolling in place"
+  )
+  list_.set_defaults(handler=run_list)
+
+  show = commands.add_parser("show", parents=[output, profiling], help="show specific tickets")
+  show.add_argument("ids", nargs="+", metavar="ID", help="ticket IDs or ranges, e.g. 1 5 10-40")
+  show.add_argument(
+    "--concurrency", type=positive_argument, default=4,
+    help=f"requests of {SHOW_MANY_MAX_IDS} tickets sent at once (default: 4)"
+  )
+  show.add_argument(
+    "--detail", action="store_true",
+    help="also show the requester, assignee, organization and comments of each ticket"
+  )
+  show.set_defaults(handler=run_show)
+
+  count = commands.add_parser("count", parents=[output, filters, accounts, profiling], help="count the tickets")
+  count.set_defaults(handler=run_count)
+
+  search = commands.add_parser(
+    "search", parents=[output, profiling], help="search tickets by keywords in the local index"
+  )
+  search.add_argument("query", nargs="+", help="e.g. printer jam* status:open,pending")
+  search.add_argument("--limit", type=positive_argument, help="show at most this many tickets")
+  search.set_defaults(handler=run_search)
+
+  stats = commands.add_parser(
+    "stats", parents=[output, profiling], help="count tickets by status, priority, type and day"
+  )
+  stats.add_argument(
+    "--by", action="append", metavar="FIELDS",
+    help=f"comma-separated properties to count tickets by, from {','.join(CATEGORIES)}, can be repeated" \
+      " (default: each of them)"
+  )
+  stats.add_argument("--period", choices=PERIODS, help="also count the tickets last updated each day or week")
+  stats.set_defaults(handler=run_stats)
+
+  watch = commands.add_parser(
+    "watch", parents=[profiling], help="watch the most recently updated tickets change"
+  )
+  watch.add_argument(
+    "-f", "--format", choices=("table", "ndjson"), default="table",
+    help="a table redrawn in place on a terminal, or the tickets written as they change (default: table)"
+  )
+  watch.add_argument("--rows", type=positive_argument, default=25, help="tickets shown (default: 25)")
+  watch.add_argument(
+    "--interval", type=interval_argument, default=MIN_INTERVAL,
+    help=f"seconds between checks while tickets change (default: {MIN_INTERVAL:.0f})"
+  )
+  watch.add_argument(
+    "--max-interval", type=interval_argument, default=MAX_INTERVAL,
+    help=f"seconds between checks after a while without changes (default: {MAX_INTERVAL:.0f})"
+  )
+  watch.add_argument("--polls", type=positive_argument, help="stop after this many checks")
+  watch.set_defaults(handler=run_watch)
+
+  export = commands.add_parser("export", parents=[page_size, profiling], help="export every ticket to a file")
+  export.add_argument("-o", "--output", required=True, help="file to write the tickets to")
+  export.add_argument("-f", "--format", choices=EXPORT_FORMATS, default="jsonl")
+  export.add_argument(
+    "--display-time", action="store_true",
+    help="write 'updated_at' in the display timezone like the tables do"
+  )
+  export.set_defaults(handler=run_export)
+
+  crawl = commands.add_parser(
+    "crawl", parents=[profiling], help="crawl every ticket to a JSONL file with several processes"
+  )
+  crawl.add_argument("-o", "--output", required=True, help="file to write the tickets to")
+  crawl.add_argument(
+    "--by", choices=SHARD_KEYS, default="updated_at",
+    help="split the account into windows of updated_at or ranges of IDs (default: updated_at)"
+  )
+  crawl.add_argument(
+    "--processes", type=positive_argument,
+    help="processes crawling shards at once (default: one per CPU)"
+  )
+  crawl.add_argument("--shards", type=positive_argument, help="shards to split the account into (default: 4 per process)")
+  crawl.add_argument(
+    "--requests-per-minute", type=positive_argument,
+    help="rate limit shared by the processes (default: learned from the API)"
+  )
+  crawl.set_defaults(handler=run_crawl)
+
+  return parser
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+  """
+  Run a command, or the interactive menu if none is given
+  """
+
+  args = build_parser().parse_args(argv)
+  profiler = None
+
+  if args.profile or args.trace:
+    profiler = Profiler()
+    INSTRUMENTATION.subscribe(profiler)
+
+  try:
+    if args.command is None:
+      CLIApp().run()
+      return
+
+    try:
+      status = args.handler(args)
+    except BrokenPipeError:
+      # The output was closed early, e.g. 'python -m ticket_viewer list | head',
+      # so stop writing without a traceback
+      os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+      status = 1
+
+    sys.exit(status)
+
+  # Also reached when the menu exits through sys.exit
+  finally:
+    if profiler is not None:
+      INSTRUMENTATION.unsubscribe(profiler)
+
+      if args.profile:
+        profiler.report(sys.stderr)
+
+      if args.trace:
+        profiler.write_trace(args.trace)
+        print(f"\nTrace written to {args.trace}.", file=sys.stderr)
@@ -0,0 +1,373 @@
+"""
+This module provides backfills of every ticket of the account that split
+it into shards by 'updated_at' window or by ID range, crawl the shards in
+parallel across processes and merge them into a single JSONL file
+"""
+
+import os
+import re
+import json
+import math
+import time
+import shutil
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from ticket_viewer.rate_limit import RateLimiter
+from ticket_viewer.ticket_viewer import TICKET_FIELDS, Ticket, TicketViewer, TicketViewerError
+from ticket_viewer.watch import to_timestamp
+
+SHARD_KEYS = ("updated_at", "id")
+# Shards per process, so that processes done early take over the remaining shards
+SHARDS_PER_PROCESS = 4
+# IDs looked up per page of an ID shard (in requests of SHOW_MANY_MAX_IDS)
+ID_PAGE_SIZE = 1000
+PLAN_FILE = "plan.json"
+
+class Shard(NamedTuple):
+  index: int
+  start: int # First 'updated_at' (a Unix timestamp) or ID of the shard
+  end: Optional[int] = None # Excluded, None for a shard of 'updated_at' that runs to the end of the export
+
+class ShardResult(NamedTuple):
+  shard: Shard
+  status_code: int
+  tickets: int = 0
+
+class CrawlResult(NamedTuple):
+  status_code: int # 200 unless a shard could not be crawled
+  tickets: int = 0 # Tickets written
+  duplicates: int = 0 # Older copies of tickets that were found in several shards
+  gaps: Tuple[Shard, ...] = () # Shards that could not be crawled
+  seconds: float = 0
+  tickets_per_second: float = 0
+
+def format_timestamp(timestamp: int) -> str:
+  return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def plan_shards(ticket_viewer: TicketViewer, key: str, count: int) -> Tuple[int, List[Shard]]:
+  """
+  Split the tickets into count shards of equal width by key, from the oldest
+  'updated_at' to the newest one (the last shard runs to the end of the export)
+  or from ID 1 to the highest ID, and return the status code with the shards
+  """
+
+  if key not in SHARD_KEYS:
+    raise ValueError(f"key has to be one of {', '.join(SHARD_KEYS)}")
+
+  edges = []
+
+  for sort in ("updated_at", "-updated_at") if key == "updated_at" else ("-id",):
+    response = ticket_viewer.get_tickets(ticket_viewer.tickets_link(1, sort), use_cache=False)
+
+    if response.status_code != 200 or response.tickets is None:
+      return response.status_code, []
+
+    # The account has no tickets
+    if not response.tickets:
+      return 200, []
+
+    ticket = response.tickets[0]
+    edges.append(to_timestamp(ticket.updated_at) if key == "updated_at" else ticket.id)
+
+  first, last = (edges[0], edges[1] + 1) if key == "updated_at" else (1, edges[0] + 1)
+  width = max(math.ceil((last - first) / count), 1)
+  shards = [Shard(idx, start, min(start + width, last)) for idx, start in enumerate(range(first, last, width))]
+
+  if key == "updated_at":
+    shards[-1] = shards[-1]._replace(end=None)
+
+  return 200, shards
+
+def iter_updated_at_shard(ticket_viewer: TicketViewer, shard: Shard) -> Iterator[List[Ticket]]:
+  """
+  Yield the pages of tickets last updated within a shard through
+  the incremental export, leaving out deleted tickets.
+  Raises TicketViewerError if a page cannot be fetched
+  """
+
+  # Timestamps of the API compare in the same order as strings
+  end = format_timestamp(shard.end) if shard.end is not None else None
+  cursor = None
+
+  while True:
+    response = ticket_viewer.get_incremental_tickets(start_time=shard.start, cursor=cursor)
+
+    if response.status_code != 200 or response.tickets is None:
+      raise TicketViewerError(response.status_code)
+
+    page = []
+
+    for ticket in response.tickets:
+      if end is not None and ticket.updated_at >= end:
+        yield page
+        return
+
+      if ticket.status != "deleted":
+        page.append(ticket)
+
+    yield page
+
+    if response.end_of_stream:
+      return
+
+    cursor = response.after_cursor
+
+def iter_id_shard(ticket_viewer: TicketViewer, shard: Shard) -> Iterator[List[Ticket]]:
+  """
+  Yield the pages of tickets of a range of IDs (IDs of deleted tickets are skipped).
+  Raises TicketViewerError if a page cannot be fetched
+  """
+
+  for start in range(shard.start, shard.end, ID_PAGE_SIZE):
+    response = ticket_viewer.get_tickets_by_ids(range(start, min(start + ID_PAGE_SIZE, shard.end)))
+
+    if response.status_code != 200 or response.tickets is None:
+      raise TicketViewerError(response.status_code)
+
+    yield response.tickets
+
+def shard_path(directory: str, shard: Shard) -> str:
+  return os.path.join(directory, f"shard-{shard.index:05d}.jsonl")
+
+# The TicketViewer of a worker process, whose pooled session serves all its shards
+_ticket_viewer: Optional[TicketViewer] = None
+
+def init_worker(url: str, email: str, password: str, requests_per_minute: Optional[int]) -> None:
+  global _ticket_viewer
+
+  _ticket_viewer = TicketViewer(
+    url,
+    email,
+    password,
+    cache_max_bytes=0,
+    rate_limiter=RateLimiter(requests_per_minute)
+  )
+
+def crawl_shard(key: str, shard: Shard, directory: str) -> ShardResult:
+  """
+  Write the tickets of a shard to its own file in a worker process.
+  The file only gets its name once the shard is complete
+  """
+
+  path = shard_path(directory, shard)
+  pages = iter_updated_at_shard(_ticket_viewer, shard) if key == "updated_at" \
+    else iter_id_shard(_ticket_viewer, shard)
+  dumps = json.dumps
+  count = 0
+
+  with open(path + ".part", "w") as f:
+    try:
+      for page in pages:
+        f.write("".join(dumps(ticket.to_dict()) + "\n" for ticket in page))
+        count += len(page)
+
+    except TicketViewerError as error:
+      return ShardResult(shard, error.status_code, count)
+
+  os.replace(path + ".part", path)
+  return ShardResult(shard, 200, count)
+
+# Lines are written by Ticket.to_dict with 'id' first, as '{"id": 123, ...'
+TICKET_ID_PATTERN = re.compile(r'\{"id": (\d+)[,}]')
+
+def ticket_id(line: str) -> int:
+  match = TICKET_ID_PATTERN.match(line)
+
+  # Lines written some other way are decoded in full
+  return int(match.group(1)) if match is not None else json.loads(line)["id"]
+
+def merge_shards(directory: str, shards: Sequence[Shard], path: str) -> Tuple[int, int]:
+  """
+  Write the tickets of the crawled shards to path in the order of the shards,
+  keeping only the copy of each ticket from the last shard it was found in
+  (a ticket updated during the crawl is found again in a later shard),
+  and return the number of tickets written and of copies left out
+  """
+
+  # Number (from 1) of the last shard each ticket was found in, by ticket ID
+  owners = array("I")
+
+  for number, shard in enumerate(shards, 1):
+    with open(shard_path(directory, shard)) as f:
+      for line in f:
+        ticket = ticket_id(line)
+
+        if ticket >= len(owners):
+          owners.frombytes(bytes(owners.itemsize * (max(ticket + 1, len(owners) * 2) - len(owners))))
+
+        owners[ticket] = number
+
+  written = 0
+  duplicates = 0
+
+  with open(path, "w") as output:
+    for number, shard in enumerate(shards, 1):
+      with open(shard_path(directory, shard)) as f:
+        lines = []
+
+        for line in f:
+          ticket = ticket_id(line)
+
+          if owners[ticket] == number:
+            lines.append(line)
+            # Left out if found again in the same shard
+            owners[ticket] = 0
+          else:
+            duplicates += 1
+
+      output.write("".join(lines))
+      written += len(lines)
+
+  return written, duplicates
+
+class TicketCrawler:
+  """
+  A class for crawling every ticket of the account with several processes.
+
+  Following the cursor links of the tickets endpoint is serial, as each link
+  comes with the previous page. Instead, the account is split into shards,
+  windows of 'updated_at' read through the incremental export or ranges of IDs
+  read through show_many, which processes crawl independently of each other,
+  each with its own pooled session. The shards are written to a directory next
+  to path and merged into path once every shard was crawled.
+
+  The plan of the shards is kept until the merge, so crawling again after
+  a shard failed only crawls the shards that are not complete. When sharding
+  by 'updated_at', a last shard crawled once the others are done lists the
+  tickets updated since the crawl started, so that a ticket that moved to a
+  window that was already crawled is not missed (ID ranges are a snapshot of
+  the tickets that existed when the crawl started)
+  """
+
+  def __init__(
+    self,
+    ticket_viewer: TicketViewer,
+    path: str,
+    key: str = "updated_at",
+    processes: Optional[int] = None,
+    shards: Optional[int] = None,
+    requests_per_minute: Optional[int] = None,
+    progress: Optional[Callable[[int, int, int], None]] = None
+  ) -> None:
+    if key not in SHARD_KEYS:
+      raise ValueError(f"key has to be one of {', '.join(SHARD_KEYS)}")
+
+    self.ticket_viewer: TicketViewer = ticket_viewer
+    self.path: str = path
+    self.directory: str = f"{path}.shards"
+    self.key: str = key
+    self.processes: int = processes or os.cpu_count() or 1
+    self.shard_count: int = shards or self.processes * SHARDS_PER_PROCESS
+    # Shared evenly by the processes (learned from the API by this process if not given)
+    self.requests_per_minute: Optional[int] = requests_per_minute
+    # Called with the shards crawled, the number of shards and the tickets written by them
+    self.progress: Optional[Callable[[int, int, int], None]] = progress
+
+  def load_plan(self) -> Tuple[int, Optional[int], List[Shard]]:
+    """
+    The shards of the last crawl if it was not merged, or new ones,
+    with the status code and the time the crawl started
+    """
+
+    path = os.path.join(self.directory, PLAN_FILE)
+
+    if os.path.exists(path):
+      with open(path) as f:
+        plan = json.load(f)
+
+      if plan["key"] == self.key:
+        return 200, plan["started_at"], [Shard(*shard) for shard in plan["shards"]]
+
+      shutil.rmtree(self.directory)
+
+    started_at = int(time.time())
+    status_code, shards = plan_shards(self.ticket_viewer, self.key, self.shard_count)
+
+    if status_code == 200:
+      os.makedirs(self.directory, exist_ok=True)
+
+      with open(path, "w") as f:
+        json.dump({"key": self.key, "started_at": started_at, "shards": shards}, f)
+
+    return status_code, started_at, shards
+
+  def worker_requests_per_minute(self) -> Optional[int]:
+    """
+    The share of the rate limit of each process. A limit that was not given
+    is learned here once, from the requests that planned the shards or from
+    one more request, as processes that each learned it would together send
+    as many times the requests the account allows
+    """
+
+    limit = self.requests_per_minute or self.ticket_viewer.rate_limiter.limit
+
+    if limit is None:
+      self.ticket_viewer.get_tickets(self.ticket_viewer.tickets_link(1), use_cache=False)
+      limit = self.ticket_viewer.rate_limiter.limit
+
+    # Still None if the API does not tell its limit
+    return max(limit // self.processes, 1) if limit else None
+
+  def run(self) -> CrawlResult:
+    """
+    Crawl every shard that is not complete yet and merge the shards
+    if all of them are, returning the status code and the throughput
+    """
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    start = time.perf_counter()
+    status_code, started_at, shards = self.load_plan()
+
+    if status_code != 200:
+      return CrawlResult(status_code)
+
+    pending = [shard for shard in shards if not os.path.exists(shard_path(self.directory, shard))]
+    results: List[ShardResult] = []
+    with ProcessPoolExecutor(
+      max_workers=self.processes,
+      initializer=init_worker,
+      initargs=(
+        self.ticket_viewer.url,
+        self.ticket_viewer.email,
+        self.ticket_viewer.password,
+        self.worker_requests_per_minute()
+      )
+    ) as executor:
+      futures = [executor.submit(crawl_shard, self.key, shard, self.directory) for shard in pending]
+
+      for future in as_completed(futures):
+        results.append(future.result())
+
+        if self.progress is not None:
+          self.progress(len(results), len(pending), sum(result.tickets for result in results))
+
+      gaps = tuple(sorted(result.shard for result in results if result.status_code != 200))
+
+      # Tickets updated since the crawl started, some of which moved out of their window
+      if not gaps and shards and self.key == "updated_at":
+        tail = Shard(len(shards), started_at)
+        results.append(executor.submit(crawl_shard, self.key, tail, self.directory).result())
+        shards = [*shards, tail]
+
+        if results[-1].status_code != 200:
+          gaps = (tail,)
+
+    if gaps:
+      failed = [result for result in results if result.status_code != 200]
+      return CrawlResult(failed[0].status_code, gaps=gaps, seconds=time.perf_counter() - start)
+
+    written, duplicates = merge_shards(self.directory, shards, self.path)
+    shutil.rmtree(self.directory)
+    seconds = time.perf_counter() - start
+
+    return CrawlResult(200, written, duplicates, (), seconds, written / seconds if seconds else 0)
+
+def crawl_tickets(ticket_viewer: TicketViewer, path: str, **options) -> CrawlResult:
+  """
+  Crawl every ticket of the account into path, see TicketCrawler for the options
+  """
+
+  return TicketCrawler(ticket_viewer, path, **options).run()
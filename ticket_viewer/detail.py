@@ -0,0 +1,274 @@
+"""
+This module provides the detail view of a ticket: its requester, assignee,
+organization and comment thread, fetched in a fixed number of round-trips
+by sideloading people and requesting pages concurrently
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, TypeVar
+
+from ticket_viewer.ticket_viewer import Ticket, TicketViewer, extract_ticket_fields
+
+if TYPE_CHECKING:
+  from concurrent.futures import Future, ThreadPoolExecutor
+
+# Comments fetched per request (the most the comments endpoint returns)
+COMMENTS_PAGE_SIZE = 100
+# Maximum number of IDs the users show_many endpoint accepts per request
+USERS_MAX_IDS = 100
+
+class User(NamedTuple):
+  id: int
+  name: str
+  email: Optional[str] = None
+
+class Organization(NamedTuple):
+  id: int
+  name: str
+
+class Comment(NamedTuple):
+  id: int
+  author_id: Optional[int]
+  body: str
+  public: bool
+  created_at: str
+
+class TicketDetail(NamedTuple):
+  ticket: Ticket
+  description: Optional[str]
+  requester: Optional[User]
+  assignee: Optional[User]
+  organization: Optional[Organization]
+  comments: List[Comment] # The oldest first
+  authors: Dict[int, User] # Authors of the comments, by ID
+
+  def to_dict(self) -> Dict[str, Any]:
+    """
+    The detail as plain JSON-friendly values, with each comment's author
+    """
+
+    def person(record: Optional[NamedTuple]) -> Optional[Dict[str, Any]]:
+      return record._asdict() if record is not None else None
+
+    return {
+      **self.ticket.to_dict(),
+      "description": self.description,
+      "requester": person(self.requester),
+      "assignee": person(self.assignee),
+      "organization": person(self.organization),
+      "comments": [
+        {**comment._asdict(), "author": person(self.authors.get(comment.author_id))}
+        for comment in self.comments
+      ]
+    }
+
+class GetTicketDetailResponse(NamedTuple):
+  status_code: int
+  detail: Optional[TicketDetail] = None
+
+Identity = TypeVar("Identity", User, Organization)
+
+class IdentityCache:
+  """
+  A class for holding the users and organizations seen so far, by ID,
+  shared by every lookup so that people on many tickets are kept once.
+
+  A record equal to the one already held is dropped in favour of it,
+  and the least recently used records are evicted past max_entries of each kind
+  """
+
+  def __init__(self, max_entries: int = 10000) -> None:
+    self.max_entries: int = max_entries
+    self.users: OrderedDict[int, User] = OrderedDict()
+    self.organizations: OrderedDict[int, Organization] = OrderedDict()
+    self._lock: threading.Lock = threading.Lock()
+
+  def _add(self, table: OrderedDict[int, Identity], record: Identity) -> Identity:
+    with self._lock:
+      current = table.get(record.id)
+
+      if current == record:
+        table.move_to_end(record.id)
+        return current
+
+      table[record.id] = record
+      table.move_to_end(record.id)
+
+      if len(table) > self.max_entries:
+        table.popitem(last=False)
+
+      return record
+
+  def add_users(self, users: Iterable[Dict[str, Any]]) -> None:
+    for user in users:
+      self._add(self.users, User(user["id"], user["name"], user.get("email")))
+
+  def add_organizations(self, organizations: Iterable[Dict[str, Any]]) -> None:
+    for organization in organizations:
+      self._add(self.organizations, Organization(organization["id"], organization["name"]))
+
+  def user(self, user_id: Optional[int]) -> Optional[User]:
+    return self.users.get(user_id) if user_id is not None else None
+
+  def organization(self, organization_id: Optional[int]) -> Optional[Organization]:
+    return self.organizations.get(organization_id) if organization_id is not None else None
+
+  def missing_users(self, user_ids: Iterable[Optional[int]]) -> List[int]:
+    """
+    IDs of the users that are not held, in the order they were given in
+    """
+
+    return [user_id for user_id in dict.fromkeys(user_ids) if user_id is not None and user_id not in self.users]
+
+class TicketDetailViewer:
+  """
+  A class for fetching the details of tickets.
+
+  The ticket, with its people and organization sideloaded through
+  include=users,organizations, and the first page of its comments, with
+  their authors sideloaded, are requested at once. The remaining pages
+  of comments (past the first 100) are then requested at once too, and
+  people who were not sideloaded are looked up in one more round, so a ticket
+  costs at most three rounds of requests however many comments and people it has
+  """
+
+  def __init__(
+    self,
+    ticket_viewer: TicketViewer,
+    identities: Optional[IdentityCache] = None,
+    max_workers: int = 4
+  ) -> None:
+    self.ticket_viewer: TicketViewer = ticket_viewer
+    self.identities: IdentityCache = identities or IdentityCache()
+    self.max_workers: int = max_workers
+    # Started by the first request
+    self._executor: Optional[ThreadPoolExecutor] = None
+    self._executor_lock: threading.Lock = threading.Lock()
+
+  def __enter__(self) -> "TicketDetailViewer":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  @property
+  def executor(self) -> ThreadPoolExecutor:
+    if self._executor is None:
+      with self._executor_lock:
+        if self._executor is None:
+          from concurrent.futures import ThreadPoolExecutor
+
+          self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="ticket-viewer-detail"
+          )
+
+    return self._executor
+
+  def close(self) -> None:
+    """
+    Stop the worker threads (the TicketViewer is left open)
+    """
+
+    if self._executor is not None:
+      self._executor.shutdown(cancel_futures=True)
+      self._executor = None
+
+  def _get_comments_page(self, ticket_number: int, page: int) -> "Future[Tuple[int, Optional[Dict[str, Any]]]]":
+    return self.executor.submit(
+      self.ticket_viewer.get_json,
+      f"/api/v2/tickets/{ticket_number}/comments.json" \
+        f"?include=users&per_page={COMMENTS_PAGE_SIZE}&page={page}"
+    )
+
+  def _fetch_users(self, user_ids: List[int]) -> int:
+    """
+    Fetch users that were not sideloaded into the identity cache,
+    and return the status code
+    """
+
+    futures = [
+      self.executor.submit(
+        self.ticket_viewer.get_json,
+        f"/api/v2/users/show_many.json?ids={','.join(map(str, user_ids[start:start + USERS_MAX_IDS]))}"
+      )
+      for start in range(0, len(user_ids), USERS_MAX_IDS)
+    ]
+
+    for future in futures:
+      status_code, data = future.result()
+
+      if status_code != 200 or data is None:
+        return status_code
+
+      self.identities.add_users(data["users"])
+
+    return 200
+
+  def get_ticket_detail(self, ticket_number: Any) -> GetTicketDetailResponse:
+    """
+    Fetch a ticket with its people, organization and every comment
+    """
+
+    ticket_number = int(ticket_number)
+    ticket_page = self.executor.submit(
+      self.ticket_viewer.get_json,
+      f"/api/v2/tickets/{ticket_number}.json?include=users,organizations"
+    )
+    first_page = self._get_comments_page(ticket_number, 1)
+
+    status_code, data = ticket_page.result()
+
+    if status_code != 200 or data is None:
+      first_page.cancel()
+      return GetTicketDetailResponse(status_code)
+
+    pages = [first_page.result()]
+    status_code, first = pages[0]
+
+    if status_code == 200 and first is not None:
+      page_count = math.ceil(first["count"] / COMMENTS_PAGE_SIZE)
+      futures = [self._get_comments_page(ticket_number, page) for page in range(2, page_count + 1)]
+      pages.extend(future.result() for future in futures)
+
+    comments: List[Comment] = []
+
+    for status_code, page in pages:
+      if status_code != 200 or page is None:
+        return GetTicketDetailResponse(status_code)
+
+      self.identities.add_users(page.get("users", []))
+      comments.extend(
+        Comment(comment["id"], comment.get("author_id"), comment["body"], comment["public"], comment["created_at"])
+        for comment in page["comments"]
+      )
+
+    ticket = data["ticket"]
+    self.identities.add_users(data.get("users", []))
+    self.identities.add_organizations(data.get("organizations", []))
+
+    # In the order they first commented in
+    author_ids = list(dict.fromkeys(comment.author_id for comment in comments))
+    missing = self.identities.missing_users([ticket.get("requester_id"), ticket.get("assignee_id"), *author_ids])
+
+    if missing:
+      status_code = self._fetch_users(missing)
+
+      if status_code != 200:
+        return GetTicketDetailResponse(status_code)
+
+    identities = self.identities
+
+    return GetTicketDetailResponse(200, TicketDetail(
+      extract_ticket_fields(ticket),
+      ticket.get("description"),
+      identities.user(ticket.get("requester_id")),
+      identities.user(ticket.get("assignee_id")),
+      identities.organization(ticket.get("organization_id")),
+      comments,
+      {author_id: identities.users[author_id] for author_id in author_ids if author_id in identities.users}
+    ))
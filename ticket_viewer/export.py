@@ -0,0 +1,440 @@
+"""
+This module provides exports of every ticket of the account
+to JSONL, CSV or a compact columnar file
+"""
+
+import io
+import os
+import re
+import csv
+import json
+import time
+import queue
+import struct
+import threading
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from ticket_viewer.ticket_viewer import MAX_PAGE_SIZE, TICKET_FIELDS, TicketViewer
+
+EXPORT_FORMATS = ("jsonl", "csv", "columnar")
+COLUMNAR_MAGIC = b"TVCOLS1\n"
+# Encodings of a column of the columnar format
+INT_COLUMN, DICT_COLUMN, STRING_COLUMN, TIMESTAMP_COLUMN = range(4)
+# Timestamps as returned by the API, stored as seconds since EPOCH
+TIMESTAMP = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ")
+EPOCH = datetime(1970, 1, 1)
+# Columns whose values repeat, with at most this many distinct ones, are dictionary encoded
+MAX_DICT_SIZE = 255
+
+Row = Tuple[Any, ...] # Properties of a ticket in the order of TICKET_FIELDS
+
+class ExportResult(NamedTuple):
+  status_code: int
+  rows: int = 0 # Rows in the file, including the ones of resumed exports
+  seconds: float = 0
+  rows_per_second: float = 0
+
+class Batch(NamedTuple):
+  status_code: int
+  rows: Optional[List[Row]] = None
+  next_link: Optional[str] = None # Where the export resumes after this batch
+  error: Optional[Exception] = None # Raised by a stage, raised again by the writer
+
+class JSONLWriter:
+  """
+  One JSON object per line
+  """
+
+  def __init__(self, file: BinaryIO, is_new: bool) -> None:
+    self.file = file
+
+  def write(self, rows: List[Row]) -> None:
+    dumps = json.dumps
+    self.file.write(
+      "".join(dumps(dict(zip(TICKET_FIELDS, row))) + "\n" for row in rows).encode()
+    )
+
+class CSVWriter:
+  """
+  Comma-separated values with a header row
+  """
+
+  def __init__(self, file: BinaryIO, is_new: bool) -> None:
+    self.file = file
+
+    if is_new:
+      self.write([TICKET_FIELDS])
+
+  def write(self, rows: List[Row]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    self.file.write(buffer.getvalue().encode())
+
+class ColumnarWriter:
+  """
+  Columns of each batch written one after another (a row group),
+  with integers and API timestamps stored as int64, columns with few
+  distinct values (status, priority, type) as one byte per row into
+  a table of values, and other strings as offsets into UTF-8 text
+  """
+
+  def __init__(self, file: BinaryIO, is_new: bool) -> None:
+    self.file = file
+
+    if is_new:
+      file.write(COLUMNAR_MAGIC + json.dumps({"columns": TICKET_FIELDS}).encode() + b"\n")
+
+  def write(self, rows: List[Row]) -> None:
+    # A row group without rows would have no columns either
+    if not rows:
+      return
+
+    group = [struct.pack("<I", len(rows))]
+
+    for column in zip(*rows):
+      kind, payload = encode_column(column)
+      group.append(struct.pack("<BQ", kind, len(payload)))
+      group.append(payload)
+
+    self.file.write(b"".join(group))
+
+def encode_column(values: Sequence[Any]) -> Tuple[int, bytes]:
+  """
+  Encode a column of a row group, picking its encoding from its values
+  """
+
+  if all(type(value) is int for value in values):
+    return INT_COLUMN, array("q", values).tobytes()
+
+  if all(isinstance(value, str) and TIMESTAMP.fullmatch(value) for value in values):
+    seconds = [
+      (datetime.fromisoformat(value[:-1]) - EPOCH) // timedelta(seconds=1)
+      for value in values
+    ]
+    return TIMESTAMP_COLUMN, array("q", seconds).tobytes()
+
+  table = list(dict.fromkeys(values))
+
+  # A table of values that rarely repeat costs more than the values themselves
+  if len(table) <= min(MAX_DICT_SIZE, len(values) // 2):
+    codes = {value: code for code, value in enumerate(table)}
+    encoded_table = json.dumps(table).encode()
+
+    return DICT_COLUMN, struct.pack("<I", len(encoded_table)) + encoded_table + \
+      bytes(map(codes.__getitem__, values))
+
+  # None is told apart from the empty string by a mask
+  mask = bytes(value is None for value in values)
+  encoded = [value.encode() if value is not None else b"" for value in values]
+  offsets = array("I", [0])
+  total = 0
+
+  for value in encoded:
+    total += len(value)
+    offsets.append(total)
+
+  return STRING_COLUMN, mask + offsets.tobytes() + b"".join(encoded)
+
+def decode_column(kind: int, payload: bytes, size: int) -> List[Any]:
+  if kind == INT_COLUMN:
+    return array("q", payload).tolist()
+
+  if kind == TIMESTAMP_COLUMN:
+    return [
+      (EPOCH + timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%SZ")
+      for seconds in array("q", payload)
+    ]
+
+  if kind == DICT_COLUMN:
+    table_size = struct.unpack_from("<I", payload)[0]
+    table = json.loads(payload[4:4 + table_size])
+    return [table[code] for code in payload[4 + table_size:]]
+
+  mask = payload[:size]
+  offsets = array("I", payload[size:size + 4 * (size + 1)])
+  text = payload[size + 4 * (size + 1):]
+
+  return [
+    None if mask[idx] else text[offsets[idx]:offsets[idx + 1]].decode()
+    for idx in range(size)
+  ]
+
+def read_columnar(path: str) -> Iterator[Row]:
+  """
+  Read back the rows of a columnar export
+  """
+
+  with open(path, "rb") as f:
+    if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+      raise ValueError(f"{path} is not a columnar export")
+
+    columns = json.loads(f.readline())["columns"]
+
+    while True:
+      header = f.read(4)
+      if not header:
+        return
+
+      size = struct.unpack("<I", header)[0]
+      group = []
+
+      # Exports written before empty pages were skipped have empty row groups
+      if not size:
+        continue
+
+      for _ in columns:
+        kind, length = struct.unpack("<BQ", f.read(9))
+        group.append(decode_column(kind, f.read(length), size))
+
+      yield from zip(*group)
+
+WRITERS = {"jsonl": JSONLWriter, "csv": CSVWriter, "columnar": ColumnarWriter}
+
+class TicketExporter:
+  """
+  A class for exporting every ticket of the account to a file.
+
+  Fetching (and decoding) pages, converting tickets to rows and writing
+  them run on separate threads connected by bounded queues, so the next
+  page is downloaded while the previous ones are being converted and written.
+  After each written page, the link to the next one and the size of the file
+  are saved to a checkpoint file next to the export, so that an interrupted
+  export resumes from the last written page
+  """
+
+  def __init__(
+    self,
+    ticket_viewer: TicketViewer,
+    path: str,
+    format: str = "jsonl",
+    page_size: int = MAX_PAGE_SIZE,
+    convert_timestamps: Optional[Callable[[Sequence[str]], List[str]]] = None,
+    queue_size: int = 4,
+    progress: Optional[Callable[[int, float], None]] = None
+  ) -> None:
+    if format not in WRITERS:
+      raise ValueError(f"format has to be one of {', '.join(EXPORT_FORMATS)}")
+
+    self.ticket_viewer: TicketViewer = ticket_viewer
+    self.path: str = path
+    self.checkpoint_path: str = f"{path}.checkpoint"
+    self.format: str = format
+    self.page_size: int = page_size
+    # Converts a column of 'updated_at', e.g. TimestampFormatter.format_column
+    self.convert_timestamps = convert_timestamps
+    self.queue_size: int = queue_size # Pages waiting between two stages
+    self.progress = progress # Called with the rows written so far and the seconds elapsed
+    self.stopped: threading.Event = threading.Event()
+
+  def load_checkpoint(self) -> Optional[Dict[str, Any]]:
+    """
+    Where the last export stopped, if it can be resumed
+    """
+
+    try:
+      with open(self.checkpoint_path) as f:
+        checkpoint = json.load(f)
+    except (OSError, ValueError):
+      return None
+
+    # The rows the checkpoint counts have to be in the file,
+    # with their timestamps written the same way
+    if checkpoint.get("format") != self.format or \
+      checkpoint.get("convert_timestamps") != (self.convert_timestamps is not None) or \
+      not os.path.exists(self.path) or os.path.getsize(self.path) < checkpoint["offset"]:
+      return None
+
+    return checkpoint
+
+  def save_checkpoint(self, link: str, rows: int, offset: int) -> None:
+    with open(f"{self.checkpoint_path}.tmp", "w") as f:
+      json.dump(
+        {
+          "format": self.format,
+          "convert_timestamps": self.convert_timestamps is not None,
+          "link": link,
+          "rows": rows,
+          "offset": offset
+        },
+        f
+      )
+
+    os.replace(f"{self.checkpoint_path}.tmp", self.checkpoint_path)
+
+  def put(self, stage_queue: queue.Queue, item: Any) -> bool:
+    """
+    Hand an item to the next stage unless the export was stopped
+    """
+
+    while not self.stopped.is_set():
+      try:
+        stage_queue.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        pass
+
+    return False
+
+  def take(self, stage_queue: queue.Queue) -> Any:
+    """
+    Wait for an item from the previous stage,
+    returning an error batch if the export was stopped
+    """
+
+    while not self.stopped.is_set():
+      try:
+        return stage_queue.get(timeout=0.1)
+      except queue.Empty:
+        pass
+
+    return Batch(-1)
+
+  def run_stage(self, stage: Callable[..., None], *args: Any) -> None:
+    """
+    Run a stage on a worker thread, handing the error
+    on to the next stage if it fails
+    """
+
+    try:
+      stage(*args)
+    except Exception as error:
+      self.put(args[-1], Batch(-1, error=error))
+
+  def fetch(self, link: str, pages: queue.Queue) -> None:
+    """
+    First stage: download and decode the pages one after another,
+    since each page holds the cursor of the next one
+    """
+
+    while link is not None:
+      response = self.ticket_viewer.get_tickets(link, use_cache=False)
+
+      if response.status_code != 200 or response.tickets is None:
+        self.put(pages, Batch(response.status_code))
+        return
+
+      next_link = response.next_link if response.has_more else None
+
+      if not self.put(pages, (response.tickets, next_link)):
+        return
+
+      link = next_link
+
+    self.put(pages, None)
+
+  def convert(self, pages: queue.Queue, batches: queue.Queue) -> None:
+    """
+    Second stage: turn tickets into rows, converting their timestamps
+    """
+
+    while True:
+      page = self.take(pages)
+
+      if page is None or isinstance(page, Batch):
+        self.put(batches, page)
+        return
+
+      tickets, next_link = page
+      rows: List[Row] = [tuple(ticket.values()) for ticket in tickets]
+
+      if self.convert_timestamps is not None and rows:
+        column = TICKET_FIELDS.index("updated_at")
+        converted = self.convert_timestamps([row[column] for row in rows])
+        rows = [
+          row[:column] + (timestamp,) + row[column + 1:]
+          for row, timestamp in zip(rows, converted)
+        ]
+
+      if not self.put(batches, Batch(200, rows, next_link)):
+        return
+
+  def run(self) -> ExportResult:
+    """
+    Export every ticket (or resume the last export) and return
+    the status code, the number of rows in the file and the throughput
+    """
+
+    checkpoint = self.load_checkpoint()
+    rows = 0
+    link: Optional[str] = self.ticket_viewer.tickets_link(self.page_size, sort="id")
+
+    if checkpoint is not None:
+      rows, link = checkpoint["rows"], checkpoint["link"]
+
+      # Drop whatever was written after the last checkpoint
+      with open(self.path, "r+b") as f:
+        f.truncate(checkpoint["offset"])
+
+    pages: queue.Queue = queue.Queue(self.queue_size)
+    batches: queue.Queue = queue.Queue(self.queue_size)
+    self.stopped.clear()
+    workers = [
+      threading.Thread(target=self.run_stage, args=(self.fetch, link, pages), daemon=True),
+      threading.Thread(target=self.run_stage, args=(self.convert, pages, batches), daemon=True)
+    ]
+
+    start = time.perf_counter()
+    written = 0
+    status_code = 200
+
+    for worker in workers:
+      worker.start()
+
+    try:
+      with open(self.path, "ab" if checkpoint is not None else "wb") as f:
+        writer = WRITERS[self.format](f, is_new=checkpoint is None)
+
+        # Third stage: write each batch and record where to resume from
+        while True:
+          batch = self.take(batches)
+
+          if batch is None:
+            break
+
+          # A bug in a stage, the checkpoint still allows resuming once it is fixed
+          if batch.error is not None:
+            raise batch.error
+
+          if batch.status_code != 200:
+            status_code = batch.status_code
+            break
+
+          with self.ticket_viewer.instrumentation.timer("write", rows=len(batch.rows), format=self.format):
+            writer.write(batch.rows)
+            f.flush()
+            os.fsync(f.fileno())
+          written += len(batch.rows)
+
+          if batch.next_link is not None:
+            self.save_checkpoint(batch.next_link, rows + written, f.tell())
+
+          if self.progress is not None:
+            self.progress(rows + written, time.perf_counter() - start)
+
+    finally:
+      self.stopped.set()
+
+      for worker in workers:
+        worker.join()
+
+    seconds = time.perf_counter() - start
+
+    # Nothing left to resume
+    if status_code == 200 and os.path.exists(self.checkpoint_path):
+      os.remove(self.checkpoint_path)
+
+    return ExportResult(
+      status_code,
+      rows + written,
+      seconds,
+      written / seconds if seconds else 0
+    )
+
+def export_tickets(ticket_viewer: TicketViewer, path: str, **options: Any) -> ExportResult:
+  """
+  Export every ticket of the account to path, see TicketExporter for the options
+  """
+
+  return TicketExporter(ticket_viewer, path, **options).run()
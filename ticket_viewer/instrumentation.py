@@ -0,0 +1,257 @@
+"""
+This module provides hooks that report every request sent to the API
+and the time spent parsing and rendering tickets, and a profiler
+that summarizes them or writes them as a Chrome trace
+"""
+
+import re
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, TextIO, Union
+from urllib.parse import parse_qsl, urlsplit
+
+# Parts of a path that change from one request to the next, e.g. ticket IDs
+PATH_ID = re.compile(r"/\d+(?=[/.]|$)")
+
+class RequestEvent(NamedTuple):
+  url: str # Template of the link, see url_template
+  status_code: int
+  started_at: float # time.perf_counter() when the request was sent
+  seconds: float # Until the response headers arrived, including retries and back-off
+  bytes: Optional[int] = None # Size of the body, if known before it is read
+  retries: int = 0
+  cache: Optional[str] = None # 'hit', 'revalidated' or 'miss' when the response cache was used
+  thread_id: int = 0
+
+class TimerEvent(NamedTuple):
+  name: str # e.g. 'parse' or 'render'
+  started_at: float
+  seconds: float
+  details: Optional[Dict[str, Any]] = None
+  thread_id: int = 0
+
+class ErrorEvent(NamedTuple):
+  url: str
+  error: str # Name of the exception
+  started_at: float
+  thread_id: int = 0
+
+Event = Union[RequestEvent, TimerEvent, ErrorEvent]
+
+def url_template(url: str) -> str:
+  """
+  Group links to the same endpoint, e.g.
+  'https://x.zendesk.com/api/v2/tickets/42.json' as '/api/v2/tickets/{id}.json'
+  and '/api/v2/tickets.json?page[size]=25&page[after]=abc' as
+  '/api/v2/tickets.json?page[after]&page[size]'
+  """
+
+  parts = urlsplit(url)
+  path = PATH_ID.sub("/{id}", parts.path)
+  keys = sorted({key for key, _ in parse_qsl(parts.query, keep_blank_values=True)})
+
+  return f"{path}?{'&'.join(keys)}" if keys else path
+
+class Instrumentation:
+  """
+  A class for reporting events to the callbacks subscribed to them.
+
+  Callbacks are called on the thread the event happened on.
+  While nothing is subscribed, reporting costs a single check
+  """
+
+  def __init__(self) -> None:
+    self.subscribers: List[Callable[[Event], None]] = []
+
+  @property
+  def enabled(self) -> bool:
+    return bool(self.subscribers)
+
+  def subscribe(self, callback: Callable[[Event], None]) -> None:
+    self.subscribers.append(callback)
+
+  def unsubscribe(self, callback: Callable[[Event], None]) -> None:
+    self.subscribers.remove(callback)
+
+  def emit(self, event: Event) -> None:
+    for callback in self.subscribers:
+      callback(event)
+
+  def request(
+    self,
+    url: str,
+    status_code: int,
+    started_at: float,
+    length: Optional[str] = None,
+    retries: int = 0,
+    cache: Optional[str] = None
+  ) -> None:
+    """
+    Report a request sent at started_at, with length
+    the Content-Length header of its response if there was one
+    """
+
+    if not self.subscribers:
+      return
+
+    self.emit(RequestEvent(
+      url_template(url),
+      status_code,
+      started_at,
+      time.perf_counter() - started_at,
+      int(length) if length and length.isdigit() else None,
+      retries,
+      cache,
+      threading.get_ident()
+    ))
+
+  def error(self, url: str, error: BaseException) -> None:
+    """
+    Report a request that failed with an exception
+    """
+
+    if self.subscribers:
+      self.emit(ErrorEvent(url_template(url), type(error).__name__, time.perf_counter(), threading.get_ident()))
+
+  @contextmanager
+  def timer(self, name: str, **details: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time the body of a with block, which may add details
+    to the dict it is given (e.g. the number of bytes parsed)
+    """
+
+    if not self.subscribers:
+      yield details
+      return
+
+    started_at = time.perf_counter()
+
+    try:
+      yield details
+    finally:
+      self.emit(TimerEvent(
+        name,
+        started_at,
+        time.perf_counter() - started_at,
+        details or None,
+        threading.get_ident()
+      ))
+
+# Used by every TicketViewer that is not given its own
+INSTRUMENTATION = Instrumentation()
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+  """
+  Nearest-rank percentile of values sorted in ascending order
+  """
+
+  return sorted_values[max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)]
+
+class Profiler:
+  """
+  A class for collecting events (subscribe it to an Instrumentation)
+  and summarizing their latencies
+  """
+
+  def __init__(self) -> None:
+    self.events: List[Event] = []
+    self.started_at: float = time.perf_counter()
+
+  def __call__(self, event: Event) -> None:
+    self.events.append(event)
+
+  def summary(self) -> Dict[str, Dict[str, float]]:
+    """
+    Count and p50/p95/p99/max latency in milliseconds of every
+    URL template and timer
+    """
+
+    latencies: Dict[str, List[float]] = {}
+
+    for event in self.events:
+      if isinstance(event, RequestEvent):
+        latencies.setdefault(f"GET {event.url}", []).append(event.seconds)
+      elif isinstance(event, TimerEvent):
+        latencies.setdefault(event.name, []).append(event.seconds)
+
+    summary = {}
+
+    for name, seconds in latencies.items():
+      seconds.sort()
+      summary[name] = {
+        "count": len(seconds),
+        "p50": percentile(seconds, 50) * 1000,
+        "p95": percentile(seconds, 95) * 1000,
+        "p99": percentile(seconds, 99) * 1000,
+        "max": seconds[-1] * 1000
+      }
+
+    return summary
+
+  def report(self, stream: TextIO) -> None:
+    """
+    Write the summary as a table
+    """
+
+    requests = [event for event in self.events if isinstance(event, RequestEvent)]
+    cache = [event.cache for event in requests]
+    summary = self.summary()
+    width = max(map(len, summary), default=0) + 2
+
+    lines = [
+      "",
+      f"Profile: {len(requests)} requests "
+      f"({cache.count('hit')} cache hits, {cache.count('revalidated')} revalidated), "
+      f"{sum(event.retries for event in requests)} retries, "
+      f"{sum(isinstance(event, ErrorEvent) for event in self.events)} errors, "
+      f"{sum(event.bytes or 0 for event in requests) / 1024:.1f} KiB",
+      f"{'':<{width}}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    ]
+
+    for name, row in sorted(summary.items()):
+      lines.append(
+        f"{name:<{width}}{row['count']:>7}{row['p50']:>10.1f}{row['p95']:>10.1f}"
+        f"{row['p99']:>10.1f}{row['max']:>10.1f}"
+      )
+
+    stream.write("\n".join(lines) + "\n")
+
+  def write_trace(self, path: str) -> None:
+    """
+    Write the events in the Chrome trace format,
+    to be opened in chrome://tracing or https://ui.perfetto.dev
+    """
+
+    trace_events = []
+
+    for event in self.events:
+      start = (event.started_at - self.started_at) * 1e6
+
+      if isinstance(event, ErrorEvent):
+        trace_events.append({
+          "name": f"{event.error} {event.url}", "cat": "error", "ph": "i", "s": "t",
+          "ts": start, "pid": 1, "tid": event.thread_id
+        })
+        continue
+
+      if isinstance(event, RequestEvent):
+        name, category = f"GET {event.url}", "request"
+        args = {
+          "status_code": event.status_code,
+          "bytes": event.bytes,
+          "retries": event.retries,
+          "cache": event.cache
+        }
+      else:
+        name, category, args = event.name, "timer", event.details or {}
+
+      trace_events.append({
+        "name": name, "cat": category, "ph": "X", "ts": start, "dur": event.seconds * 1e6,
+        "pid": 1, "tid": event.thread_id, "args": args
+      })
+
+    with open(path, "w") as f:
+      json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
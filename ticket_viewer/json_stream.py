@@ -0,0 +1,164 @@
+"""
+This module provides incremental parsing of JSON responses
+whose bulk is a single array, such as a page of tickets
+"""
+
+import re
+import json
+import codecs
+from typing import Any, Dict, Generator, Iterable, Iterator, Optional, Tuple
+
+WHITESPACE = re.compile(r"\s*")
+decoder = json.JSONDecoder()
+
+class JSONArrayStream:
+  """
+  A class for decoding the items of an array that is a member of the
+  top-level JSON object one at a time while the response body is still being read.
+
+  Only one chunk of the body and one item are held in memory at once.
+  Once every item has been yielded, the other members of the object
+  (e.g. 'links' and 'meta') are available in document
+  """
+
+  def __init__(self, chunks: Iterable[bytes], key: str) -> None:
+    self.chunks: Iterator[bytes] = iter(chunks)
+    self.key: str = key
+    self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+    self.buffer: str = ""
+    self.bytes_read: int = 0
+    self.is_exhausted: bool = False # The whole body has been read
+    self.document: Optional[Dict[str, Any]] = None
+
+  def _read(self) -> bool:
+    """
+    Append the next chunk of the body to the buffer,
+    returning False once the body has been read entirely
+    """
+
+    chunk = next(self.chunks, None)
+
+    if chunk is None:
+      self.buffer += self.text_decoder.decode(b"", final=True)
+      self.is_exhausted = True
+      return False
+
+    self.bytes_read += len(chunk)
+    self.buffer += self.text_decoder.decode(chunk)
+    return True
+
+  def _skip_whitespace(self, pos: int) -> int:
+    """
+    The position of the next character that is not whitespace,
+    reading more of the body until there is one
+    """
+
+    while True:
+      pos = WHITESPACE.match(self.buffer, pos).end()
+
+      if pos < len(self.buffer):
+        return pos
+
+      self.buffer = ""
+      pos = 0
+
+      if not self._read():
+        raise ValueError("The response ended in the middle of the object")
+
+  def _decode(self, pos: int) -> Tuple[Any, int]:
+    """
+    Decode the value at pos, reading more of the body until it is complete,
+    and return it with the position where it ends
+    """
+
+    while True:
+      try:
+        value, end = decoder.raw_decode(self.buffer, pos)
+
+        # A number at the end of the buffer may go on in the next chunk,
+        # it is only complete once what follows it was read
+        if end < len(self.buffer) or self.is_exhausted or not isinstance(value, (int, float)):
+          return value, end
+
+      except json.JSONDecodeError:
+        # Nothing more to read, so the value is not valid JSON
+        if self.is_exhausted:
+          raise
+
+      # The value is cut off at the end of the buffer, read at least
+      # as much again so that big values are not decoded over and over
+      self.buffer = self.buffer[pos:]
+      pos = 0
+      target_length = 2 * len(self.buffer)
+
+      while self._read() and len(self.buffer) < target_length:
+        pass
+
+  def _iter_items(self, pos: int) -> Generator[Any, None, int]:
+    """
+    Yield the items of the array starting at pos
+    and return the position after the array
+    """
+
+    while True:
+      pos = self._skip_whitespace(pos)
+      char = self.buffer[pos]
+
+      if char == "]":
+        return pos + 1
+
+      if char == ",":
+        pos += 1
+        continue
+
+      item, pos = self._decode(pos)
+      yield item
+
+      # Drop the items already decoded
+      if pos > len(self.buffer) // 2:
+        self.buffer = self.buffer[pos:]
+        pos = 0
+
+  def __iter__(self) -> Iterator[Any]:
+    # Walk the members of the top-level object, so that a member of
+    # a nested object with the same name is not taken for the array
+    pos = self._skip_whitespace(0)
+
+    if self.buffer[pos] != "{":
+      raise ValueError("The response is not a JSON object")
+
+    pos += 1
+    document: Dict[str, Any] = {}
+    found = False
+
+    while True:
+      pos = self._skip_whitespace(pos)
+      char = self.buffer[pos]
+
+      if char == "}":
+        break
+
+      if char == ",":
+        pos += 1
+        continue
+
+      name, pos = self._decode(pos)
+      pos = self._skip_whitespace(pos)
+
+      if not isinstance(name, str) or self.buffer[pos] != ":":
+        raise ValueError("The response is not a valid JSON object")
+
+      pos = self._skip_whitespace(pos + 1)
+
+      if name == self.key and not found and self.buffer[pos] == "[":
+        found = True
+        document[name] = []
+        pos = yield from self._iter_items(pos + 1)
+      else:
+        # The other members are small, keep them whole
+        document[name], pos = self._decode(pos)
+
+    if not found:
+      raise ValueError("The array was not found in the response")
+
+    self.document = document
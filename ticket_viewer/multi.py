@@ -0,0 +1,214 @@
+"""
+This module provides a ticket viewer over several Zendesk accounts
+(e.g. one subdomain per brand) that queries them concurrently
+and merges their tickets into a single view
+"""
+
+from __future__ import annotations
+
+import json
+import heapq
+import threading
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+from ticket_viewer.rate_limit import RateLimiter
+from ticket_viewer.ticket_viewer import MAX_PAGE_SIZE, CountTicketsResponse, GetTicketsResponse, Ticket, \
+  TicketViewer, TicketViewerError, select_ticket_fields
+
+if TYPE_CHECKING:
+  from concurrent.futures import Future, ThreadPoolExecutor
+
+class Account(NamedTuple):
+  name: str # Shown next to the account's tickets, e.g. the brand
+  url: str
+  email: str
+  password: str
+  requests_per_minute: Optional[int] = None # Learned from the API if not given
+
+class AccountTicket(NamedTuple):
+  account: str
+  ticket: Ticket
+
+class AccountError(TicketViewerError):
+  """
+  Raised when tickets of one of the accounts cannot be fetched
+  """
+
+  def __init__(self, account: str, status_code: int) -> None:
+    super().__init__(status_code)
+    self.account: str = account
+
+def read_accounts(path: str) -> List[Account]:
+  """
+  Read accounts from a JSON file listing objects with a name, url,
+  email, password and optionally requests_per_minute.
+  Raises ValueError if the file does not describe valid accounts
+  """
+
+  with open(path) as f:
+    entries = json.load(f)
+
+  if not isinstance(entries, list) or not entries:
+    raise ValueError("The accounts file has to list at least one account")
+
+  try:
+    accounts = [Account(**entry) for entry in entries]
+  except TypeError as error:
+    raise ValueError(f"Invalid account: {error}") from None
+
+  names = [account.name for account in accounts]
+  if len(set(names)) != len(names):
+    raise ValueError("Account names have to be unique")
+
+  return accounts
+
+class MultiTicketViewer:
+  """
+  A class for fetching the tickets of several accounts at once.
+
+  Every account has its own TicketViewer, with its own connection pool and
+  rate limiter, and their requests share one bounded pool of worker threads
+  """
+
+  def __init__(self, accounts: Sequence[Account], max_workers: int = 8, **options: Any) -> None:
+    self.accounts: List[Account] = list(accounts)
+    # options are passed on to every TicketViewer
+    self.ticket_viewers: Dict[str, TicketViewer] = {
+      account.name: TicketViewer(
+        account.url,
+        account.email,
+        account.password,
+        rate_limiter=RateLimiter(account.requests_per_minute),
+        **options
+      )
+      for account in self.accounts
+    }
+    self.max_workers: int = max_workers
+    # Started by the first request
+    self._executor: Optional[ThreadPoolExecutor] = None
+    self._executor_lock: threading.Lock = threading.Lock()
+
+  def __enter__(self) -> "MultiTicketViewer":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  @property
+  def executor(self) -> ThreadPoolExecutor:
+    if self._executor is None:
+      with self._executor_lock:
+        if self._executor is None:
+          from concurrent.futures import ThreadPoolExecutor
+
+          self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="ticket-viewer-accounts"
+          )
+
+    return self._executor
+
+  def close(self) -> None:
+    """
+    Stop the worker threads and close every account's connections
+    """
+
+    if self._executor is not None:
+      self._executor.shutdown(cancel_futures=True)
+      self._executor = None
+
+    for ticket_viewer in self.ticket_viewers.values():
+      ticket_viewer.close()
+
+  def count_tickets(self) -> Dict[str, CountTicketsResponse]:
+    """
+    Number of tickets of every account, by account name
+    """
+
+    futures = {
+      name: self.executor.submit(ticket_viewer.count_tickets)
+      for name, ticket_viewer in self.ticket_viewers.items()
+    }
+
+    return {name: future.result() for name, future in futures.items()}
+
+  def _iter_account_tickets(
+    self,
+    name: str,
+    first_page: "Future[GetTicketsResponse]",
+    fields: Optional[Sequence[str]]
+  ) -> Iterator[AccountTicket]:
+    """
+    Yield the tickets of one account, fetching its next page
+    on the shared pool while its current one is being merged
+    """
+
+    ticket_viewer = self.ticket_viewers[name]
+    next_page: Optional["Future[GetTicketsResponse]"] = first_page
+
+    try:
+      while next_page is not None:
+        response = next_page.result()
+
+        if response.status_code != 200 or response.tickets is None:
+          raise AccountError(name, response.status_code)
+
+        next_page = None
+        if response.has_more and response.next_link:
+          next_page = self.executor.submit(
+            ticket_viewer.get_tickets,
+            response.next_link,
+            use_cache=False,
+            fields=fields
+          )
+
+        for ticket in response.tickets:
+          yield AccountTicket(name, ticket)
+
+    finally:
+      # The merge was stopped before this account ran out of tickets
+      if next_page is not None:
+        next_page.cancel()
+
+  def iter_tickets(
+    self,
+    page_size: int = MAX_PAGE_SIZE,
+    sort: str = "-updated_at",
+    fields: Optional[Iterable[str]] = None,
+    filters: Optional[Dict[str, Union[str, Sequence[str]]]] = None
+  ) -> Iterator[AccountTicket]:
+    """
+    Yield the tickets of every account (or the ones matching filters)
+    in a single stream ordered by sort, with the name of their account.
+
+    Each account is paged through in that order, and the accounts' tickets
+    are merged as they arrive, so at most two pages per account are held
+    in memory. Raises AccountError if a page cannot be fetched
+    """
+
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+      raise ValueError(f"page_size has to be between 1 and {MAX_PAGE_SIZE}")
+
+    key = sort.lstrip("-")
+
+    # Tickets are merged on the property they are sorted by
+    if fields is not None:
+      fields = select_ticket_fields([*fields, key])
+
+    # Ask every account for its first page before waiting for any of them
+    streams = []
+
+    for name, ticket_viewer in self.ticket_viewers.items():
+      link = ticket_viewer.search_link(filters, page_size, sort) if filters \
+        else ticket_viewer.tickets_link(page_size, sort)
+      first_page = self.executor.submit(ticket_viewer.get_tickets, link, use_cache=False, fields=fields)
+      streams.append(self._iter_account_tickets(name, first_page, fields))
+
+    get_key = attrgetter(f"ticket.{key}")
+
+    try:
+      yield from heapq.merge(*streams, key=get_key, reverse=sort.startswith("-"))
+    finally:
+      for stream in streams:
+        stream.close()
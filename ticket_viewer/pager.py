@@ -0,0 +1,185 @@
+"""
+This module provides a pager that fetches the pages around
+the one being shown before the user asks for them
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional
+
+from ticket_viewer.ticket_viewer import GetTicketsResponse
+
+DIRECTIONS = ("next", "prev")
+
+def completed(response: GetTicketsResponse) -> "Future[GetTicketsResponse]":
+  future: "Future[GetTicketsResponse]" = Future()
+  future.set_result(response)
+  return future
+
+def count_held_tickets(future: "Future[GetTicketsResponse]") -> int:
+  """
+  Number of tickets a fetched page holds, 0 while it is being fetched
+  """
+
+  if not future.done() or future.cancelled() or future.exception() is not None:
+    return 0
+
+  return len(future.result().tickets or ())
+
+class PagePrefetcher:
+  """
+  A class for paging through tickets of a source (anything with
+  get_tickets(link=...), e.g. TicketViewer, TicketCache or TicketIndex).
+
+  Once a page is shown, up to depth pages are fetched ahead in the direction
+  the user is going and one page back, on background threads. Pages are kept
+  by link until they hold more than max_tickets tickets, at which point the
+  least recently used ones are dropped. A depth of 0 fetches every page
+  when it is asked for
+  """
+
+  def __init__(self, source: Any, depth: int = 2, max_tickets: int = 1000) -> None:
+    self.source = source
+    self.depth: int = depth
+    self.max_tickets: int = max_tickets
+    # Pages fetched or being fetched, by link, the least recently used first
+    self.pages: "OrderedDict[str, Future[GetTicketsResponse]]" = OrderedDict()
+    self.lock: threading.Lock = threading.Lock()
+    self.current: Optional[GetTicketsResponse] = None # Page being shown
+    self.executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(
+      max_workers=len(DIRECTIONS),
+      thread_name_prefix="ticket-viewer-pager"
+    ) if depth > 0 else None
+
+  def __enter__(self) -> "PagePrefetcher":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def close(self) -> None:
+    """
+    Stop prefetching, pages being fetched are left to finish on their own
+    """
+
+    if self.executor is not None:
+      self.executor.shutdown(wait=False, cancel_futures=True)
+      self.executor = None
+
+  def is_within_budget(self) -> bool:
+    """
+    Drop the least recently used pages beyond the budget, and tell
+    whether there is room for another page
+    """
+
+    with self.lock:
+      held = sum(map(count_held_tickets, self.pages.values()))
+
+      for link in list(self.pages):
+        if held <= self.max_tickets:
+          break
+
+        # Pages being fetched are kept since someone may be waiting for them
+        if self.pages[link].done():
+          held -= count_held_tickets(self.pages[link])
+          del self.pages[link]
+
+      return held < self.max_tickets
+
+  def fetch(self, link: str, direction: str, remaining: int) -> GetTicketsResponse:
+    """
+    Fetch a page on a worker thread, then the one after it
+    while there are pages left to prefetch
+    """
+
+    response = self.source.get_tickets(link=link)
+
+    if remaining > 1 and response.status_code == 200 and response.tickets:
+      self.prefetch(response, direction, remaining - 1)
+
+    return response
+
+  def prefetch(self, response: GetTicketsResponse, direction: str, depth: int) -> None:
+    """
+    Start fetching the page in a direction from response
+    unless it is already there or there is no room for it
+    """
+
+    link = response.next_link if direction == "next" else response.prev_link
+
+    # Only the 'next' direction is known to end with has_more
+    if self.executor is None or link is None or (direction == "next" and not response.has_more):
+      return
+
+    if not self.is_within_budget():
+      return
+
+    with self.lock:
+      existing = self.pages.get(link)
+
+      if existing is None:
+        try:
+          self.pages[link] = self.executor.submit(self.fetch, link, direction, depth)
+        except RuntimeError: # Closed while a page was being fetched
+          pass
+
+        return
+
+    # Keep looking ahead from a page that was already fetched
+    if depth > 1 and count_held_tickets(existing) and existing.result().status_code == 200:
+      self.prefetch(existing.result(), direction, depth - 1)
+
+  def start(self, response: GetTicketsResponse) -> None:
+    """
+    Show the first page, fetching the pages on both sides of it
+    """
+
+    self.current = response
+
+    for direction in DIRECTIONS:
+      self.prefetch(response, direction, self.depth)
+
+  def get(self, link: str, direction: str) -> GetTicketsResponse:
+    """
+    Get the page at link, reached by going in direction from the current page
+    """
+
+    with self.lock:
+      future = self.pages.get(link)
+      if future is not None:
+        self.pages.move_to_end(link)
+
+    response = None
+    if future is not None and not future.cancelled():
+      try:
+        response = future.result()
+      except Exception:
+        response = None
+
+    # Pages that could not be prefetched are asked for again
+    if response is None or response.status_code != 200:
+      response = self.source.get_tickets(link=link)
+
+    if response.status_code != 200 or response.tickets is None:
+      with self.lock:
+        self.pages.pop(link, None)
+
+      return response
+
+    with self.lock:
+      self.pages[link] = completed(response)
+
+      # Going back to the page we came from needs no request
+      back_link = response.prev_link if direction == "next" else response.next_link
+      if back_link is not None and self.current is not None and self.current.tickets:
+        self.pages[back_link] = completed(self.current)
+        self.pages.move_to_end(link)
+
+    self.current = response
+
+    if response.tickets:
+      self.prefetch(response, direction, self.depth)
+      self.prefetch(response, "prev" if direction == "next" else "next", 1)
+
+    return response
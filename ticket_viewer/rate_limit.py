@@ -0,0 +1,128 @@
+"""
+This module provides a token bucket that keeps requests
+within the account's rate limit and backs off when the API throttles us
+"""
+
+import time
+import random
+import threading
+from typing import Dict, Mapping, Optional
+
+class RateLimiter:
+  """
+  A class for scheduling requests at the rate the API allows.
+
+  The bucket holds one token per request allowed in a minute and refills
+  continuously. Its size is learned from the X-Rate-Limit (or ratelimit-limit)
+  header and its content is kept in line with X-Rate-Limit-Remaining
+  (or ratelimit-remaining) unless requests_per_minute is given, which is kept.
+  Until the limit is known, requests are not delayed.
+  A single RateLimiter can be shared by every thread and TicketViewer
+  that use the same account
+  """
+
+  def __init__(
+    self,
+    requests_per_minute: Optional[int] = None,
+    jitter: float = 1.0
+  ) -> None:
+    self.limit: Optional[int] = requests_per_minute
+    self.learns_limit: bool = requests_per_minute is None
+    self.tokens: float = requests_per_minute or 0
+    self.jitter: float = jitter # Upper bound of the random delay added after a 429
+    self.refilled_at: float = time.monotonic()
+    self.blocked_until: float = 0 # Set when the API tells us to retry later
+    self.lock: threading.Lock = threading.Lock()
+
+    self.throttled: int = 0 # Number of 429 responses
+    self.unavailable: int = 0 # Number of 503 responses
+    self.retries: int = 0
+    self.throttled_seconds: float = 0 # Time requests spent waiting
+
+  def _refill(self, now: float) -> None:
+    if self.limit:
+      self.tokens = min(
+        self.tokens + (now - self.refilled_at) * self.limit / 60,
+        self.limit
+      )
+
+    self.refilled_at = now
+
+  def acquire(self) -> None:
+    """
+    Wait until a request can be sent without exceeding the rate limit
+    """
+
+    waited = 0.0
+
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self._refill(now)
+
+        if now < self.blocked_until:
+          # Spread out the requests that resume after a 429
+          wait = self.blocked_until - now + random.uniform(0, self.jitter)
+
+        elif not self.limit or self.tokens >= 1:
+          if self.limit:
+            self.tokens -= 1
+
+          self.throttled_seconds += waited
+          return
+
+        else:
+          wait = (1 - self.tokens) * 60 / self.limit
+
+      time.sleep(wait)
+      waited += wait
+
+  def update(self, headers: Mapping[str, str]) -> None:
+    """
+    Learn the rate limit and the remaining quota from a response
+    """
+
+    limit = headers.get("X-Rate-Limit") or headers.get("ratelimit-limit")
+    remaining = headers.get("X-Rate-Limit-Remaining") or headers.get("ratelimit-remaining")
+
+    with self.lock:
+      if self.learns_limit and limit and limit.isdigit():
+        # Start with whatever the server says we have left
+        if self.limit is None:
+          self.tokens = int(limit)
+        self.limit = int(limit)
+
+      if remaining and remaining.isdigit():
+        self.tokens = min(self.tokens, int(remaining))
+
+  def back_off(self, retry_after: Optional[str], attempt: int, status_code: int = 429) -> None:
+    """
+    Hold back every request after a 429 or 503,
+    for as long as Retry-After asks or exponentially longer on each attempt
+    """
+
+    try:
+      delay = float(retry_after)
+    except (TypeError, ValueError):
+      delay = min(2 ** attempt, 60)
+
+    with self.lock:
+      self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+      self.tokens = 0
+      if status_code == 429:
+        self.throttled += 1
+      else:
+        self.unavailable += 1
+      self.retries += 1
+
+  def stats(self) -> Dict[str, float]:
+    """
+    Counters describing how much we were held back
+    """
+
+    return {
+      "throttled": self.throttled,
+      "unavailable": self.unavailable,
+      "retries": self.retries,
+      "throttled_seconds": self.throttled_seconds
+    }
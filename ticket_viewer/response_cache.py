@@ -0,0 +1,173 @@
+"""
+This module provides a bounded in-memory LRU cache with per-entry TTL
+for responses fetched by TicketViewer
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+class CacheEntry(NamedTuple):
+  value: Any
+  etag: Optional[str]
+  size: int # Size of the response body in bytes
+  expires_at: float
+  alias_of: Optional[str] = None # Key of the entry whose value an alias serves
+
+class ResponseCache:
+  """
+  A class for remembering responses by link.
+
+  Entries are served without a request until their TTL runs out,
+  after which they are kept so that they can be revalidated with their ETag.
+  The least recently used entries are evicted once the cache holds
+  more than max_entries entries or more than max_bytes of response bodies.
+  Aliases of an entry are evicted along with it
+  """
+
+  def __init__(
+    self,
+    ttl: float = 60,
+    max_entries: int = 256,
+    max_bytes: int = 8 * 1024 * 1024
+  ) -> None:
+    self.ttl: float = ttl
+    self.max_entries: int = max_entries
+    self.max_bytes: int = max_bytes
+    self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+    self.size: int = 0
+    self.aliases: Dict[str, Set[str]] = {} # Keys of the aliases of each entry
+    self.lock: threading.Lock = threading.Lock()
+
+    self.hits: int = 0 # Served without a request
+    self.revalidations: int = 0 # Served after the server answered 304 Not Modified
+    self.misses: int = 0
+    self.evictions: int = 0
+
+  def get(self, key: str) -> Tuple[Optional[CacheEntry], bool]:
+    """
+    Find an entry, fresh or stale, mark it as recently used
+    and tell whether it can be served without a request
+    """
+
+    with self.lock:
+      entry = self.entries.get(key)
+
+      if entry is None:
+        return None, False
+
+      self.entries.move_to_end(key)
+      is_fresh = time.monotonic() < entry.expires_at
+
+      if is_fresh:
+        self.hits += 1
+
+      return entry, is_fresh
+
+  def put(self, key: str, value: Any, etag: Optional[str], size: int) -> None:
+    """
+    Store a response that had to be downloaded,
+    evicting the least recently used ones if needed
+    """
+
+    with self.lock:
+      self.misses += 1
+
+      # Responses bigger than the whole cache are never stored
+      if size > self.max_bytes:
+        return
+
+      # Aliases of the old value would keep it around uncounted
+      self._remove(key)
+
+      self.entries[key] = CacheEntry(value, etag, size, time.monotonic() + self.ttl)
+      self.size += size
+      self._evict()
+
+  def _remove(self, key: str) -> int:
+    """
+    Remove an entry with its aliases and return the number of entries removed
+    (the lock has to be held)
+    """
+
+    entry = self.entries.pop(key, None)
+
+    if entry is None:
+      return 0
+
+    self.size -= entry.size
+
+    if entry.alias_of is not None:
+      self.aliases.get(entry.alias_of, set()).discard(key)
+
+    return 1 + sum(self._remove(alias_key) for alias_key in self.aliases.pop(key, ()))
+
+  def _evict(self) -> None:
+    """
+    Evict the least recently used entries while the cache holds too much
+    (the lock has to be held)
+    """
+
+    while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+      self.evictions += self._remove(next(iter(self.entries)))
+
+  def refresh(self, key: str) -> None:
+    """
+    Restart the TTL of an entry the server confirmed is still up to date
+    """
+
+    with self.lock:
+      entry = self.entries.get(key)
+      self.revalidations += 1
+
+      if entry is not None:
+        self.entries[key] = entry._replace(expires_at=time.monotonic() + self.ttl)
+
+  def alias(self, alias_key: str, key: str) -> None:
+    """
+    Serve an existing entry under another key as well,
+    without counting its size twice
+    """
+
+    with self.lock:
+      entry = self.entries.get(key)
+
+      if entry is not None and alias_key not in self.entries:
+        # An alias of an alias serves the entry it points to
+        key = entry.alias_of or key
+        self.entries[alias_key] = entry._replace(size=0, alias_of=key)
+        self.aliases.setdefault(key, set()).add(alias_key)
+        self._evict()
+
+  def find(self, predicate: Callable[[Any], bool]) -> Optional[str]:
+    """
+    Find the key of the most recently used entry whose value matches
+    """
+
+    with self.lock:
+      for key in reversed(self.entries):
+        if predicate(self.entries[key].value):
+          return key
+
+    return None
+
+  def clear(self) -> None:
+    with self.lock:
+      self.entries.clear()
+      self.aliases.clear()
+      self.size = 0
+
+  def stats(self) -> Dict[str, int]:
+    """
+    Counters describing how well the cache is doing
+    """
+
+    return {
+      "hits": self.hits,
+      "revalidations": self.revalidations,
+      "misses": self.misses,
+      "evictions": self.evictions,
+      "entries": len(self.entries),
+      "bytes": self.size
+    }
@@ -0,0 +1,777 @@
+"""
+This module provides a local full-text index of the account's tickets
+that answers keyword and prefix queries without using the API
+"""
+
+import os
+import re
+import json
+import mmap
+import heapq
+import struct
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from itertools import chain, islice
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from ticket_viewer.ticket_viewer import (
+  Ticket,
+  TicketViewer,
+  CountTicketsResponse,
+  GetTicketsResponse
+)
+
+INDEX_FILE_NAME = "tickets.index"
+MAGIC = b"TVINDEX1"
+# Properties of a ticket that can be filtered on, e.g. 'status:open'
+FIELD_FILTERS = ("status", "priority", "type")
+# Filters on the date a ticket was last updated, e.g. 'updated_after:2021-12-01'
+DATE_FILTERS = ("updated_after", "updated_before")
+# Length of 'updated_at' as returned by the API, e.g. '2021-12-01T02:35:51Z'
+UPDATED_AT_LENGTH = 20
+# Above this many candidates, matches are found by walking through tickets
+# from the most recently updated one instead of sorting every candidate
+WALK_THRESHOLD = 4096
+
+TOKEN = re.compile(r"\w+")
+EMPTY: Sequence[int] = array("I")
+
+def tokenize(text: Optional[str]) -> List[str]:
+  """
+  Split text into lower case words
+  """
+
+  return TOKEN.findall(text.lower()) if text else []
+
+def ticket_terms(ticket: Ticket) -> Set[str]:
+  """
+  Terms a ticket is found by: the words of its subject
+  and its properties (e.g. 'status:open')
+  """
+
+  terms = set(TOKEN.findall(ticket.subject.lower())) if ticket.subject else set()
+
+  # Spelled out since this runs for every indexed ticket
+  if ticket.status is not None:
+    terms.add("status:" + ticket.status)
+  if ticket.priority is not None:
+    terms.add("priority:" + ticket.priority)
+  if ticket.type is not None:
+    terms.add("type:" + ticket.type)
+
+  return terms
+
+def contains(docs: Sequence[int], doc: int) -> bool:
+  """
+  Check if a sorted sequence of document numbers holds doc
+  """
+
+  idx = bisect_left(docs, doc)
+  return idx < len(docs) and docs[idx] == doc
+
+def bisect_key(items: Sequence[Any], value: Any, key: Callable[[Any], Any]) -> int:
+  """
+  bisect_left over the keys of items (bisect only takes a key from Python 3.10 on)
+  """
+
+  low, high = 0, len(items)
+
+  while low < high:
+    middle = (low + high) // 2
+
+    if key(items[middle]) < value:
+      low = middle + 1
+    else:
+      high = middle
+
+  return low
+
+class Term(NamedTuple):
+  text: str
+  is_prefix: bool = False
+
+class Query(NamedTuple):
+  groups: List[List[Term]] # A ticket has to match any term of every group
+  updated_after: Optional[str] = None
+  updated_before: Optional[str] = None
+
+def parse_query(string: str) -> Query:
+  """
+  Parse a query such as 'printer jam* status:open,pending updated_after:2021-12-01',
+  where words (or prefixes ending with '*') have to appear in the subject.
+  Raises ValueError if the query is not valid
+  """
+
+  groups: List[List[Term]] = []
+  dates: Dict[str, str] = {}
+
+  for part in string.split():
+    key, separator, values = part.partition(":")
+
+    if separator and key in FIELD_FILTERS:
+      groups.append([Term(f"{key}:{value}") for value in values.lower().split(",") if value])
+
+    elif separator and key in DATE_FILTERS:
+      datetime.strptime(values, "%Y-%m-%d")
+      dates[key] = values
+
+    elif separator and key.isalpha():
+      raise ValueError(f"Tickets cannot be filtered by {key}")
+
+    else:
+      words = tokenize(part)
+
+      for idx, word in enumerate(words):
+        groups.append([Term(word, part.endswith("*") and idx == len(words) - 1)])
+
+  if [] in groups:
+    raise ValueError("Filters need at least one value")
+
+  if not groups and not dates:
+    raise ValueError("The query is empty")
+
+  return Query(groups, dates.get("updated_after"), dates.get("updated_before"))
+
+class Segment(ABC):
+  """
+  Tickets indexed together, numbered from 0 in the order they were added.
+
+  Subclasses provide the tickets, their terms and
+  their order from the most recently updated one
+  """
+
+  def __init__(self) -> None:
+    self.deleted: Set[int] = set() # Documents replaced by a newer version
+
+  @abstractmethod
+  def __len__(self) -> int:
+    raise NotImplementedError
+
+  @abstractmethod
+  def ticket(self, doc: int) -> Ticket:
+    raise NotImplementedError
+
+  @abstractmethod
+  def ticket_id(self, doc: int) -> int:
+    raise NotImplementedError
+
+  @abstractmethod
+  def updated_at(self, doc: int) -> str:
+    raise NotImplementedError
+
+  @abstractmethod
+  def doc_for_id(self, ticket_id: int) -> Optional[int]:
+    raise NotImplementedError
+
+  @abstractmethod
+  def postings(self, term: str) -> Sequence[int]:
+    """
+    Sorted numbers of the documents holding a term
+    """
+
+    raise NotImplementedError
+
+  @property
+  @abstractmethod
+  def terms(self) -> Sequence[str]:
+    """
+    Every term of the segment, sorted
+    """
+
+    raise NotImplementedError
+
+  @property
+  @abstractmethod
+  def order(self) -> Sequence[int]:
+    """
+    Documents from the most recently updated one
+    """
+
+    raise NotImplementedError
+
+  @property
+  @abstractmethod
+  def rank(self) -> Sequence[int]:
+    """
+    Position of each document in order
+    """
+
+    raise NotImplementedError
+
+  @property
+  def live_count(self) -> int:
+    return len(self) - len(self.deleted)
+
+  def resolve(self, group: List[Term]) -> Sequence[int]:
+    """
+    Sorted numbers of the documents matching any term of a group
+    """
+
+    terms: List[str] = []
+
+    for term in group:
+      if not term.is_prefix:
+        terms.append(term.text)
+        continue
+
+      # Terms sharing a prefix are next to each other
+      vocabulary = self.terms
+      idx = bisect_left(vocabulary, term.text)
+
+      while idx < len(vocabulary) and vocabulary[idx].startswith(term.text):
+        terms.append(vocabulary[idx])
+        idx += 1
+
+    if len(terms) == 1:
+      return self.postings(terms[0])
+
+    docs: Set[int] = set()
+    for term in terms:
+      docs.update(self.postings(term))
+
+    return sorted(docs)
+
+  def date_range(self, query: Query) -> range:
+    """
+    Positions in order of the tickets updated within the dates of a query
+    """
+
+    start, stop = 0, len(self)
+
+    # Tickets are ordered from the most recently updated one
+    if query.updated_before is not None:
+      start = bisect_key(
+        self.order, True,
+        key=lambda doc: self.updated_at(doc)[:10] < query.updated_before
+      )
+
+    if query.updated_after is not None:
+      stop = bisect_key(
+        self.order, True,
+        key=lambda doc: self.updated_at(doc)[:10] <= query.updated_after
+      )
+
+    return range(start, max(start, stop))
+
+  def matches(self, query: Query) -> Iterator[int]:
+    """
+    Yield the documents matching a query from the most recently updated one
+    """
+
+    postings = sorted(map(self.resolve, query.groups), key=len)
+    positions = self.date_range(query)
+
+    # Few candidates, check each of them and sort the matches
+    if postings and len(postings[0]) <= WALK_THRESHOLD:
+      rank = self.rank
+      docs = [
+        doc for doc in postings[0]
+        if rank[doc] in positions and doc not in self.deleted
+        and all(contains(docs, doc) for docs in postings[1:])
+      ]
+      docs.sort(key=rank.__getitem__)
+
+      yield from docs
+
+    # Many candidates, the most recent matches are found early on
+    else:
+      order = self.order
+
+      for position in positions:
+        doc = order[position]
+
+        if doc not in self.deleted and all(contains(docs, doc) for docs in postings):
+          yield doc
+
+class MemorySegment(Segment):
+  """
+  A segment that tickets can be added to, held in memory
+  """
+
+  def __init__(self) -> None:
+    super().__init__()
+    self.tickets: List[Ticket] = []
+    self.term_postings: Dict[str, array] = {}
+    self.doc_ids: Dict[int, int] = {} # Latest document of each ticket
+    self._terms: Optional[List[str]] = None
+    self._order: Optional[List[int]] = None
+    self._rank: Optional[array] = None
+
+  def __len__(self) -> int:
+    return len(self.tickets)
+
+  def add(self, ticket: Ticket) -> None:
+    """
+    Index a ticket, replacing the version of it indexed before
+    """
+
+    self.extend([ticket])
+
+  def extend(self, tickets: Iterable[Ticket]) -> None:
+    """
+    Index many tickets, replacing the versions of them indexed before
+    """
+
+    term_postings = self.term_postings
+    doc_ids = self.doc_ids
+    doc = len(self.tickets)
+
+    for ticket in tickets:
+      if ticket.id in doc_ids:
+        self.deleted.add(doc_ids[ticket.id])
+
+      self.tickets.append(ticket)
+      doc_ids[ticket.id] = doc
+
+      for term in ticket_terms(ticket):
+        postings = term_postings.get(term)
+
+        if postings is None:
+          postings = term_postings[term] = array("I")
+
+        postings.append(doc)
+
+      doc += 1
+
+    self._terms = self._order = self._rank = None
+
+  def remove(self, ticket_id: int) -> None:
+    doc = self.doc_ids.pop(ticket_id, None)
+
+    if doc is not None:
+      self.deleted.add(doc)
+
+  def ticket(self, doc: int) -> Ticket:
+    return self.tickets[doc]
+
+  def ticket_id(self, doc: int) -> int:
+    return self.tickets[doc].id
+
+  def updated_at(self, doc: int) -> str:
+    return self.tickets[doc].updated_at
+
+  def doc_for_id(self, ticket_id: int) -> Optional[int]:
+    return self.doc_ids.get(ticket_id)
+
+  def postings(self, term: str) -> Sequence[int]:
+    return self.term_postings.get(term, EMPTY)
+
+  @property
+  def terms(self) -> Sequence[str]:
+    if self._terms is None:
+      self._terms = sorted(self.term_postings)
+
+    return self._terms
+
+  @property
+  def order(self) -> Sequence[int]:
+    if self._order is None:
+      tickets = self.tickets
+      self._order = sorted(
+        range(len(tickets)),
+        key=lambda doc: (tickets[doc].updated_at, tickets[doc].id),
+        reverse=True
+      )
+
+    return self._order
+
+  @property
+  def rank(self) -> Sequence[int]:
+    if self._rank is None:
+      self._rank = array("I", bytes(4 * len(self.tickets)))
+
+      for position, doc in enumerate(self.order):
+        self._rank[doc] = position
+
+    return self._rank
+
+  def write(self, path: str, cursor: Optional[str]) -> None:
+    """
+    Write the live tickets of the segment to a file that MappedSegment can open
+    """
+
+    tickets = [ticket for doc, ticket in enumerate(self.tickets) if doc not in self.deleted]
+    segment = self if not self.deleted else MemorySegment.of(tickets)
+
+    # Properties are stored as codes into small tables, 0 standing for None
+    columns = {key: list(map(attrgetter(key), tickets)) for key in FIELD_FILTERS}
+    values = {key: sorted(set(column).difference([None])) for key, column in columns.items()}
+    codes = [
+      map({None: 0, **{value: code for code, value in enumerate(values[key], 1)}}.__getitem__, column)
+      for key, column in columns.items()
+    ]
+
+    updated_at = "".join(ticket.updated_at for ticket in tickets).encode()
+    if len(updated_at) != UPDATED_AT_LENGTH * len(tickets):
+      raise ValueError("updated_at has to look like 2021-12-01T02:35:51Z")
+
+    subjects = [(ticket.subject or "").encode() for ticket in tickets]
+    terms = segment.terms
+    encoded_terms = [term.encode() for term in terms]
+    postings = array("I")
+
+    for term in terms:
+      postings.extend(segment.term_postings[term])
+
+    sections: Dict[str, Any] = {
+      "ids": array("q", (ticket.id for ticket in tickets)),
+      "updated_at": updated_at,
+      "codes": bytes(chain.from_iterable(zip(*codes))), # One byte per property of each ticket
+      "subject_offsets": offsets(subjects),
+      "subjects": b"".join(subjects),
+      "order": array("I", segment.order),
+      "rank": segment.rank,
+      "id_order": array("I", sorted(range(len(tickets)), key=lambda doc: tickets[doc].id)),
+      "term_offsets": offsets(encoded_terms),
+      "terms": b"".join(encoded_terms),
+      "posting_offsets": offsets([segment.term_postings[term] for term in terms]),
+      "postings": postings
+    }
+
+    # Sections are aligned on 8 bytes after the header so that they can be read in place
+    layout: Dict[str, List[Any]] = {}
+    position = 0
+
+    for name, section in sections.items():
+      size = len(section) * getattr(section, "itemsize", 1)
+      layout[name] = [position, size, getattr(section, "typecode", None)]
+      position += size + (-size % 8)
+
+    header = json.dumps({
+      "count": len(tickets),
+      "cursor": cursor,
+      "values": values,
+      "sections": layout
+    }).encode()
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % 8)
+
+    # Write next to the index and swap it in, so a crash never leaves half an index
+    with open(f"{path}.tmp", "wb") as f:
+      f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+
+      for name, section in sections.items():
+        data = section.tobytes() if isinstance(section, array) else section
+        f.write(data + b"\0" * (-len(data) % 8))
+
+    os.replace(f"{path}.tmp", path)
+
+  @classmethod
+  def of(cls, tickets: Iterable[Ticket]) -> "MemorySegment":
+    segment = cls()
+    segment.extend(tickets)
+
+    return segment
+
+def offsets(items: List[Sequence]) -> array:
+  """
+  Where each item starts and ends once they are concatenated
+  """
+
+  result = array("Q", [0])
+  total = 0
+
+  for item in items:
+    total += len(item)
+    result.append(total)
+
+  return result
+
+class TermTable(Sequence[str]):
+  """
+  Sorted terms of a MappedSegment, decoded when they are read
+  """
+
+  def __init__(self, offsets: memoryview, blob: memoryview) -> None:
+    self.offsets = offsets
+    self.blob = blob
+
+  def __len__(self) -> int:
+    return len(self.offsets) - 1
+
+  def __getitem__(self, idx: int) -> str:
+    return str(self.blob[self.offsets[idx]:self.offsets[idx + 1]], "utf-8")
+
+class MappedSegment(Segment):
+  """
+  A read-only segment backed by a memory-mapped index file,
+  so that opening it does not need to read or decode the whole file
+  """
+
+  def __init__(self, path: str) -> None:
+    super().__init__()
+
+    with open(path, "rb") as f:
+      self.mmap: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if self.mmap[:len(MAGIC)] != MAGIC:
+      self.mmap.close()
+      raise ValueError(f"{path} is not a ticket index")
+
+    header_length = struct.unpack_from("<Q", self.mmap, len(MAGIC))[0]
+    start = len(MAGIC) + 8
+    header = json.loads(self.mmap[start:start + header_length])
+    start += header_length
+
+    self.count: int = header["count"]
+    self.cursor: Optional[str] = header["cursor"]
+    self.values: Dict[str, List[Optional[str]]] = {
+      key: [None, *values] for key, values in header["values"].items()
+    }
+
+    # Every view has to be released before the file can be unmapped
+    self.views: List[memoryview] = [memoryview(self.mmap)]
+    sections: Dict[str, memoryview] = {}
+
+    for name, (offset, size, typecode) in header["sections"].items():
+      view = self.views[0][start + offset:start + offset + size]
+      self.views.append(view)
+
+      if typecode is not None:
+        view = view.cast(typecode)
+        self.views.append(view)
+
+      sections[name] = view
+
+    self.ids = sections["ids"]
+    self.updated = sections["updated_at"]
+    self.codes = sections["codes"]
+    self.subject_offsets = sections["subject_offsets"]
+    self.subjects = sections["subjects"]
+    self._order = sections["order"]
+    self._rank = sections["rank"]
+    self.id_order = sections["id_order"]
+    self.posting_offsets = sections["posting_offsets"]
+    self.all_postings = sections["postings"]
+    self._terms = TermTable(sections["term_offsets"], sections["terms"])
+
+  def close(self) -> None:
+    for view in reversed(self.views):
+      view.release()
+
+    self.mmap.close()
+
+  def __len__(self) -> int:
+    return self.count
+
+  def ticket(self, doc: int) -> Ticket:
+    status_code, priority_code, type_code = self.codes[3 * doc:3 * doc + 3]
+
+    return Ticket(
+      self.ids[doc],
+      self.updated_at(doc),
+      self.values["type"][type_code],
+      str(self.subjects[self.subject_offsets[doc]:self.subject_offsets[doc + 1]], "utf-8"),
+      self.values["priority"][priority_code],
+      self.values["status"][status_code]
+    )
+
+  def ticket_id(self, doc: int) -> int:
+    return self.ids[doc]
+
+  def updated_at(self, doc: int) -> str:
+    start = doc * UPDATED_AT_LENGTH
+    return str(self.updated[start:start + UPDATED_AT_LENGTH], "ascii")
+
+  def doc_for_id(self, ticket_id: int) -> Optional[int]:
+    idx = bisect_key(self.id_order, ticket_id, self.ids.__getitem__)
+
+    if idx < self.count and self.ids[self.id_order[idx]] == ticket_id:
+      return self.id_order[idx]
+
+    return None
+
+  def postings(self, term: str) -> Sequence[int]:
+    idx = bisect_left(self._terms, term)
+
+    if idx < len(self._terms) and self._terms[idx] == term:
+      return self.all_postings[self.posting_offsets[idx]:self.posting_offsets[idx + 1]]
+
+    return EMPTY
+
+  @property
+  def terms(self) -> Sequence[str]:
+    return self._terms
+
+  @property
+  def order(self) -> Sequence[int]:
+    return self._order
+
+  @property
+  def rank(self) -> Sequence[int]:
+    return self._rank
+
+class TicketIndex:
+  """
+  A class for searching tickets by the words of their subject, their
+  status/priority/type and the date they were last updated, kept up to date
+  through the incremental export API.
+
+  Tickets are indexed in a memory-mapped file written to the given directory
+  (or only in memory without one). Changes since the file was last written are
+  indexed in memory and merged into the file once they reach
+  compact_ratio of its tickets
+  """
+
+  def __init__(self, directory: Optional[str] = None, compact_ratio: float = 0.1) -> None:
+    self.path: Optional[str] = None
+    self.base: Optional[MappedSegment] = None
+
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+      self.path = os.path.join(directory, INDEX_FILE_NAME)
+
+      if os.path.exists(self.path):
+        self.base = MappedSegment(self.path)
+
+    self.pending: MemorySegment = MemorySegment() # Tickets not written to the file yet
+    self.cursor: Optional[str] = self.base.cursor if self.base is not None else None
+    self.compact_ratio: float = compact_ratio
+
+  def __enter__(self) -> "TicketIndex":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def close(self) -> None:
+    if self.base is not None:
+      self.base.close()
+      self.base = None
+
+  @property
+  def segments(self) -> List[Segment]:
+    return [segment for segment in (self.base, self.pending) if segment is not None]
+
+  def add(self, tickets: List[Ticket]) -> None:
+    """
+    Index new or updated tickets, removing the ones that were deleted
+    """
+
+    for ticket in tickets:
+      if self.base is not None:
+        doc = self.base.doc_for_id(ticket.id)
+
+        if doc is not None:
+          self.base.deleted.add(doc)
+
+      if ticket.status == "deleted":
+        self.pending.remove(ticket.id)
+      else:
+        self.pending.add(ticket)
+
+  def sync(self, ticket_viewer: TicketViewer) -> int:
+    """
+    Index the tickets that changed since the last sync
+    (or every ticket if the index is empty) and return the status code
+    """
+
+    while True:
+      response = ticket_viewer.get_incremental_tickets(cursor=self.cursor)
+
+      if response.status_code != 200 or response.tickets is None:
+        return response.status_code
+
+      self.add(response.tickets)
+      self.cursor = response.after_cursor
+
+      if response.end_of_stream:
+        break
+
+    # Rewriting the file costs as much as its size, so only do it
+    # once enough changes are waiting
+    base_count = len(self.base) if self.base is not None else 0
+    if self.path is not None and len(self.pending) and \
+      len(self.pending) >= base_count * self.compact_ratio:
+      self.save()
+
+    return response.status_code
+
+  def save(self) -> None:
+    """
+    Merge the pending changes into the index file
+    """
+
+    if self.path is None:
+      return
+
+    merged = self.pending
+
+    if self.base is not None:
+      base = self.base
+      merged = MemorySegment.of(
+        base.ticket(doc) for doc in range(len(base)) if doc not in base.deleted
+      )
+      merged.extend(
+        ticket for doc, ticket in enumerate(self.pending.tickets)
+        if doc not in self.pending.deleted
+      )
+
+      base.close()
+      self.base = None
+
+    merged.write(self.path, self.cursor)
+    self.base = MappedSegment(self.path)
+    self.pending = MemorySegment()
+
+  def count_tickets(self) -> CountTicketsResponse:
+    """
+    Count the number of indexed tickets
+    """
+
+    return CountTicketsResponse(200, sum(segment.live_count for segment in self.segments))
+
+  def search(self, query: str, offset: int = 0, limit: int = 25) -> List[Ticket]:
+    """
+    Find the tickets matching a query (see parse_query) from the most recently
+    updated one. Raises ValueError if the query is not valid
+    """
+
+    parsed = parse_query(query)
+
+    def sort_keys(segment: Segment) -> Iterator[Tuple[str, int, int, Segment]]:
+      for doc in segment.matches(parsed):
+        yield segment.updated_at(doc), segment.ticket_id(doc), doc, segment
+
+    # Every segment lists its matches in the same order, merge them
+    merged = heapq.merge(
+      *map(sort_keys, self.segments),
+      key=lambda match: match[:2],
+      reverse=True
+    )
+
+    return [segment.ticket(doc) for _, _, doc, segment in islice(merged, offset, offset + limit)]
+
+  def get_tickets(
+    self,
+    link: Optional[str] = None,
+    page_size: int = 25,
+    query: Optional[str] = None
+  ) -> GetTicketsResponse:
+    """
+    List the tickets matching a query with the most recently updated one first,
+    where links are the offset of the previous/next pages followed by the query.
+    Raises ValueError if the query is not valid
+    """
+
+    offset = 0
+
+    if link is not None:
+      offset_text, _, query = link.partition(" ")
+      offset = int(offset_text)
+
+    # Like the API, going past either end of the results returns no tickets
+    if offset < 0:
+      return GetTicketsResponse(200, [], next_link=f"0 {query}", has_more=False)
+
+    tickets = self.search(query or "", offset, page_size + 1)
+
+    return GetTicketsResponse(
+      200,
+      tickets[:page_size],
+      prev_link=f"{offset - page_size} {query}",
+      next_link=f"{offset + page_size} {query}",
+      has_more=len(tickets) > page_size
+    )
@@ -0,0 +1,198 @@
+"""
+This module provides ticket statistics (counts by status, priority
+and type, and histograms of 'updated_at') computed over tickets
+loaded into column arrays
+"""
+
+from __future__ import annotations
+
+from array import array
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, tzinfo
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ticket_viewer.ticket_viewer import Ticket
+
+if TYPE_CHECKING:
+  from ticket_viewer.cache import TicketCache
+
+# Properties tickets can be grouped by
+CATEGORIES = ("status", "priority", "type")
+# Properties loaded for statistics, in the order of the rows given to extend
+STATS_FIELDS = (*CATEGORIES, "updated_at")
+PERIODS = ("day", "week")
+EPOCH = date(1970, 1, 1)
+# Codes of a column are stored as bytes
+MAX_CATEGORY_VALUES = 256
+# Number of rows transposed into columns at a time
+LOAD_CHUNK_SIZE = 10000
+# Quarter of the hour each minute, e.g. '35', is in
+QUARTERS = {f"{minute:02d}": minute // 15 for minute in range(60)}
+
+Group = Tuple[Optional[str], ...]
+
+@lru_cache(maxsize=65536)
+def first_quarter_hour(utc_hour: str) -> int:
+  """
+  Number of the first quarter of a 'YYYY-MM-DDTHH' hour
+  """
+
+  day = (date(int(utc_hour[0:4]), int(utc_hour[5:7]), int(utc_hour[8:10])) - EPOCH).days
+  return day * 96 + int(utc_hour[11:13]) * 4
+
+def quarter_hour(updated_at: str) -> int:
+  """
+  Number of the quarter of an hour a UTC timestamp such as
+  '2021-11-25T21:35:43Z' is in, counted from 1970-01-01
+  """
+
+  return first_quarter_hour(updated_at[:13]) + QUARTERS[updated_at[14:16]]
+
+def week_start(day: int) -> int:
+  """
+  Day number of the Monday starting the week of a day (1970-01-01 was a Thursday)
+  """
+
+  return day - (day + 3) % 7
+
+class TicketStats:
+  """
+  A class for aggregating tickets held in column arrays.
+
+  Every category is dictionary-encoded: each distinct value gets a small
+  code and the column is a bytearray of codes, so grouping by it counts bytes
+  in C. 'updated_at' is kept as quarter hours since 1970, so histograms count
+  the distinct quarter hours once and only then convert them to local days
+  """
+
+  def __init__(self) -> None:
+    # Codes of each category's values, a new value gets the next code
+    self.codes: Dict[str, Dict[Optional[str], int]] = {}
+    self.columns: Dict[str, bytearray] = {}
+
+    for field in CATEGORIES:
+      codes: Dict[Optional[str], int] = defaultdict()
+      codes.default_factory = codes.__len__
+      self.codes[field] = codes
+      self.columns[field] = bytearray()
+
+    self.quarter_hours: array = array("q")
+
+  def __len__(self) -> int:
+    return len(self.quarter_hours)
+
+  @classmethod
+  def of(cls, tickets: Iterable[Ticket]) -> "TicketStats":
+    stats = cls()
+    stats.extend((ticket.status, ticket.priority, ticket.type, ticket.updated_at) for ticket in tickets)
+    return stats
+
+  @classmethod
+  def of_cache(cls, ticket_cache: TicketCache) -> "TicketStats":
+    """
+    Load every ticket of the local cache, reading only the columns needed
+    """
+
+    stats = cls()
+    stats.extend(ticket_cache.connection.execute(f"SELECT {', '.join(STATS_FIELDS)} FROM tickets"))
+    return stats
+
+  def extend(self, rows: Iterable[Sequence[Optional[str]]]) -> None:
+    """
+    Add tickets given as rows of their STATS_FIELDS.
+    Raises ValueError if a category has too many distinct values
+    """
+
+    rows = iter(rows)
+
+    while True:
+      chunk = list(islice(rows, LOAD_CHUNK_SIZE))
+      if not chunk:
+        break
+
+      *categories, updated_at = zip(*chunk)
+
+      for field, values in zip(CATEGORIES, categories):
+        self.columns[field].extend(map(self.codes[field].__getitem__, values))
+
+        if len(self.codes[field]) > MAX_CATEGORY_VALUES:
+          raise ValueError(f"{field} has more than {MAX_CATEGORY_VALUES} distinct values")
+
+      self.quarter_hours.extend(map(quarter_hour, updated_at))
+
+  def values(self, field: str) -> List[Optional[str]]:
+    """
+    Distinct values of a category, by code
+    """
+
+    return list(self.codes[field])
+
+  def count_by(self, *fields: str) -> Dict[Group, int]:
+    """
+    Number of tickets for each combination of values of the categories
+    that occurs, the most common first
+    """
+
+    if not fields or any(field not in CATEGORIES for field in fields):
+      raise ValueError(f"Tickets can only be grouped by {', '.join(CATEGORIES)}")
+
+    values = [self.values(field) for field in fields]
+
+    if len(fields) == 1:
+      # One pass over the bytes per distinct value
+      column = self.columns[fields[0]]
+      counts = {(value,): column.count(code) for code, value in enumerate(values[0])}
+    else:
+      counts = {
+        tuple(values[idx][code] for idx, code in enumerate(codes)): count
+        for codes, count in Counter(zip(*(self.columns[field] for field in fields))).items()
+      }
+
+    return dict(sorted(
+      ((group, count) for group, count in counts.items() if count),
+      key=lambda item: (-item[1], tuple(value or "" for value in item[0]))
+    ))
+
+  def histogram(self, period: str = "day", tz: Optional[tzinfo] = None) -> List[Tuple[date, int]]:
+    """
+    Number of tickets last updated on each day (or in each week, starting
+    on Monday) in a timezone (UTC by default), from the first to the last,
+    including the days or weeks without any
+    """
+
+    if period not in PERIODS:
+      raise ValueError(f"period has to be one of {', '.join(PERIODS)}")
+
+    # Offset of the timezone in minutes, for each hour it is looked up for
+    offsets: Dict[int, int] = {}
+    counts: Counter = Counter()
+
+    for quarter, count in Counter(self.quarter_hours).items():
+      hour = quarter // 4
+      offset = offsets.get(hour)
+
+      if offset is None:
+        offset = 0
+        if tz is not None:
+          offset = int(datetime.fromtimestamp(hour * 3600, tz).utcoffset() // timedelta(minutes=1))
+        offsets[hour] = offset
+
+      counts[(quarter * 15 + offset) // 1440] += count
+
+    if period == "week":
+      weeks: Counter = Counter()
+      for day, count in counts.items():
+        weeks[week_start(day)] += count
+      counts = weeks
+
+    if not counts:
+      return []
+
+    step = 7 if period == "week" else 1
+
+    return [
+      (EPOCH + timedelta(days=day), counts.get(day, 0))
+      for day in range(min(counts), max(counts) + 1, step)
+    ]
@@ -3,8 +3,146 @@ This module provides Ticket Viewer with the functions to
 retrieve all tickets/individual ticket using Zendesk API
 """
 
-import requests
-from typing import List, Dict, NamedTuple, Optional
+from __future__ import annotations
+
+import time
+import threading
+from datetime import datetime
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Dict, NamedTuple, Optional, Sequence, Tuple, Union
+from urllib.parse import quote, urlencode, urlsplit
+
+from ticket_viewer.instrumentation import INSTRUMENTATION, Instrumentation
+from ticket_viewer.json_stream import JSONArrayStream
+from ticket_viewer.rate_limit import RateLimiter
+from ticket_viewer.response_cache import ResponseCache
+
+# requests, concurrent.futures and asyncio (for AsyncTicketViewer) take longer
+# to import than the rest of the app, so they are only imported once they are needed
+if TYPE_CHECKING:
+	import requests
+	from concurrent.futures import ThreadPoolExecutor
+
+# Maximum number of IDs the show_many endpoint accepts per request
+SHOW_MANY_MAX_IDS = 100
+# Maximum number of tickets the tickets endpoint returns per page
+MAX_PAGE_SIZE = 100
+# Status codes after which a GET request is sent again
+RETRY_STATUS_CODES = (429, 503)
+# Number of bytes read at a time from streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
+# Path of the search API, whose pages list tickets under 'results'
+SEARCH_PATH = "/api/v2/search.json"
+# Search keyword used for each filter accepted by get_tickets
+SEARCH_KEYWORDS = {
+	"status": "status:",
+	"priority": "priority:",
+	"type": "ticket_type:",
+	"updated_after": "updated>", # A date such as 2021-12-01, that day excluded
+	"updated_before": "updated<"
+}
+# Values accepted by the filters on the properties of a ticket
+FILTER_VALUES = {
+	"status": ("new", "open", "pending", "hold", "solved", "closed"),
+	"priority": ("low", "normal", "high", "urgent"),
+	"type": ("problem", "incident", "question", "task")
+}
+
+class TicketViewerError(Exception):
+	"""
+	Raised when tickets cannot be fetched while iterating through them
+	"""
+
+	def __init__(self, status_code: int) -> None:
+		super().__init__(f"Request failed with status code {status_code}")
+		self.status_code: int = status_code
+
+def request_errors() -> Tuple[type, ...]:
+	"""
+	Errors a request is expected to fail with: network errors and responses
+	that are not the JSON we expect. Anything else is a bug and is raised
+	"""
+
+	import requests
+
+	return (requests.RequestException, ValueError, KeyError, TypeError)
+
+# Properties of a ticket that are displayed to the user
+TICKET_FIELDS = ("id", "updated_at", "type", "subject", "priority", "status")
+
+class Ticket:
+	"""
+	A compact record holding the properties of a ticket displayed to the user.
+
+	It uses __slots__ instead of a per-ticket dict, and still supports
+	dict-style access (ticket["subject"], .get, .keys, == with a dict, ...)
+	"""
+
+	__slots__ = TICKET_FIELDS
+
+	def __init__(
+		self,
+		id: int,
+		updated_at: Optional[str] = None,
+		type: Optional[str] = None,
+		subject: Optional[str] = None,
+		priority: Optional[str] = None,
+		status: Optional[str] = None
+	) -> None:
+		self.id = id
+		self.updated_at = updated_at
+		self.type = type
+		self.subject = subject
+		self.priority = priority
+		self.status = status
+
+	def __getitem__(self, key: str) -> Any:
+		if key not in TICKET_FIELDS:
+			raise KeyError(key)
+
+		return getattr(self, key)
+
+	def __setitem__(self, key: str, value: Any) -> None:
+		if key not in TICKET_FIELDS:
+			raise KeyError(key)
+
+		setattr(self, key, value)
+
+	def __contains__(self, key: object) -> bool:
+		return key in TICKET_FIELDS
+
+	def __iter__(self) -> Iterator[str]:
+		return iter(TICKET_FIELDS)
+
+	def __len__(self) -> int:
+		return len(TICKET_FIELDS)
+
+	def __eq__(self, other: object) -> bool:
+		if isinstance(other, Ticket):
+			return self.values() == other.values()
+
+		if isinstance(other, dict):
+			return other == self.to_dict()
+
+		return NotImplemented
+
+	def __repr__(self) -> str:
+		return f"Ticket({self.to_dict()!r})"
+
+	def get(self, key: str, default: Any = None) -> Any:
+		return getattr(self, key) if key in TICKET_FIELDS else default
+
+	def keys(self) -> Tuple[str, ...]:
+		return TICKET_FIELDS
+
+	def values(self) -> List[Any]:
+		return [getattr(self, key) for key in TICKET_FIELDS]
+
+	def items(self) -> List[Tuple[str, Any]]:
+		return list(zip(TICKET_FIELDS, self.values()))
+
+	def to_dict(self) -> Dict[str, Any]:
+		return dict(self.items())
 
 class CountTicketsResponse(NamedTuple):
 	status_code: int
@@ -12,15 +150,272 @@ class CountTicketsResponse(NamedTuple):
 
 class GetTicketsResponse(NamedTuple):
 	status_code: int
-	tickets: Optional[List[Dict[str, str]]] = None
+	tickets: Optional[List[Ticket]] = None
 	prev_link: Optional[str] = None
 	next_link: Optional[str] = None
+	has_more: Optional[bool] = None
+	count: Optional[int] = None # Number of matching tickets, for search results only
+
+class IncrementalTicketsResponse(NamedTuple):
+	status_code: int
+	tickets: Optional[List[Ticket]] = None
+	after_cursor: Optional[str] = None
+	end_of_stream: Optional[bool] = None
+
+class GetTicketsByIdsResponse(NamedTuple):
+	status_code: int
+	tickets: Optional[List[Ticket]] = None
+	missing_ids: Optional[List[int]] = None
+
+def extract_ticket_fields(
+	ticket: Dict[str, Any],
+	fields: Sequence[str] = TICKET_FIELDS
+) -> Ticket:
+	"""
+	Keep only the properties of a ticket that are displayed to the user,
+	or the given subset of them (the others are left as None)
+	"""
+
+	if fields is TICKET_FIELDS:
+		return Ticket(*map(ticket.__getitem__, TICKET_FIELDS))
+
+	return Ticket(**{key: ticket[key] for key in fields})
+
+def select_ticket_fields(fields: Iterable[str]) -> Tuple[str, ...]:
+	"""
+	Order the requested properties like TICKET_FIELDS,
+	always keeping the ID. Raises ValueError for unknown properties
+	"""
+
+	fields = set(fields)
+	unknown = fields.difference(TICKET_FIELDS)
+
+	if unknown:
+		raise ValueError(f"Unknown ticket fields: {', '.join(sorted(unknown))}")
+
+	return tuple(key for key in TICKET_FIELDS if key == "id" or key in fields)
+
+def build_search_query(filters: Dict[str, Union[str, Sequence[str]]]) -> str:
+	"""
+	Build a search API query for tickets matching every filter,
+	where a filter given several values matches any of them.
+	Raises ValueError for unknown filters or values
+	"""
+
+	terms = ["type:ticket"]
+
+	for key, values in filters.items():
+		if key not in SEARCH_KEYWORDS:
+			raise ValueError(f"Tickets cannot be filtered by {key}")
+
+		for value in [values] if isinstance(values, str) else values:
+			if key in FILTER_VALUES and value not in FILTER_VALUES[key]:
+				raise ValueError(f"{value} is not a valid {key}")
+
+			# Dates have to be given as YYYY-MM-DD
+			if key not in FILTER_VALUES:
+				datetime.strptime(value, "%Y-%m-%d")
+
+			terms.append(f"{SEARCH_KEYWORDS[key]}{value}")
+
+	return " ".join(terms)
 
 class TicketViewer:
-	def __init__(self, url: str, email:str, password: str) -> None:
+	def __init__(
+		self,
+		url: str,
+		email:str,
+		password: str,
+		pool_connections: int = 10,
+		pool_maxsize: int = 10,
+		connect_timeout: float = 3.05,
+		read_timeout: float = 30,
+		cache_ttl: float = 60,
+		cache_max_entries: int = 256,
+		cache_max_bytes: int = 8 * 1024 * 1024,
+		rate_limiter: Optional[RateLimiter] = None,
+		max_retries: int = 3,
+		instrumentation: Optional[Instrumentation] = None
+	) -> None:
 		self.url: str = url
 		self.email: str = email
 		self.password: str = password
+		self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+
+		self.pool_connections: int = pool_connections # Number of hosts to keep a pool for
+		self.pool_maxsize: int = pool_maxsize # Number of connections kept alive per host
+		# Created by the first request
+		self._session: Optional[requests.Session] = None
+		self._session_lock: threading.Lock = threading.Lock()
+
+		# Recently fetched tickets and pages, so that looking up the same ticket
+		# or paging back to a page we just viewed needs no round-trip
+		# (a cache_max_bytes of 0 turns the cache off)
+		self.response_cache: Optional[ResponseCache] = ResponseCache(
+			ttl=cache_ttl,
+			max_entries=cache_max_entries,
+			max_bytes=cache_max_bytes
+		) if cache_max_bytes > 0 else None
+
+		# Keeps requests within the account's rate limit,
+		# pass the same RateLimiter to every TicketViewer of an account to share it
+		self.rate_limiter: RateLimiter = rate_limiter or RateLimiter()
+		self.max_retries: int = max_retries
+
+		# Reports requests and parsing times to whoever subscribes to it
+		self.instrumentation: Instrumentation = instrumentation or INSTRUMENTATION
+
+	def __enter__(self) -> "TicketViewer":
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
+
+	@property
+	def session(self) -> requests.Session:
+		"""
+		A single keep-alive session shared by every call so that
+		paging through tickets reuses the same TCP/TLS connection
+		instead of paying a new handshake per request
+		"""
+
+		if self._session is None:
+			with self._session_lock:
+				if self._session is None:
+					import requests
+					from requests.adapters import HTTPAdapter
+
+					adapter = HTTPAdapter(
+						pool_connections=self.pool_connections,
+						pool_maxsize=self.pool_maxsize
+					)
+					session = requests.Session()
+					session.auth = (self.email, self.password)
+					session.mount("https://", adapter)
+					session.mount("http://", adapter)
+					self._session = session
+
+		return self._session
+
+	def close(self) -> None:
+		"""
+		Close every pooled connection held by the session
+		"""
+
+		if self._session is not None:
+			self._session.close()
+
+	def _get(
+		self,
+		url: str,
+		headers: Optional[Dict[str, str]] = None,
+		stream: bool = False,
+		cache: Optional[str] = None
+	) -> requests.Response:
+		"""
+		Send a GET request through the pooled session,
+		retrying it when the API asks us to come back later.
+		With stream=True, the body of a successful response is left
+		to be read by the caller. cache is reported with the request
+		when it was sent because of a cache miss
+		"""
+
+		attempt = 0
+		started_at = time.perf_counter()
+
+		while True:
+			self.rate_limiter.acquire()
+			response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+			self.rate_limiter.update(response.headers)
+
+			# Read the body of other responses so that the connection goes back to the pool
+			if stream and response.status_code != 200:
+				response.content
+
+			if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+				self.instrumentation.request(
+					url,
+					response.status_code,
+					started_at,
+					response.headers.get("Content-Length"),
+					attempt,
+					"revalidated" if cache and response.status_code == 304 else cache
+				)
+				return response
+
+			self.rate_limiter.back_off(response.headers.get("Retry-After"), attempt, response.status_code)
+			attempt += 1
+
+	def _get_cached(
+		self,
+		url: str,
+		parse: Callable[[requests.Response], Tuple[GetTicketsResponse, int]],
+		stream: bool = False
+	) -> GetTicketsResponse:
+		"""
+		Send a GET request unless a fresh response is in the cache,
+		revalidating stale responses with their ETag.
+		parse returns the result of a successful response and the size of its body
+		"""
+
+		if self.response_cache is None:
+			response = self._get(url, stream=stream)
+			return parse(response)[0] if response.status_code == 200 \
+				else GetTicketsResponse(response.status_code)
+
+		entry, is_fresh = self.response_cache.get(url)
+
+		if is_fresh:
+			self.instrumentation.request(url, 200, time.perf_counter(), cache="hit")
+			return entry.value
+
+		headers = None
+		if entry is not None and entry.etag:
+			headers = {"If-None-Match": entry.etag}
+
+		response = self._get(url, headers=headers, stream=stream, cache="miss")
+
+		# The stale response is still up to date
+		if response.status_code == 304:
+			self.response_cache.refresh(url)
+			return entry.value
+
+		if response.status_code != 200:
+			return GetTicketsResponse(response.status_code)
+
+		result, size = parse(response)
+		self.response_cache.put(url, result, response.headers.get("ETag"), size)
+
+		return result
+
+	def tickets_link(self, page_size: int = 25, sort: str = "-updated_at") -> str:
+		"""
+		Build the link to the first page of tickets
+		"""
+
+		return f'{self.url}/api/v2/tickets.json?page[size]={page_size}&sort={sort}'
+
+	def search_link(
+		self,
+		filters: Dict[str, Union[str, Sequence[str]]],
+		page_size: int = 25,
+		sort: str = "-updated_at"
+	) -> str:
+		"""
+		Build the link to the first page of tickets matching the filters
+		"""
+
+		params = urlencode(
+			{
+				"query": build_search_query(filters),
+				"sort_by": sort.lstrip("-"),
+				"sort_order": "desc" if sort.startswith("-") else "asc",
+				"per_page": page_size
+			},
+			quote_via=quote
+		)
+
+		return f'{self.url}{SEARCH_PATH}?{params}'
 
 	def count_tickets(self) -> CountTicketsResponse:
 		"""
@@ -30,10 +425,7 @@ class TicketViewer:
 		# In case anything happens, we want to be able to catch the error
 		# and send a message to the user
 		try:
-			response = requests.get(
-				f'{self.url}/api/v2/tickets/count.json',
-				auth=(self.email, self.password)
-			)
+			response = self._get(f'{self.url}/api/v2/tickets/count.json')
 
 			if response.status_code == 200:
 				return CountTicketsResponse(
@@ -44,84 +436,442 @@ class TicketViewer:
 			else:
 				return CountTicketsResponse(response.status_code)
 		
-		except:
+		except request_errors() as error:
+			self.instrumentation.error(f'{self.url}/api/v2/tickets/count.json', error)
 			return CountTicketsResponse(-1)
 	
-	def get_tickets(self, link: Optional[str] = None) -> GetTicketsResponse:
+	def get_tickets(
+		self,
+		link: Optional[str] = None,
+		use_cache: bool = True,
+		fields: Optional[Iterable[str]] = None,
+		filters: Optional[Dict[str, Union[str, Sequence[str]]]] = None
+	) -> GetTicketsResponse:
 		"""
-		List tickets belonging to the account
+		List tickets belonging to the account.
+
+		fields keeps only some of the displayed properties of each ticket.
+		filters (e.g. {"status": ["open", "pending"], "priority": "urgent",
+		"updated_after": "2021-12-01"}) lists only the matching tickets
+		through the search API instead, then link follows its pages.
+		Raises ValueError for unknown fields or filters
 		"""
 
 		# If no link is given, get 25 most recently updated tickets by default
 		if link is None:
-			link = f'{self.url}/api/v2/tickets.json?page[size]=25&sort=-updated_at'
+			link = self.search_link(filters) if filters else self.tickets_link()
+
+		parse = self._parse_tickets
+
+		# The cache is keyed by link only, so pages holding fewer properties are not cached
+		if fields is not None:
+			parse = partial(self._parse_tickets, fields=select_ticket_fields(fields))
+			use_cache = False
 
 		# In case anything happens, we want to be able to catch the error
 		# and send a message to the user
 		try:
-			response = requests.get(link, auth=(self.email, self.password))
+			if use_cache and self.response_cache is not None:
+				page = self._get_cached(link, parse, stream=True)
 
-			if response.status_code == 200:
-				data = response.json()
-				tickets = []
-
-				for ticket in data["tickets"]:
-					tickets.append(
-						{
-							"id": ticket["id"],
-							"updated_at": ticket["updated_at"],
-							"type": ticket["type"],
-							"subject": ticket["subject"],
-							"priority": ticket["priority"],
-							"status": ticket["status"]
-						}
-					)
+				if page.status_code == 200:
+					self._link_adjacent_pages(link, page)
 
-				return GetTicketsResponse(
-					response.status_code,
-					tickets,
-					prev_link=data["links"]["prev"],
-					next_link=data["links"]["next"]
-				)
+				return page
+
+			response = self._get(link, stream=True)
+
+			if response.status_code == 200:
+				return parse(response)[0]
 
 			else:
 				return GetTicketsResponse(response.status_code)
 		
-		except:
+		except request_errors() as error:
+			self.instrumentation.error(link, error)
 			return GetTicketsResponse(-1)
+
+	def _link_adjacent_pages(self, link: str, page: GetTicketsResponse) -> None:
+		"""
+		Cursor links of the same page differ depending on the direction
+		we came from, so cache the page we came from under the link
+		that leads back to it
+		"""
+
+		# We got here through the 'next' link of a cached page
+		previous_page = self.response_cache.find(
+			lambda value: isinstance(value, GetTicketsResponse) and value.next_link == link
+		)
+		if previous_page is not None and page.prev_link:
+			self.response_cache.alias(page.prev_link, previous_page)
+
+		# We got here through the 'prev' link of a cached page
+		next_page = self.response_cache.find(
+			lambda value: isinstance(value, GetTicketsResponse) and value.prev_link == link
+		)
+		if next_page is not None and page.next_link:
+			self.response_cache.alias(page.next_link, next_page)
+
+	def _parse_tickets(
+		self,
+		response: requests.Response,
+		fields: Sequence[str] = TICKET_FIELDS
+	) -> Tuple[GetTicketsResponse, int]:
+		"""
+		Build a page of tickets (or of search results) from a successful
+		streamed response, decoding tickets one at a time so that
+		only their displayed properties are kept in memory
+		"""
+
+		# Search results are listed under 'results' and linked by page number
+		is_search = urlsplit(response.url).path.endswith(SEARCH_PATH)
+
+		# Includes reading the body, which arrives while it is being decoded
+		with self.instrumentation.timer("parse") as details:
+			stream = JSONArrayStream(
+				response.iter_content(STREAM_CHUNK_SIZE),
+				"results" if is_search else "tickets"
+			)
+			tickets = [extract_ticket_fields(ticket, fields) for ticket in stream]
+			data = stream.document
+			details.update(bytes=stream.bytes_read, tickets=len(tickets))
+
+		if is_search:
+			page = GetTicketsResponse(
+				response.status_code,
+				tickets,
+				prev_link=data["previous_page"],
+				next_link=data["next_page"],
+				has_more=data["next_page"] is not None,
+				count=data["count"]
+			)
+
+		else:
+			page = GetTicketsResponse(
+				response.status_code,
+				tickets,
+				prev_link=data["links"]["prev"],
+				next_link=data["links"]["next"],
+				has_more=data.get("meta", {}).get("has_more")
+			)
+
+		return page, stream.bytes_read
 	
 	def get_individual_ticket(self, ticket_number:str) -> GetTicketsResponse:
 		"""
 		Fetch the properties of a specific ticket by ticket ID
 		"""
 
+		link = f'{self.url}/api/v2/tickets/{ticket_number}.json'
+
 		# In case anything happens, we want to be able to catch the error
 		# and send a message to the user
 		try:
-			response = requests.get(
-				f'{self.url}/api/v2/tickets/{ticket_number}.json', 
-				auth=(self.email, self.password)
-			)
+			return self._get_cached(link, self._parse_individual_ticket)
+		
+		except request_errors() as error:
+			self.instrumentation.error(link, error)
+			return GetTicketsResponse(-1)
+
+	def _parse_individual_ticket(
+		self,
+		response: requests.Response
+	) -> Tuple[GetTicketsResponse, int]:
+		"""
+		Build a single ticket from a successful response
+		"""
+
+		with self.instrumentation.timer("parse") as details:
+			ticket = [extract_ticket_fields(response.json()["ticket"])]
+			details.update(bytes=len(response.content), tickets=1)
+
+		return GetTicketsResponse(response.status_code, ticket), len(response.content)
+
+	def get_json(self, path: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+		"""
+		Fetch another resource of the API by its path, such as the comments
+		of a ticket, and return the status code and the body of the response
+		(None unless the request succeeded)
+		"""
+
+		link = f'{self.url}{path}'
+
+		# In case anything happens, we want to be able to catch the error
+		# and send a message to the user
+		try:
+			response = self._get(link)
+
+			if response.status_code != 200:
+				return response.status_code, None
+
+			with self.instrumentation.timer("parse") as details:
+				data = response.json()
+				details.update(bytes=len(response.content))
+
+			return response.status_code, data
+
+		except request_errors() as error:
+			self.instrumentation.error(link, error)
+			return -1, None
+
+	def get_incremental_tickets(
+		self,
+		start_time: int = 0,
+		cursor: Optional[str] = None
+	) -> IncrementalTicketsResponse:
+		"""
+		List tickets that changed since start_time (a Unix timestamp),
+		or since the position of a cursor returned by a previous call,
+		using the incremental export API
+		"""
+
+		if cursor is None:
+			link = f'{self.url}/api/v2/incremental/tickets/cursor.json?start_time={start_time}'
+		else:
+			link = f'{self.url}/api/v2/incremental/tickets/cursor.json?cursor={cursor}'
+
+		# In case anything happens, we want to be able to catch the error
+		# and send a message to the user
+		try:
+			response = self._get(link)
 
 			if response.status_code == 200:
-				ticket_info = response.json()["ticket"]
-				ticket = []
-				
-				ticket.append(
-					{
-						"id": ticket_info["id"],
-						"updated_at": ticket_info["updated_at"],
-						"type": ticket_info["type"],
-						"subject": ticket_info["subject"],
-						"priority": ticket_info["priority"],
-						"status": ticket_info["status"]
-					}
+				data = response.json()
+
+				return IncrementalTicketsResponse(
+					response.status_code,
+					[extract_ticket_fields(ticket) for ticket in data["tickets"]],
+					after_cursor=data["after_cursor"],
+					end_of_stream=data["end_of_stream"]
 				)
 
-				return GetTicketsResponse(response.status_code, ticket)
-			
 			else:
-				return GetTicketsResponse(response.status_code)
-		
-		except:
-			return GetTicketsResponse(-1)
\ No newline at end of file
+				return IncrementalTicketsResponse(response.status_code)
+
+		except request_errors() as error:
+			self.instrumentation.error(link, error)
+			return IncrementalTicketsResponse(-1)
+
+	def iter_tickets(
+		self,
+		page_size: int = MAX_PAGE_SIZE,
+		sort: str = "-updated_at",
+		fields: Optional[Iterable[str]] = None,
+		filters: Optional[Dict[str, Union[str, Sequence[str]]]] = None
+	) -> Iterator[Ticket]:
+		"""
+		Yield every ticket belonging to the account (or matching filters)
+		one at a time, following pagination lazily.
+
+		The next page is fetched on a background thread while the caller
+		works through the current one, so at most two pages are held in memory.
+		Raises TicketViewerError if a page cannot be fetched
+		"""
+
+		if not 1 <= page_size <= MAX_PAGE_SIZE:
+			raise ValueError(f"page_size has to be between 1 and {MAX_PAGE_SIZE}")
+
+		link = self.search_link(filters, page_size, sort) if filters \
+			else self.tickets_link(page_size, sort)
+		# Check the fields before any request is sent
+		if fields is not None:
+			fields = select_ticket_fields(fields)
+
+		from concurrent.futures import ThreadPoolExecutor
+
+		with ThreadPoolExecutor(max_workers=1) as executor:
+			# Pages are only read once, so they are not worth keeping in the cache
+			next_page = executor.submit(self.get_tickets, link, use_cache=False, fields=fields)
+
+			while next_page is not None:
+				response = next_page.result()
+
+				if response.status_code != 200 or response.tickets is None:
+					raise TicketViewerError(response.status_code)
+
+				# Start fetching the next page before handing out the current one
+				next_page = None
+				if response.has_more and response.next_link:
+					next_page = executor.submit(
+						self.get_tickets,
+						response.next_link,
+						use_cache=False,
+						fields=fields
+					)
+
+				yield from response.tickets
+
+	def _get_ticket_batch(self, batch: Sequence[int]) -> GetTicketsResponse:
+		"""
+		Fetch up to SHOW_MANY_MAX_IDS tickets with a single request
+		"""
+
+		response = self._get(
+			f'{self.url}/api/v2/tickets/show_many.json'
+			f'?ids={",".join(map(str, batch))}'
+		)
+
+		if response.status_code != 200:
+			return GetTicketsResponse(response.status_code)
+
+		return GetTicketsResponse(
+			response.status_code,
+			[extract_ticket_fields(ticket) for ticket in response.json()["tickets"]]
+		)
+
+	def get_tickets_by_ids(
+		self,
+		ticket_numbers: Iterable[Any],
+		max_concurrency: int = 1
+	) -> GetTicketsByIdsResponse:
+		"""
+		Fetch many tickets by ticket ID using as few requests as possible,
+		keeping the order the IDs were given in.
+		With max_concurrency > 1, up to that many requests are sent at once
+		"""
+
+		found: Dict[int, Ticket] = {}
+
+		# In case anything happens, we want to be able to catch the error
+		# and send a message to the user
+		try:
+			# Drop duplicated IDs but keep the order they were given in
+			ids = list(dict.fromkeys(int(ticket_number) for ticket_number in ticket_numbers))
+			# show_many only accepts a limited number of IDs per request
+			batches = [
+				ids[start:start + SHOW_MANY_MAX_IDS]
+				for start in range(0, len(ids), SHOW_MANY_MAX_IDS)
+			]
+
+			if max_concurrency > 1 and len(batches) > 1:
+				from concurrent.futures import ThreadPoolExecutor
+
+				with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+					responses = list(executor.map(self._get_ticket_batch, batches))
+			else:
+				responses = map(self._get_ticket_batch, batches)
+
+			for response in responses:
+				if response.status_code != 200:
+					return GetTicketsByIdsResponse(response.status_code)
+
+				for ticket in response.tickets:
+					found[ticket.id] = ticket
+
+		except request_errors() as error:
+			self.instrumentation.error(f'{self.url}/api/v2/tickets/show_many.json', error)
+			return GetTicketsByIdsResponse(-1)
+
+		return GetTicketsByIdsResponse(
+			200,
+			[found[ticket_id] for ticket_id in ids if ticket_id in found],
+			missing_ids=[ticket_id for ticket_id in ids if ticket_id not in found]
+		)
+
+class AsyncTicketViewer:
+	"""
+	Awaitable variant of TicketViewer.
+
+	Requests are sent through a TicketViewer's pooled session on a bounded
+	thread pool, so at most max_concurrency requests are in flight at once
+	"""
+
+	def __init__(
+		self,
+		url: str,
+		email: str,
+		password: str,
+		max_concurrency: int = 10,
+		**session_options: Any
+	) -> None:
+		self.max_concurrency: int = max_concurrency
+		self.ticket_viewer: TicketViewer = TicketViewer(
+			url,
+			email,
+			password,
+			pool_maxsize=max_concurrency,
+			**session_options
+		)
+		from concurrent.futures import ThreadPoolExecutor
+
+		self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+			max_workers=max_concurrency,
+			thread_name_prefix="ticket-viewer"
+		)
+
+	async def __aenter__(self) -> "AsyncTicketViewer":
+		return self
+
+	async def __aexit__(self, *exc_info) -> None:
+		import asyncio
+
+		# Waiting for the requests in flight would block the event loop
+		await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+	def close(self) -> None:
+		"""
+		Stop the worker threads and close the pooled session
+		"""
+
+		self.executor.shutdown(wait=True)
+		self.ticket_viewer.close()
+
+	async def _run(self, method, *args: Any) -> Any:
+		"""
+		Run a blocking TicketViewer method on the worker threads
+		"""
+
+		import asyncio
+
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(self.executor, method, *args)
+
+	async def count_tickets(self) -> CountTicketsResponse:
+		"""
+		Count the number of tickets the account has
+		"""
+
+		return await self._run(self.ticket_viewer.count_tickets)
+
+	async def get_tickets(
+		self,
+		link: Optional[str] = None,
+		fields: Optional[Iterable[str]] = None,
+		filters: Optional[Dict[str, Union[str, Sequence[str]]]] = None
+	) -> GetTicketsResponse:
+		"""
+		List tickets belonging to the account,
+		see TicketViewer.get_tickets for fields and filters
+		"""
+
+		return await self._run(
+			partial(self.ticket_viewer.get_tickets, link, fields=fields, filters=filters)
+		)
+
+	async def get_individual_ticket(self, ticket_number: str) -> GetTicketsResponse:
+		"""
+		Fetch the properties of a specific ticket by ticket ID
+		"""
+
+		return await self._run(self.ticket_viewer.get_individual_ticket, ticket_number)
+
+	async def get_many_tickets(
+		self,
+		ticket_numbers: Iterable[str]
+	) -> List[GetTicketsResponse]:
+		"""
+		Fetch many tickets by ticket ID in parallel,
+		returning one response per ID in the order they were given
+		"""
+
+		import asyncio
+
+		# The executor already bounds the number of running requests,
+		# the semaphore also keeps us from queueing hundreds of jobs on it at once
+		semaphore = asyncio.Semaphore(self.max_concurrency)
+
+		async def fetch(ticket_number: str) -> GetTicketsResponse:
+			async with semaphore:
+				return await self.get_individual_ticket(str(ticket_number))
+
+		return list(await asyncio.gather(*map(fetch, ticket_numbers)))
@@ -2,20 +2,60 @@
 
 import os
 import sys
+import json
 import math
-from dotenv import load_dotenv
-from datetime import datetime
-from pytz import timezone
-from typing import List, Dict
+from operator import attrgetter, itemgetter
+from datetime import datetime, timedelta
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Iterable, List, Dict, Optional, Sequence, TextIO, Tuple
+from urllib.parse import urlsplit
 
-from ticket_viewer.ticket_viewer import TicketViewer
+from ticket_viewer.cache import TicketCache
+from ticket_viewer.detail import TicketDetail, User
+from ticket_viewer.instrumentation import INSTRUMENTATION
+from ticket_viewer.multi import Account, MultiTicketViewer, read_accounts
+from ticket_viewer.search import TicketIndex
+from ticket_viewer.ticket_viewer import FILTER_VALUES, MAX_PAGE_SIZE, TICKET_FIELDS, Ticket, TicketViewer, \
+  build_search_query
+from ticket_viewer.watch import ScreenRegion
 
-def get_ticket_viewer() -> TicketViewer:
+OUTPUT_FORMATS = ("table", "json", "ndjson")
+# Properties shown in tables, in the order of their columns
+TABLE_KEYS = ("id", "updated_at", "type", "priority", "status", "subject")
+# Property added to tickets listed from several accounts, shown first
+ACCOUNT_KEY = "account"
+# Widest the values of a streamed table's columns can be, longer ones are cut short
+MAX_COLUMN_WIDTHS = {"subject": 60, ACCOUNT_KEY: 24}
+ELLIPSIS = "..."
+# Most ticket IDs that can be asked for at once, so that a wide range is not expanded in memory
+MAX_TICKET_IDS = 10000
+
+# pytz and dotenv are only imported once a timezone or the .env file is needed,
+# which keeps them out of the startup of commands that do not use them
+def timezone(name: str) -> Any:
+  from pytz import timezone as pytz_timezone
+
+  return pytz_timezone(name)
+
+@lru_cache(maxsize=None)
+def load_config() -> None:
   """
-  Get url, email and password to connect to Zendesk API
+  Load the .env file into the environment the first time it is needed
   """
 
+  from dotenv import load_dotenv
+
   load_dotenv()
+
+def get_ticket_viewer(**options: Any) -> TicketViewer:
+  """
+  Get url, email and password to connect to Zendesk API,
+  options are passed on to TicketViewer
+  """
+
+  load_config()
   url = os.environ.get("secretUrl")
   email = os.environ.get("secretEmail")
   password = os.environ.get("secretPassword")
@@ -27,7 +67,140 @@ def get_ticket_viewer() -> TicketViewer:
     sys.exit()
 
   else:
-    return TicketViewer(url, email, password)
+    return TicketViewer(url, email, password, **options)
+
+def get_accounts() -> List[Account]:
+  """
+  Get the accounts listed in the file set as accountsFile in the .env file,
+  or the single account of the .env file if there is none
+  """
+
+  load_config()
+  path = os.environ.get("accountsFile")
+
+  if not path:
+    ticket_viewer = get_ticket_viewer()
+    # Named after its subdomain
+    name = urlsplit(ticket_viewer.url).hostname or ticket_viewer.url
+
+    return [Account(name, ticket_viewer.url, ticket_viewer.email, ticket_viewer.password)]
+
+  try:
+    return read_accounts(path)
+  except (OSError, ValueError) as error:
+    print(f"The accounts file {path} could not be read: {error}")
+    sys.exit()
+
+def get_multi_ticket_viewer(**options: Any) -> MultiTicketViewer:
+  """
+  Get a viewer over every account, options are passed on to MultiTicketViewer
+  """
+
+  return MultiTicketViewer(get_accounts(), **options)
+
+def get_cache_directory() -> Optional[str]:
+  """
+  Get the directory of the local ticket cache, if one is set in the .env file
+  """
+
+  load_config()
+  return os.environ.get("cacheDir") or None
+
+def get_ticket_cache() -> Optional[TicketCache]:
+  """
+  Open the local ticket cache if a cache directory is set in the .env file
+  """
+
+  directory = get_cache_directory()
+
+  return TicketCache(directory) if directory else None
+
+def get_ticket_index() -> TicketIndex:
+  """
+  Open the local search index, kept on disk if an index directory
+  is set in the .env file and only in memory otherwise
+  """
+
+  load_config()
+  return TicketIndex(os.environ.get("indexDir"))
+
+def get_prefetch_options() -> Dict[str, int]:
+  """
+  Get how many pages are fetched ahead while paging through tickets
+  and how many tickets the fetched pages may hold in total
+  """
+
+  load_config()
+  options = {}
+
+  for option, name, default in (("depth", "prefetchDepth", 2), ("max_tickets", "prefetchMaxTickets", 1000)):
+    value = (os.environ.get(name) or "").strip()
+
+    # Values that are not whole numbers fall back to the default instead of stopping the app
+    if value and not value.isdigit():
+      print(f"{name} in the .env file has to be a whole number of 0 or more, {default} is used instead.")
+      value = ""
+
+    options[option] = int(value) if value else default
+
+  return options
+
+def parse_ticket_ids(string: str) -> Optional[List[int]]:
+  """
+  Parse a comma-separated list of ticket IDs and ID ranges
+  such as '1,5,10-40' into a list of IDs, or return None if the string
+  is not valid or lists more than MAX_TICKET_IDS IDs
+  """
+
+  ticket_ids = []
+
+  for part in string.replace(" ", "").split(","):
+    start, separator, end = part.partition("-")
+
+    if not start.isdigit() or (separator and not end.isdigit()):
+      return None
+
+    # A single ID
+    if not separator:
+      ticket_ids.append(int(start))
+
+    # A range of IDs, both ends included, checked before it is expanded
+    elif int(start) <= int(end) and len(ticket_ids) + int(end) - int(start) < MAX_TICKET_IDS:
+      ticket_ids.extend(range(int(start), int(end) + 1))
+
+    else:
+      return None
+
+    if len(ticket_ids) > MAX_TICKET_IDS:
+      return None
+
+  return ticket_ids
+
+def parse_ticket_filters(string: str) -> Optional[Dict[str, List[str]]]:
+  """
+  Parse space-separated filters such as
+  'status:open,pending priority:urgent updated_after:2021-12-01'
+  into the filters taken by TicketViewer.get_tickets,
+  or return None if the string is not valid
+  """
+
+  filters: Dict[str, List[str]] = {}
+
+  for part in string.split():
+    key, separator, values = part.partition(":")
+
+    if not separator or not values:
+      return None
+
+    filters.setdefault(key, []).extend(value for value in values.split(",") if value)
+
+  # Check the filters and their values the same way the request would
+  try:
+    build_search_query(filters)
+  except ValueError:
+    return None
+
+  return filters or None
 
 def find_column_width(
   tickets: List[Dict[str, str]], 
@@ -121,6 +294,126 @@ def convert_to_sgt(string: str) -> str:
   
   return sg_time
 
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+  "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+# Displayed time of each minute of a day, e.g. '09:05PM'
+TIMES_OF_DAY = tuple(
+  f"{hour % 12 or 12:02d}:{minute:02d}{'AM' if hour < 12 else 'PM'}"
+  for hour in range(24) for minute in range(60)
+)
+
+class TimestampFormatter:
+  """
+  A class for converting tickets' 'updated_at' to a display timezone,
+  producing the same strings as convert_to_sgt.
+
+  Results are cached per minute (seconds are not displayed)
+  in a bounded cache, and timezones that no longer change their offset
+  (like Asia/Singapore) skip the timezone lookup for recent timestamps
+  """
+
+  def __init__(self, tz_name: str = "Asia/Singapore", cache_size: int = 65536) -> None:
+    self.tz_name: str = tz_name
+    self.tz = timezone(tz_name)
+    # Abbreviation shown in the table header
+    self.label: str = "SGT" if tz_name == "Asia/Singapore" \
+      else datetime.now(self.tz).tzname()
+
+    # The offset is fixed from the last time it changed onwards
+    # (pytz may list transitions that keep the same offset)
+    transition_times = getattr(self.tz, "_utc_transition_times", None)
+    if transition_times:
+      transition_info = self.tz._transition_info
+      idx = len(transition_info) - 1
+      while idx > 0 and transition_info[idx - 1][:2] == transition_info[-1][:2]:
+        idx -= 1
+
+      fixed_since = transition_times[idx]
+      fixed_offset = transition_info[-1][0]
+    else:
+      fixed_since = datetime.min
+      fixed_offset = self.tz.utcoffset(datetime(2000, 1, 1))
+
+    # ISO strings compare the same way as the times they represent
+    self.fixed_since: str = fixed_since.isoformat()[:16]
+    self.fixed_offset_minutes: int = int(fixed_offset.total_seconds() // 60)
+
+    self.convert_minute = lru_cache(maxsize=cache_size)(self._convert_minute)
+    self.format_date = lru_cache(maxsize=4096)(self._format_date)
+
+  def _format_date(self, utc_date: str, days: int) -> str:
+    """
+    Display a 'YYYY-MM-DD' date shifted by a number of days
+    """
+
+    local_date = datetime(int(utc_date[0:4]), int(utc_date[5:7]), int(utc_date[8:10])) \
+      + timedelta(days=days)
+
+    return f"{local_date.day:02d} {MONTHS[local_date.month - 1]} {local_date.year} "
+
+  def _convert_minute(self, minute: str) -> str:
+    """
+    Convert a UTC 'YYYY-MM-DDTHH:MM' string to the display timezone
+    """
+
+    if minute >= self.fixed_since:
+      minute_of_day = int(minute[11:13]) * 60 + int(minute[14:16]) + self.fixed_offset_minutes
+      days, minute_of_day = divmod(minute_of_day, 1440)
+
+      return self.format_date(minute[:10], days) + TIMES_OF_DAY[minute_of_day]
+
+    local_time = datetime(
+      int(minute[0:4]),
+      int(minute[5:7]),
+      int(minute[8:10]),
+      int(minute[11:13]),
+      int(minute[14:16]),
+      tzinfo=timezone("UTC")
+    ).astimezone(self.tz)
+
+    return self._format_date(local_time.strftime("%Y-%m-%d"), 0) \
+      + TIMES_OF_DAY[local_time.hour * 60 + local_time.minute]
+
+  def format(self, string: str) -> str:
+    """
+    Convert a ticket's 'updated_at', e.g. '2021-11-25T21:35:43Z'
+    """
+
+    return self.convert_minute(string[:16])
+
+  def format_column(self, strings: Sequence[Optional[str]]) -> List[str]:
+    """
+    Convert a whole column of 'updated_at' at once,
+    with None shown as an empty string
+    """
+
+    convert_minute = self.convert_minute
+
+    return [convert_minute(string[:16]) if string else "" for string in strings]
+
+@lru_cache(maxsize=None)
+def get_default_formatter() -> TimestampFormatter:
+  """
+  The formatter used when no display timezone is given, built on first use
+  """
+
+  return TimestampFormatter()
+
+def __getattr__(name: str) -> Any:
+  # SGT_FORMATTER is kept for existing callers, without building it at import time
+  if name == "SGT_FORMATTER":
+    return get_default_formatter()
+
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_timestamp_formatter() -> TimestampFormatter:
+  """
+  Get the timezone tickets' 'updated_at' is displayed in
+  """
+
+  load_config()
+  return TimestampFormatter(os.environ.get("displayTimezone") or "Asia/Singapore")
+
 def generate_row(
   ticket: Dict[str, str], 
   keys: List[str], 
@@ -145,4 +438,383 @@ def generate_row(
         is_left_indent=key == "subject"
       )
   
-  return "".join(row)
\ No newline at end of file
+  return "".join(row)
+
+def generate_row_template(
+  col_width: List[int],
+  left_indent_cols: Sequence[int] = ()
+) -> str:
+  """
+  Precompile a format template for a whole row that
+  lays out cells the same way as generate_cell
+  """
+
+  cells = []
+
+  for idx, width in enumerate(col_width):
+    # Since it is first column, we do not need '|' at the start
+    separator = "" if idx == 0 else "|"
+
+    # A leading space followed by the value centered in the rest of the cell
+    # puts the odd whitespace before the value, like generate_whitespace does
+    alignment = "<" if idx in left_indent_cols else "^"
+    cells.append(f"{separator} {{:{alignment}{width - 1}}}")
+
+  return "".join(cells)
+
+def format_columns(
+  tickets: Sequence[Dict[str, Any]],
+  keys: List[str],
+  timestamp_formatter: Optional[TimestampFormatter] = None
+) -> List[List[str]]:
+  """
+  Format the values of tickets column by column, as they are shown in tables
+  (timestamps are converted once per distinct value)
+  """
+
+  timestamp_formatter = timestamp_formatter or get_default_formatter()
+  columns = []
+
+  # Read Ticket records by attribute, which is faster than through __getitem__
+  getter = attrgetter if tickets and isinstance(tickets[0], Ticket) else itemgetter
+
+  for key in keys:
+    values = list(map(getter(key), tickets))
+
+    if key == "updated_at":
+      # Need to convert 'updated_at' to the display timezone
+      columns.append(timestamp_formatter.format_column(values))
+    else:
+      # Convert None value to empty string
+      columns.append([str(value) if value else "" for value in values])
+
+  return columns
+
+def layout_table(
+  tickets: Sequence[Dict[str, Any]],
+  keys: List[str],
+  headers: List[str],
+  timestamp_formatter: Optional[TimestampFormatter] = None,
+  min_col_width: Optional[Sequence[int]] = None
+) -> Tuple[List[str], List[int]]:
+  """
+  Lay out a table of tickets as its header, separator and row lines,
+  and give the width of its columns, which are at least min_col_width.
+
+  Work is done column by column, then every row is laid out
+  by one precompiled template
+  """
+
+  columns = format_columns(tickets, keys, timestamp_formatter)
+  col_width = []
+
+  for idx, key in enumerate(keys):
+    # Length of 'Updated at' column after conversion is fixed
+    max_len = 19 if key == "updated_at" else max(map(len, columns[idx]), default=0)
+
+    # To make sure the column is not too tight, add a whitespace before and after the value
+    col_width.append(max(max_len, len(headers[idx])) + 2)
+
+  if min_col_width is not None:
+    col_width = list(map(max, col_width, min_col_width))
+
+  header = generate_row_template(col_width).format(*headers)
+  row_template = generate_row_template(
+    col_width,
+    [idx for idx, key in enumerate(keys) if key == "subject"]
+  )
+
+  lines = [header, "-" * len(header)]
+  lines.extend(map(row_template.format, *columns))
+
+  return lines, col_width
+
+def fit_value(value: str, max_len: int) -> str:
+  """
+  Cut a value longer than max_len short, ending it with an ellipsis
+  """
+
+  if len(value) <= max_len:
+    return value
+
+  return value[:max(max_len - len(ELLIPSIS), 0)] + ELLIPSIS
+
+class TableWriter:
+  """
+  A class for writing a table of tickets chunk by chunk, as they arrive.
+
+  Columns are sized from the first chunk (a bounded sample) and from the
+  known values of status, priority and type, then stay fixed, so rows are
+  written as soon as their chunk is laid out. Values of the columns capped by
+  max_col_width are cut short to fit them (the last column, e.g. the subject,
+  only to its cap); other values wider than their column (e.g. a longer ID)
+  only shift the rest of their row.
+
+  On a terminal, window limits the table to its last rows,
+  which scroll in place instead of filling the screen
+  """
+
+  def __init__(
+    self,
+    keys: List[str],
+    headers: List[str],
+    stream: Optional[TextIO] = None,
+    timestamp_formatter: Optional[TimestampFormatter] = None,
+    max_col_width: Dict[str, int] = MAX_COLUMN_WIDTHS,
+    window: Optional[int] = None
+  ) -> None:
+    self.keys: List[str] = keys
+    self.headers: List[str] = headers
+    self.stream: TextIO = stream or sys.stdout
+    self.timestamp_formatter: TimestampFormatter = timestamp_formatter or get_default_formatter()
+    self.max_col_width: Dict[str, int] = max_col_width
+    self.col_width: Optional[List[int]] = None
+    self.row_template: str = ""
+    self.lines: List[str] = [] # Header and separator
+    self.count: int = 0 # Rows written
+    self.window: Optional[deque] = None
+    self.region: Optional[ScreenRegion] = None
+
+    if window and self.stream.isatty():
+      import shutil
+
+      self.window = deque(maxlen=window)
+      self.region = ScreenRegion(self.stream, shutil.get_terminal_size().columns)
+
+  def size_columns(self, columns: List[List[str]]) -> None:
+    col_width = []
+
+    for idx, key in enumerate(self.keys):
+      if key == "updated_at":
+        max_len = 19
+      else:
+        max_len = max(map(len, columns[idx]), default=0)
+        if key in FILTER_VALUES:
+          max_len = max(max_len, *map(len, FILTER_VALUES[key]))
+        if key in self.max_col_width:
+          max_len = min(max_len, self.max_col_width[key])
+
+      # To make sure the column is not too tight, add a whitespace before and after the value
+      col_width.append(max(max_len, len(self.headers[idx])) + 2)
+
+    header = generate_row_template(col_width).format(*self.headers)
+    self.col_width = col_width
+    self.row_template = generate_row_template(
+      col_width,
+      [idx for idx, key in enumerate(self.keys) if key == "subject"]
+    )
+    self.lines = [header, "-" * len(header)]
+
+  def write(self, tickets: Sequence[Dict[str, Any]]) -> None:
+    """
+    Write the rows of a chunk of tickets, preceded by the header the first time
+    """
+
+    with INSTRUMENTATION.timer("render", rows=len(tickets), format="table"):
+      columns = format_columns(tickets, self.keys, self.timestamp_formatter)
+      is_first = self.col_width is None
+
+      if is_first:
+        self.size_columns(columns)
+
+      for idx, key in enumerate(self.keys):
+        if key in self.max_col_width:
+          # A longer value in the last column does not move any other column
+          max_len = self.max_col_width[key] if idx == len(self.keys) - 1 else self.col_width[idx] - 2
+          columns[idx] = [fit_value(value, max_len) for value in columns[idx]]
+
+      rows = list(map(self.row_template.format, *columns))
+
+    self.count += len(rows)
+
+    if self.region is not None:
+      self.window.extend(rows)
+      first = self.count - len(self.window) + 1
+      self.region.draw([
+        "",
+        *self.lines,
+        *self.window,
+        "",
+        f"Rows {first}-{self.count} of {self.count} so far." if self.count else "No tickets."
+      ])
+      return
+
+    lines = rows
+    if is_first:
+      lines = ["", *self.lines, *rows]
+
+    self.stream.write("\n".join(lines) + "\n")
+    self.stream.flush()
+
+def render_table(
+  tickets: Sequence[Dict[str, Any]],
+  keys: List[str],
+  headers: List[str],
+  timestamp_formatter: Optional[TimestampFormatter] = None
+) -> str:
+  """
+  Render a whole table of tickets as a single string
+  """
+
+  lines, _ = layout_table(tickets, keys, headers, timestamp_formatter)
+
+  return "\n" + "\n".join(lines) + "\n"
+
+def render_counts(headers: Sequence[str], rows: Iterable[Sequence[Any]]) -> str:
+  """
+  Render a table of counts (e.g. tickets by status) laid out like
+  the tables of tickets, with missing values shown as '(none)'
+  """
+
+  columns = [[str(value) if value is not None else "(none)" for value in column] for column in zip(*rows)] \
+    or [[] for _ in headers]
+  col_width = [
+    max(len(header), max(map(len, column), default=0)) + 2
+    for header, column in zip(headers, columns)
+  ]
+
+  header = generate_row_template(col_width).format(*headers)
+  row_template = generate_row_template(col_width, left_indent_cols=[0])
+
+  lines = ["", header, "-" * len(header)]
+  lines.extend(map(row_template.format, *columns))
+
+  return "\n".join(lines) + "\n"
+
+def render_ticket_detail(
+  detail: TicketDetail,
+  timestamp_formatter: Optional[TimestampFormatter] = None
+) -> str:
+  """
+  Render a ticket with its people, organization and comment thread
+  (the first comment holds the ticket's description)
+  """
+
+  timestamp_formatter = timestamp_formatter or get_default_formatter()
+  ticket = detail.ticket
+
+  def person(user: Optional[User]) -> str:
+    if user is None:
+      return "-"
+
+    return f"{user.name} <{user.email}>" if user.email else user.name
+
+  lines = [
+    "",
+    f"Ticket {ticket.id}: {ticket.subject or ''}",
+    f"Status: {ticket.status or '-'} | Priority: {ticket.priority or '-'} | Type: {ticket.type or '-'}" \
+      f" | Updated at ({timestamp_formatter.label}): {timestamp_formatter.format(ticket.updated_at)}",
+    f"Requester: {person(detail.requester)}",
+    f"Assignee: {person(detail.assignee)}",
+    f"Organization: {detail.organization.name if detail.organization else '-'}",
+    "",
+    f"{len(detail.comments)} comment{'s' if len(detail.comments) != 1 else ''}:"
+  ]
+
+  for comment in detail.comments:
+    author = detail.authors.get(comment.author_id)
+    note = "" if comment.public else " (internal note)"
+
+    lines.append("")
+    lines.append(f"{author.name if author else '-'}, {timestamp_formatter.format(comment.created_at)}{note}")
+    lines.extend(f"  {line}" for line in comment.body.splitlines())
+
+  return "\n".join(lines) + "\n"
+
+def write_table(
+  tickets: Sequence[Dict[str, Any]],
+  keys: List[str],
+  headers: List[str],
+  stream: Optional[TextIO] = None,
+  timestamp_formatter: Optional[TimestampFormatter] = None
+) -> None:
+  """
+  Write a whole table of tickets with a single write
+  """
+
+  stream = stream or sys.stdout
+  stream.write(render_table(tickets, keys, headers, timestamp_formatter))
+  stream.flush()
+
+def get_table_headers(
+  keys: Sequence[str],
+  timestamp_formatter: Optional[TimestampFormatter] = None
+) -> List[str]:
+  """
+  Headers of the table columns showing keys
+  """
+
+  label = (timestamp_formatter or get_default_formatter()).label
+  headers = {"id": "ID", "updated_at": f"Updated at ({label})"}
+
+  return [headers.get(key, key.capitalize()) for key in keys]
+
+def write_tickets(
+  tickets: Iterable[Ticket],
+  format: str = "table",
+  fields: Sequence[str] = TICKET_FIELDS,
+  stream: Optional[TextIO] = None,
+  timestamp_formatter: Optional[TimestampFormatter] = None,
+  chunk_size: int = MAX_PAGE_SIZE,
+  window: Optional[int] = None
+) -> int:
+  """
+  Write tickets as they arrive, as a table, a JSON array or one JSON object
+  per line, and return how many were written.
+
+  Tickets are rendered a chunk at a time and each chunk is written
+  with a single write, so output is not slowed down by a write per row.
+  A table is a TableWriter sized from the first chunk, showing only its
+  last window rows on a terminal if window is given. Tickets of several
+  accounts are given as dicts that also hold their ACCOUNT_KEY,
+  which is then one of the fields
+  """
+
+  if format not in OUTPUT_FORMATS:
+    raise ValueError(f"format has to be one of {', '.join(OUTPUT_FORMATS)}")
+
+  stream = stream or sys.stdout
+  keys = [key for key in (ACCOUNT_KEY, *TABLE_KEYS) if key in fields]
+  fields = [key for key in (ACCOUNT_KEY, *TICKET_FIELDS) if key in fields]
+  dumps = json.dumps
+  tickets = iter(tickets)
+  count = 0
+
+  table_writer = None
+  if format == "table":
+    headers = get_table_headers(keys, timestamp_formatter)
+    table_writer = TableWriter(keys, headers, stream, timestamp_formatter, window=window)
+
+  while True:
+    chunk = list(islice(tickets, chunk_size))
+
+    # An empty table still has its header
+    if not chunk and (count or format != "table"):
+      break
+
+    if table_writer is not None:
+      table_writer.write(chunk)
+
+    else:
+      with INSTRUMENTATION.timer("render", rows=len(chunk), format=format):
+        separator = ",\n" if format == "json" else "\n"
+        text = separator.join(dumps({key: ticket[key] for key in fields}) for ticket in chunk)
+
+        if format == "json":
+          text = ("[\n" if not count else ",\n") + text
+        else:
+          text += "\n"
+
+      stream.write(text)
+      stream.flush()
+
+    count += len(chunk)
+
+    if not chunk:
+      break
+
+  if format == "json":
+    stream.write("\n]\n" if count else "[]\n")
+    stream.flush()
+
+  return count
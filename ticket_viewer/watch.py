@@ -0,0 +1,232 @@
+"""
+This module provides a live view of the most recently updated tickets,
+kept up to date by polling the incremental export API and redrawing
+only the rows of the terminal that changed
+"""
+
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+from ticket_viewer.ticket_viewer import Ticket, TicketViewer
+
+# The incremental export API allows 10 requests a minute
+MIN_INTERVAL = 6.0
+MAX_INTERVAL = 60.0
+# Growth of the interval after each check that found no changes
+BACKOFF = 1.5
+# Status codes after which checking again later may succeed
+TRANSIENT_STATUS_CODES = (-1, 429, 500, 502, 503, 504)
+
+def sort_key(ticket: Ticket) -> Tuple[str, int]:
+  return (ticket.updated_at or "", ticket.id)
+
+def to_timestamp(updated_at: str) -> int:
+  return int(datetime.strptime(updated_at, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp())
+
+class TicketView:
+  """
+  A class for holding the most recently updated tickets in order,
+  the most recent first.
+
+  Up to size tickets are shown, and as many again are kept below them
+  so that tickets that were deleted can be replaced without a request
+  """
+
+  def __init__(self, size: int) -> None:
+    self.size: int = size
+    self.capacity: int = size * 2
+    self.tickets: Dict[int, Ticket] = {}
+    self.ordered: List[Ticket] = []
+
+  @property
+  def rows(self) -> List[Ticket]:
+    return self.ordered[:self.size]
+
+  def merge(self, tickets: List[Ticket]) -> List[Ticket]:
+    """
+    Apply changed tickets (deleted ones have the status 'deleted')
+    and return the ones that changed the view
+    """
+
+    changed = []
+    oldest = self.ordered[-1] if len(self.ordered) >= self.capacity else None
+
+    for ticket in tickets:
+      current = self.tickets.get(ticket.id)
+
+      if ticket.status == "deleted":
+        if current is not None:
+          del self.tickets[ticket.id]
+          changed.append(ticket)
+
+      # The same ticket may be sent again, and tickets older than
+      # every kept one would not be shown anyway
+      elif current != ticket and (oldest is None or current is not None or sort_key(ticket) > sort_key(oldest)):
+        self.tickets[ticket.id] = ticket
+        changed.append(ticket)
+
+    if changed:
+      self.ordered = sorted(self.tickets.values(), key=sort_key, reverse=True)[:self.capacity]
+      self.tickets = {ticket.id: ticket for ticket in self.ordered}
+
+    return changed
+
+class TicketWatcher:
+  """
+  A class for keeping a TicketView up to date.
+
+  The view starts from the first page of tickets. From then on, the tickets
+  that changed since the last check are listed through the incremental export
+  API from a stored cursor, so each check costs a request per 1000 changes.
+  Checks are min_interval apart while tickets keep changing, and further apart
+  (up to max_interval) while they do not
+  """
+
+  def __init__(
+    self,
+    ticket_viewer: TicketViewer,
+    size: int = 25,
+    min_interval: float = MIN_INTERVAL,
+    max_interval: float = MAX_INTERVAL
+  ) -> None:
+    self.ticket_viewer: TicketViewer = ticket_viewer
+    self.view: TicketView = TicketView(size)
+    self.min_interval: float = min_interval
+    self.max_interval: float = max(max_interval, min_interval)
+    self.interval: float = min_interval # Until the next check
+    self.cursor: Optional[str] = None
+    self.start_time: int = 0
+    self.checked_at: Optional[float] = None # time.time() of the last successful check
+
+  def start(self) -> int:
+    """
+    Fill the view with the most recently updated tickets and return the status code
+    """
+
+    response = self.ticket_viewer.get_tickets(
+      self.ticket_viewer.tickets_link(min(self.view.capacity, 100)),
+      use_cache=False
+    )
+
+    if response.status_code != 200 or response.tickets is None:
+      return response.status_code
+
+    self.view.merge(response.tickets)
+
+    # Changes are listed from the most recent update on
+    # (which is listed again and ignored since it did not change)
+    if self.view.ordered:
+      self.start_time = to_timestamp(self.view.ordered[0].updated_at)
+    else:
+      self.start_time = int(time.time())
+
+    self.checked_at = time.time()
+    return response.status_code
+
+  def poll(self) -> Tuple[int, List[Ticket]]:
+    """
+    List the tickets that changed since the last check, merge them into the view,
+    and return the status code with the tickets that changed the view
+    """
+
+    changed = []
+
+    while True:
+      response = self.ticket_viewer.get_incremental_tickets(start_time=self.start_time, cursor=self.cursor)
+
+      if response.status_code != 200 or response.tickets is None:
+        # Try again later, from the same cursor
+        self.interval = self.max_interval
+        return response.status_code, changed
+
+      changed.extend(self.view.merge(response.tickets))
+      self.cursor = response.after_cursor
+
+      if response.end_of_stream:
+        break
+
+    self.checked_at = time.time()
+    self.interval = self.min_interval if changed else min(self.interval * BACKOFF, self.max_interval)
+
+    return response.status_code, changed
+
+  def run(
+    self,
+    on_change: Callable[[List[Ticket]], None],
+    stop: Optional[threading.Event] = None,
+    polls: Optional[int] = None
+  ) -> int:
+    """
+    Check for changes until stop is set, polls checks were done or
+    a check fails for good, calling on_change with the tickets that
+    changed the view (and with nothing after a check that found none).
+    Returns the status code of the last check
+    """
+
+    stop = stop or threading.Event()
+    status_code = 200
+
+    while polls is None or polls > 0:
+      if stop.wait(self.interval):
+        break
+
+      status_code, changed = self.poll()
+
+      if status_code != 200 and status_code not in TRANSIENT_STATUS_CODES:
+        break
+
+      on_change(changed)
+      if polls is not None:
+        polls -= 1
+
+    return status_code
+
+class ScreenRegion:
+  """
+  A class for keeping lines at the bottom of a terminal up to date,
+  rewriting only the lines that changed with ANSI escape codes.
+
+  Lines are cut to the width of the terminal so that none of them wraps
+  """
+
+  def __init__(self, stream: TextIO, width: int = 0) -> None:
+    self.stream: TextIO = stream
+    self.width: int = width # 0 for no limit
+    self.lines: List[str] = []
+
+  def draw(self, lines: List[str]) -> int:
+    """
+    Show lines in place of the ones drawn last,
+    and return the number of lines written
+    """
+
+    if self.width:
+      lines = [line[:self.width] for line in lines]
+
+    height = len(self.lines)
+    parts = []
+    written = 0
+
+    # The cursor is at the start of the line below the region
+    for idx, line in enumerate(lines[:height]):
+      if line != self.lines[idx]:
+        up = height - idx
+        parts.append(f"\x1b[{up}A\r{line}\x1b[K\x1b[{up}B\r")
+        written += 1
+
+    if len(lines) > height:
+      parts.append("\n".join(lines[height:]) + "\n")
+      written += len(lines) - height
+
+    elif len(lines) < height:
+      # Clear the lines that are not needed anymore
+      parts.append(f"\x1b[{height - len(lines)}A\r\x1b[J")
+
+    if parts:
+      self.stream.write("".join(parts))
+      self.stream.flush()
+
+    self.lines = lines
+    return written